@@ -1,5 +1,10 @@
 import random
-from typing import List, Dict
+from array import array
+from datetime import datetime, timedelta
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from app.repositories.business_repository import ETA_MINUTES_PER_KM
+from app.utils import calculate_distance
 
 MEDELLIN_LOCATIONS = [
     {"name": "El Poblado", "lat": 6.2088, "lng": -75.5704},
@@ -144,3 +149,260 @@ def generate_couriers() -> List[Dict]:
             "total_deliveries": random.randint(10, 200),
         })
     return couriers
+
+
+CUSTOMER_FIRST_NAMES = ["Andrés", "Camila", "Santiago", "Valentina", "Mateo", "Isabella", "Sebastián",
+                        "Mariana", "Juan Pablo", "Daniela", "Alejandro", "Manuela", "Felipe", "Sara"]
+CUSTOMER_LAST_NAMES = ["Restrepo", "Gómez", "Zapata", "Londoño", "Arango", "Ospina", "Jaramillo",
+                       "Correa", "Echeverri", "Velásquez", "Mejía", "Cardona"]
+# Relative order volume per hour of the day: lunch and dinner peaks.
+HOURLY_PROFILE = [1, 0.5, 0.3, 0.2, 0.2, 0.4, 1, 2, 3, 3, 4, 6, 10, 10, 7, 5, 5, 6, 8, 10, 9, 6, 4, 2]
+# A business's products beyond its category's templates are variants.
+PRODUCT_VARIANTS = [("", 1.0), ("Familiar", 1.6), ("Mini", 0.6), ("Premium", 1.3)]
+CANCEL_RATE = 0.06
+CARD_SHARE = 0.45
+
+
+class SyntheticData:
+    # Seeded data at any scale for benchmarks. Each kind of record is a
+    # stream generated one record at a time, and whatever an order refers to
+    # (product, courier, customer) is derived from its id, so memory stays
+    # bounded by the number of businesses however many products and orders
+    # are generated. The same arguments always give the same records.
+
+    def __init__(self, seed: int = 7, businesses: int = 15, products_per_business: int = 10,
+                 couriers: int = 8, orders: int = 0, days: int = 30, end: Optional[datetime] = None):
+        if businesses < 1 or products_per_business < 1 or couriers < 1:
+            raise ValueError("Se necesita al menos un negocio, un producto por negocio y un repartidor")
+        if orders < 0 or days < 1:
+            raise ValueError("La cantidad de pedidos no puede ser negativa y el historial debe cubrir al menos un día")
+        self.seed = seed
+        self.businesses_count = businesses
+        self.products_per_business = products_per_business
+        self.couriers_count = couriers
+        self.orders_count = orders
+        self.days = days
+        # Pass end to reproduce a dataset exactly; order ages depend on it.
+        self.end = end or datetime.now().replace(minute=0, second=0, microsecond=0)
+        self.customers = max(1, orders // 4)
+        self._table: Optional[Tuple[array, array, array, array, List[List[int]]]] = None
+
+    def _rng(self, stream: str) -> random.Random:
+        return random.Random(f"{self.seed}:{stream}")
+
+    @staticmethod
+    def business_name(index: int, zone: int) -> str:
+        name = BUSINESS_NAMES[index % len(BUSINESS_NAMES)][0]
+        if index < len(BUSINESS_NAMES):
+            return name
+        return f"{name} {MEDELLIN_LOCATIONS[zone]['name']} {index + 1}"
+
+    def product(self, business_index: int, slot: int) -> Dict:
+        category = BUSINESS_NAMES[business_index % len(BUSINESS_NAMES)][1]
+        templates = PRODUCTS_BY_CATEGORY.get(category, DEFAULT_PRODUCTS)
+        t = templates[slot % len(templates)]
+        series, variant = divmod(slot // len(templates), len(PRODUCT_VARIANTS))
+        label, factor = PRODUCT_VARIANTS[variant]
+        name = f"{t['name']} {label}".strip() + (f" {series + 1}" if series else "")
+        return {
+            "id": business_index * self.products_per_business + slot + 1,
+            "business_id": business_index + 1,
+            "name": name,
+            "price": max(100, int(round(t["price"] * factor / 100)) * 100),
+            "description": t["description"],
+            "category": category,
+            "image": t.get("image", "https://picsum.photos/seed/0/400"),
+        }
+
+    @staticmethod
+    def courier_identity(index: int) -> Tuple[str, str]:
+        return COURIER_NAMES[index % len(COURIER_NAMES)], f"+57 300 {1000000 + index}"
+
+    def customer(self, index: int) -> Dict:
+        zone = index % len(MEDELLIN_LOCATIONS)
+        loc = MEDELLIN_LOCATIONS[zone]
+        first = CUSTOMER_FIRST_NAMES[index % len(CUSTOMER_FIRST_NAMES)]
+        last = CUSTOMER_LAST_NAMES[(index // len(CUSTOMER_FIRST_NAMES)) % len(CUSTOMER_LAST_NAMES)]
+        return {
+            "name": f"{first} {last}",
+            "phone": f"+57 31{(index // 10000000) % 10} {index % 10000000:07d}",
+            "address": f"Calle {index % 100 + 1} #{(index // 100) % 100 + 1}-{(index // 10000) % 100 + 1}, {loc['name']}",
+            # A fixed spot within about 1 km of the zone's center.
+            "lat": round(loc["lat"] + ((index * 7919) % 2001 - 1000) / 100000, 6),
+            "lng": round(loc["lng"] + ((index * 104729) % 2001 - 1000) / 100000, 6),
+        }
+
+    def businesses(self) -> Iterator[Dict]:
+        return (business for _, business in self._zoned_businesses())
+
+    def _zoned_businesses(self) -> Iterator[Tuple[int, Dict]]:
+        rng = self._rng("businesses")
+        for i in range(self.businesses_count):
+            zone = rng.randrange(len(MEDELLIN_LOCATIONS))
+            loc = MEDELLIN_LOCATIONS[zone]
+            yield zone, {
+                "id": i + 1,
+                "name": self.business_name(i, zone),
+                "category": BUSINESS_NAMES[i % len(BUSINESS_NAMES)][1],
+                "address": f"Calle {rng.randint(1, 100)} #{rng.randint(1, 100)}-{rng.randint(1, 100)}, {loc['name']}",
+                "latitude": round(loc["lat"] + rng.uniform(-0.015, 0.015), 6),
+                "longitude": round(loc["lng"] + rng.uniform(-0.015, 0.015), 6),
+                "phone": f"+57 300 {rng.randint(1000000, 9999999)}",
+                "rating": round(rng.uniform(3.5, 5.0), 1),
+                "is_open": rng.random() < 0.8,
+                "delivery_time": rng.randint(15, 45),
+            }
+
+    def products(self) -> Iterator[Dict]:
+        rng = self._rng("products")
+        for i in range(self.businesses_count):
+            for slot in range(self.products_per_business):
+                product = self.product(i, slot)
+                product["available"] = rng.random() < 0.9
+                yield product
+
+    def couriers(self) -> Iterator[Dict]:
+        rng = self._rng("couriers")
+        for i in range(self.couriers_count):
+            loc = rng.choice(MEDELLIN_LOCATIONS)
+            name, phone = self.courier_identity(i)
+            yield {
+                "id": i + 1,
+                "name": name,
+                "phone": phone,
+                "lat": round(loc["lat"] + rng.uniform(-0.015, 0.015), 6),
+                "lng": round(loc["lng"] + rng.uniform(-0.015, 0.015), 6),
+                "zone": loc["name"],
+                "available": rng.random() < 0.75,
+                "vehicle": rng.choice(["Moto", "Bicicleta", "Moto", "Moto"]),
+                "rating": round(rng.uniform(4.0, 5.0), 1),
+                "current_order_id": None,
+                "total_deliveries": rng.randint(10, 200),
+            }
+
+    def _business_table(self) -> Tuple[array, array, array, array, List[List[int]]]:
+        # latitude, longitude, delivery_time and zone per business, plus the
+        # businesses of each zone: all an order needs from its business.
+        if self._table is None:
+            lats, lngs, times, zones = array("d"), array("d"), array("H"), array("B")
+            by_zone: List[List[int]] = [[] for _ in MEDELLIN_LOCATIONS]
+            for zone, b in self._zoned_businesses():
+                lats.append(b["latitude"])
+                lngs.append(b["longitude"])
+                times.append(b["delivery_time"])
+                zones.append(zone)
+                by_zone[zone].append(b["id"] - 1)
+            self._table = (lats, lngs, times, zones, by_zone)
+        return self._table
+
+    def orders(self) -> Iterator[Dict]:
+        return (order for order, _ in self.orders_and_payments())
+
+    def payments(self) -> Iterator[Dict]:
+        return (payment for _, payment in self.orders_and_payments() if payment is not None)
+
+    def orders_and_payments(self) -> Iterator[Tuple[Dict, Optional[Dict]]]:
+        # Orders in creation order over the last `days` days before end,
+        # spread over each day by HOURLY_PROFILE, each with its payment (None
+        # for orders placed in the last minute).
+        rng = self._rng("orders")
+        start = self.end - timedelta(days=self.days)
+        total_weight = sum(HOURLY_PROFILE)
+        cumulative = [0.0]
+        for w in HOURLY_PROFILE:
+            cumulative.append(cumulative[-1] + w / total_weight)
+        order_id = payment_id = 0
+        for day in range(self.days):
+            per_day = (day + 1) * self.orders_count // self.days - day * self.orders_count // self.days
+            for hour in range(24):
+                n = int(cumulative[hour + 1] * per_day) - int(cumulative[hour] * per_day)
+                base = start + timedelta(days=day, hours=hour)
+                for second in sorted(rng.random() * 3600 for _ in range(n)):
+                    order_id += 1
+                    order, payment = self._order(order_id, base + timedelta(seconds=second), rng)
+                    if payment is not None:
+                        payment_id += 1
+                        payment["id"] = payment_id
+                    yield order, payment
+
+    def _order(self, order_id: int, created: datetime, rng: random.Random) -> Tuple[Dict, Optional[Dict]]:
+        lats, lngs, times, zones, by_zone = self._business_table()
+        customer_index = rng.randrange(self.customers)
+        customer = self.customer(customer_index)
+        # Most customers order from their own zone.
+        local = by_zone[customer_index % len(MEDELLIN_LOCATIONS)]
+        b = rng.choice(local) if local and rng.random() < 0.8 else rng.randrange(self.businesses_count)
+        products = []
+        for slot in rng.sample(range(self.products_per_business), min(self.products_per_business, rng.randint(1, 4))):
+            p = self.product(b, slot)
+            quantity = rng.randint(1, 3)
+            products.append({
+                "product_id": p["id"],
+                "product_name": p["name"],
+                "quantity": quantity,
+                "unit_price": p["price"],
+                "subtotal": p["price"] * quantity,
+                "notes": "",
+            })
+        tip_amount = rng.choice([0, 0, 0, 1000, 2000, 3000])
+        distance = calculate_distance(lats[b], lngs[b], customer["lat"], customer["lng"])
+        estimated_time = int(times[b] + distance * ETA_MINUTES_PER_KM)
+        payment_method = "tarjeta" if rng.random() < CARD_SHARE else "efectivo"
+        order = {
+            "id": order_id,
+            "customer_name": customer["name"],
+            "customer_phone": customer["phone"],
+            "customer_address": customer["address"],
+            "customer_lat": customer["lat"],
+            "customer_lng": customer["lng"],
+            "business_id": b + 1,
+            "business_name": self.business_name(b, zones[b]),
+            "business_lat": lats[b],
+            "business_lng": lngs[b],
+            "products": products,
+            "total": sum(p["subtotal"] for p in products) + tip_amount,
+            "distance_km": round(distance, 2),
+            "estimated_time": estimated_time,
+            "payment_method": payment_method,
+            "tip_amount": tip_amount,
+            "payment_status": "pendiente",
+            "status": "pendiente",
+            "delivery_person": None,
+            "courier_phone": None,
+            "created_at": created.isoformat(),
+            "status_history": [{"status": "pendiente", "timestamp": created.isoformat()}],
+        }
+
+        # Orders that would not be delivered by end are still in the
+        # kitchen, so no courier is left mid-delivery.
+        minutes = timedelta(minutes=1)
+        prepared = created + minutes * rng.uniform(2, 8)
+        picked_up = created + minutes * rng.uniform(10, 25)
+        delivered = picked_up + minutes * (distance * 2 + rng.uniform(5, 15))
+        if rng.random() < CANCEL_RATE and created + minutes * 15 <= self.end:
+            steps = [("cancelado", created + minutes * rng.uniform(2, 15))]
+        elif delivered <= self.end:
+            courier = rng.randrange(self.couriers_count)
+            order["courier_id"] = courier + 1
+            order["courier_name"], order["courier_phone"] = self.courier_identity(courier)
+            order["batch_size"] = 1
+            steps = [("preparando", prepared), ("en_camino", picked_up), ("entregado", delivered)]
+        else:
+            steps = [("preparando", prepared)] if prepared <= self.end else []
+        for status, at in steps:
+            order["status"] = status
+            order["status_history"].append({"status": status, "timestamp": at.isoformat()})
+
+        paid_at = created + minutes * rng.uniform(0.5, 1)
+        if paid_at > self.end:
+            return order, None
+        order["payment_status"] = "pagado" if payment_method == "tarjeta" else "pendiente"
+        return order, {
+            "id": 0,
+            "order_id": order_id,
+            "amount": order["total"],
+            "tip_amount": tip_amount,
+            "payment_method": payment_method,
+            "status": order["payment_status"],
+            "created_at": paid_at.isoformat(),
+        }
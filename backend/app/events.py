@@ -0,0 +1,204 @@
+import asyncio
+import json
+import os
+import threading
+import time
+from collections import deque
+from typing import Any, Dict, Iterable, List, Optional
+
+EVENTS_QUEUE_SIZE = max(1, int(os.environ.get("DELIVERY_EVENTS_QUEUE_SIZE", "100")))
+EVENTS_HEARTBEAT_SECONDS = float(os.environ.get("DELIVERY_EVENTS_HEARTBEAT_SECONDS", "15"))
+# Keep proxies (nginx) from buffering or caching the stream.
+SSE_HEADERS = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+
+
+def order_topic(order_id: Any) -> str:
+    return f"order:{order_id}"
+
+
+def courier_topic(courier_id: Any) -> str:
+    return f"courier:{courier_id}"
+
+
+class Subscription:
+    # Bounded per-subscriber queue fed from any thread and drained by one
+    # coroutine. When the subscriber falls behind, the oldest events are
+    # dropped (and counted) so a slow client never holds memory or blocks
+    # publishers.
+
+    def __init__(self, bus: "EventBus", topics: Iterable[str], loop: asyncio.AbstractEventLoop,
+                 maxsize: int = EVENTS_QUEUE_SIZE):
+        self.topics = list(topics)
+        self.dropped = 0
+        self._bus = bus
+        self._loop = loop
+        self._queue: deque = deque(maxlen=maxsize)
+        self._ready = asyncio.Event()
+        self._signaled = False
+        self._lock = threading.Lock()
+        self.closed = False
+
+    def push(self, event: Dict[str, Any]) -> None:
+        with self._lock:
+            if self.closed:
+                return
+            if len(self._queue) == self._queue.maxlen:
+                self.dropped += 1
+            self._queue.append(event)
+            if self._signaled:
+                return
+            self._signaled = True
+        try:
+            self._loop.call_soon_threadsafe(self._ready.set)
+        except RuntimeError:
+            pass
+
+    async def get(self, timeout: Optional[float] = None) -> List[Dict[str, Any]]:
+        # Every queued event, or [] after timeout seconds without any.
+        try:
+            await asyncio.wait_for(self._ready.wait(), timeout)
+        except asyncio.TimeoutError:
+            return []
+        with self._lock:
+            events = list(self._queue)
+            self._queue.clear()
+            self._ready.clear()
+            self._signaled = False
+        return events
+
+    def close(self) -> None:
+        with self._lock:
+            self.closed = True
+        self._bus.unsubscribe(self)
+
+
+class EventBus:
+    # In-process pub/sub for order and courier updates. Publishing to a topic
+    # without subscribers is a dict lookup.
+
+    def __init__(self):
+        self._topics: Dict[str, List[Subscription]] = {}
+        self._lock = threading.Lock()
+        self._last_id = 0
+        self.published = 0
+        self.delivered = 0
+
+    def subscribe(self, topics: Iterable[str], maxsize: int = EVENTS_QUEUE_SIZE) -> Subscription:
+        sub = Subscription(self, topics, asyncio.get_running_loop(), maxsize)
+        with self._lock:
+            for topic in sub.topics:
+                self._topics.setdefault(topic, []).append(sub)
+        return sub
+
+    def unsubscribe(self, sub: Subscription) -> None:
+        with self._lock:
+            for topic in sub.topics:
+                subs = self._topics.get(topic)
+                if subs and sub in subs:
+                    subs.remove(sub)
+                    if not subs:
+                        del self._topics[topic]
+
+    def last_id(self) -> int:
+        # Id of the latest published event. A stream subscribes, then takes
+        # this, then reads its snapshot: queued events up to it are already
+        # in the snapshot, later ones may or may not be.
+        with self._lock:
+            return self._last_id
+
+    def has_subscribers(self, topic: str) -> bool:
+        return topic in self._topics
+
+    def publish(self, topic: str, kind: str, data: Dict[str, Any]) -> int:
+        subs = self._topics.get(topic)
+        if not subs:
+            return 0
+        with self._lock:
+            subs = list(self._topics.get(topic) or ())
+            self._last_id += 1
+            event = {"id": self._last_id, "topic": topic, "event": kind, "data": data, "at": time.time()}
+            self.published += 1
+            self.delivered += len(subs)
+        for sub in subs:
+            sub.push(event)
+        return len(subs)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            subs = {id(s): s for group in self._topics.values() for s in group}
+            return {
+                "topics": len(self._topics),
+                "subscribers": len(subs),
+                "published": self.published,
+                "delivered": self.delivered,
+                "dropped": sum(s.dropped for s in subs.values()),
+            }
+
+
+def sse_format(event: Dict[str, Any]) -> str:
+    payload = json.dumps(event["data"], ensure_ascii=False)
+    return f"id: {event['id']}\nevent: {event['event']}\ndata: {payload}\n\n"
+
+
+async def sse_stream(sub: Subscription, first: Optional[Dict[str, Any]] = None,
+                     heartbeat: float = EVENTS_HEARTBEAT_SECONDS):
+    # Server-Sent Events body for a subscription: an optional initial event,
+    # then every published event, with a comment line as keep-alive. Events
+    # whose id is not above the initial event's (see EventBus.last_id) are
+    # already reflected in it and skipped.
+    seen = first["id"] if first is not None else 0
+    try:
+        yield "retry: 3000\n\n"
+        if first is not None:
+            yield sse_format(first)
+        while True:
+            events = await sub.get(heartbeat)
+            if not events:
+                yield ": ping\n\n"
+                continue
+            for event in events:
+                if event["id"] > seen:
+                    yield sse_format(event)
+    finally:
+        sub.close()
+
+
+_bus = EventBus()
+
+
+def get_event_bus() -> EventBus:
+    return _bus
+
+
+def publish(topic: str, kind: str, data: Dict[str, Any]) -> int:
+    return _bus.publish(topic, kind, data)
+
+
+def publish_order(order: Any, kind: str = "status", **extra) -> int:
+    # The order (a model) is turned into its JSON shape only when someone
+    # is listening.
+    topic = order_topic(order.id)
+    if not _bus.has_subscribers(topic):
+        return 0
+    data = {"order_id": order.id, "status": order.status, "order": order.to_dict(), **extra}
+    return _bus.publish(topic, kind, data)
+
+
+def publish_courier(courier: Any, kind: str, **extra) -> int:
+    data = {
+        "courier_id": courier.id,
+        "available": courier.available,
+        "current_order_ids": courier.current_order_ids,
+        **extra,
+    }
+    return _bus.publish(courier_topic(courier.id), kind, data)
+
+
+def publish_positions(couriers: Iterable[Any], timestamps: Dict[Any, float]) -> None:
+    # Position deltas go to the courier's topic and to each order it carries.
+    for courier in couriers:
+        cid = courier.id
+        data = {"courier_id": cid, "lat": courier.lat, "lng": courier.lng, "timestamp": timestamps.get(cid)}
+        _bus.publish(courier_topic(cid), "position", data)
+        for order_id in courier.current_order_ids:
+            _bus.publish(order_topic(order_id), "position", data)
@@ -14,22 +14,56 @@ if _ENV.exists():
     from dotenv import load_dotenv
     load_dotenv(_ENV)
 
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI, Request
-from fastapi.responses import HTMLResponse, JSONResponse
+from fastapi.responses import HTMLResponse, JSONResponse, Response
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
 import uvicorn
 
-from app.routes import delivery, payments, couriers, notifications, orders
+from app.routes import delivery, payments, couriers, notifications, orders, profiling
+from app import metrics, profiler
+# Imported for their side effect: they register the outbox SMS handlers.
+from app import notify_sms, sms_service  # noqa: F401
+from app.outbox import get_outbox
+from app.services.archive_service import get_order_archiver
+from app.services.dispatch_scheduler import get_dispatch_scheduler
+from app.services.io_executor import run_read
+from app.services.location_service import get_location_tracker
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    get_outbox().start()
+    get_dispatch_scheduler().start()
+    get_location_tracker().start()
+    get_order_archiver().start()
+    if metrics.METRICS_ENABLED:
+        metrics.get_loop_lag_monitor().start()
+    yield
+    await metrics.get_loop_lag_monitor().stop()
+    await get_order_archiver().stop()
+    await get_dispatch_scheduler().stop()
+    get_location_tracker().stop()
+    get_outbox().stop()
+
 
 app = FastAPI(
     title="MVP Delivery Local",
     description="Plataforma de delivery para negocios de barrio en Medellín",
     version="1.0.0",
     docs_url=None,
-    redoc_url=None
+    redoc_url=None,
+    lifespan=lifespan,
 )
 
+# Added first so it sits inside the metrics middleware, next to the router.
+if profiler.PROFILER_ENABLED:
+    app.add_middleware(profiler.ProfilerMiddleware)
+if metrics.METRICS_ENABLED:
+    app.add_middleware(metrics.MetricsMiddleware)
+
 _FRONTEND = _PROJECT_ROOT / "frontend"
 app.mount("/static", StaticFiles(directory=str(_FRONTEND / "static")), name="static")
 templates = Jinja2Templates(directory=str(_FRONTEND / "templates"))
@@ -39,6 +73,7 @@ app.include_router(payments.router, prefix="/api/payments", tags=["Pagos"])
 app.include_router(couriers.router, prefix="/api/couriers", tags=["Repartidores"])
 app.include_router(notifications.router, prefix="/api/notifications", tags=["Notificaciones"])
 app.include_router(orders.router, prefix="/orders", tags=["Orders"])
+app.include_router(profiling.router, prefix="/api/profiler", tags=["Perfilador"])
 
 
 @app.exception_handler(UnicodeEncodeError)
@@ -49,6 +84,11 @@ def unicode_encode_error_handler(request: Request, exc: UnicodeEncodeError):
     )
 
 
+@app.get("/metrics", include_in_schema=False)
+async def get_metrics():
+    return Response(await run_read(metrics.REGISTRY.render), media_type=metrics.CONTENT_TYPE)
+
+
 @app.get("/", response_class=HTMLResponse)
 async def root(request: Request):
     return templates.TemplateResponse("index.html", {"request": request})
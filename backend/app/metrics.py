@@ -0,0 +1,324 @@
+import asyncio
+import os
+import threading
+import time
+from bisect import bisect_left
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+METRICS_ENABLED = os.environ.get("DELIVERY_METRICS", "1").strip().lower() not in ("0", "false", "no")
+LOOP_LAG_INTERVAL_SECONDS = float(os.environ.get("DELIVERY_METRICS_LOOP_LAG_INTERVAL_SECONDS", "0.5"))
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Seconds; le="+Inf" is implicit.
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+LAG_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+# (labels, value) pairs of one metric family, as produced by a collector.
+Samples = Iterable[Tuple[Dict[str, Any], float]]
+
+
+class Counter:
+    __slots__ = ("value", "_lock")
+
+    def __init__(self):
+        self.value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0) -> None:
+        with self._lock:
+            self.value += amount
+
+
+class Histogram:
+    # Cumulative buckets are computed at scrape time; observe() only bumps
+    # one preallocated slot.
+    __slots__ = ("bounds", "counts", "sum", "_lock")
+
+    def __init__(self, bounds: Sequence[float] = LATENCY_BUCKETS):
+        self.bounds = tuple(bounds)
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float) -> None:
+        i = bisect_left(self.bounds, value)
+        with self._lock:
+            self.counts[i] += 1
+            self.sum += value
+
+    def snapshot(self) -> Tuple[List[int], float]:
+        with self._lock:
+            return list(self.counts), self.sum
+
+
+class Family:
+    # A named metric with label names; children are created on first use of
+    # a label combination and reused afterwards.
+
+    def __init__(self, name: str, kind: str, help_text: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = LATENCY_BUCKETS):
+        self.name = name
+        self.kind = kind
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._children: Dict[Tuple[str, ...], Any] = {}
+        self._lock = threading.Lock()
+
+    def labels(self, *values: Any) -> Any:
+        child = self._children.get(values)
+        if child is None:
+            with self._lock:
+                child = self._children.get(values)
+                if child is None:
+                    child = Histogram(self.buckets) if self.kind == "histogram" else Counter()
+                    self._children[values] = child
+        return child
+
+    def render(self, out: List[str]) -> None:
+        with self._lock:
+            children = list(self._children.items())
+        _header(out, self.name, self.kind, self.help)
+        for values, child in children:
+            labels = dict(zip(self.labelnames, values))
+            if self.kind == "histogram":
+                _render_histogram(out, self.name, labels, child)
+            else:
+                out.append(f"{self.name}{_labels(labels)} {_number(child.value)}")
+
+
+def _escape(value: Any) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(labels: Dict[str, Any]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in labels.items()) + "}"
+
+
+def _number(value: float) -> str:
+    value = float(value)
+    if value == float("inf"):
+        return "+Inf"
+    return str(int(value)) if value.is_integer() else repr(value)
+
+
+def _header(out: List[str], name: str, kind: str, help_text: str) -> None:
+    out.append(f"# HELP {name} {help_text}")
+    out.append(f"# TYPE {name} {kind}")
+
+
+def _render_histogram(out: List[str], name: str, labels: Dict[str, Any], histogram: Histogram) -> None:
+    counts, total = histogram.snapshot()
+    running = 0
+    for bound, count in zip(histogram.bounds + (float("inf"),), counts):
+        running += count
+        out.append(f"{name}_bucket{_labels({**labels, 'le': _number(bound)})} {running}")
+    out.append(f"{name}_sum{_labels(labels)} {_number(total)}")
+    out.append(f"{name}_count{_labels(labels)} {running}")
+
+
+class Registry:
+
+    def __init__(self):
+        self.families: List[Family] = []
+        self.collectors: List[Tuple[str, str, str, Callable[[], Samples]]] = []
+        self._lock = threading.Lock()
+
+    def family(self, name: str, kind: str, help_text: str, labelnames: Sequence[str] = (),
+               buckets: Sequence[float] = LATENCY_BUCKETS) -> Family:
+        fam = Family(name, kind, help_text, labelnames, buckets)
+        with self._lock:
+            self.families.append(fam)
+        return fam
+
+    def collector(self, name: str, kind: str, help_text: str, collect: Callable[[], Samples]) -> None:
+        # Values read at scrape time (queue depths, cache counters kept by
+        # their owners), so the hot paths pay nothing for them.
+        with self._lock:
+            self.collectors.append((name, kind, help_text, collect))
+
+    def render(self) -> str:
+        out: List[str] = []
+        with self._lock:
+            families, collectors = list(self.families), list(self.collectors)
+        for fam in families:
+            fam.render(out)
+        for name, kind, help_text, collect in collectors:
+            try:
+                samples = list(collect())
+            except Exception:
+                continue
+            _header(out, name, kind, help_text)
+            for labels, value in samples:
+                out.append(f"{name}{_labels(labels)} {_number(value)}")
+        return "\n".join(out) + "\n"
+
+
+REGISTRY = Registry()
+
+HTTP_REQUESTS = REGISTRY.family(
+    "parcerogo_http_requests_total", "counter", "Respuestas HTTP por router, ruta y estado.",
+    ("router", "method", "route", "status"),
+)
+HTTP_DURATION = REGISTRY.family(
+    "parcerogo_http_request_duration_seconds", "histogram",
+    "Tiempo hasta el inicio de la respuesta HTTP (sin el cuerpo de los streams SSE).",
+    ("router", "method", "route"),
+)
+STORAGE_LOAD_SECONDS = REGISTRY.family(
+    "parcerogo_storage_load_seconds", "histogram", "Lectura y parseo de un archivo JSON de datos.", ("file",),
+)
+STORAGE_READ_BYTES = REGISTRY.family(
+    "parcerogo_storage_read_bytes_total", "counter", "Bytes leidos de archivos JSON de datos.", ("file",),
+)
+STORAGE_SAVE_SECONDS = REGISTRY.family(
+    "parcerogo_storage_save_seconds", "histogram",
+    "Escritura de datos: snapshot (archivo completo, fsync y rename) o journal (fsync del log).",
+    ("file", "kind"),
+)
+STORAGE_WRITTEN_BYTES = REGISTRY.family(
+    "parcerogo_storage_written_bytes_total", "counter", "Bytes escritos en archivos de datos.", ("file", "kind"),
+)
+LOOP_LAG = REGISTRY.family(
+    "parcerogo_event_loop_lag_seconds", "histogram",
+    "Retraso del event loop al despertar de un sleep (tareas bloqueando el loop).", (), LAG_BUCKETS,
+)
+
+
+def observe_load(file_name: str, seconds: float, size: int) -> None:
+    STORAGE_LOAD_SECONDS.labels(file_name).observe(seconds)
+    STORAGE_READ_BYTES.labels(file_name).inc(size)
+
+
+def observe_save(file_name: str, kind: str, seconds: Optional[float], size: int) -> None:
+    if seconds is not None:
+        STORAGE_SAVE_SECONDS.labels(file_name, kind).observe(seconds)
+    if size:
+        STORAGE_WRITTEN_BYTES.labels(file_name, kind).inc(size)
+
+
+class _Route:
+    __slots__ = ("router", "path", "durations", "statuses")
+
+    def __init__(self, router: str, path: str):
+        self.router = router
+        self.path = path
+        # method -> histogram, (method, status) -> counter
+        self.durations: Dict[str, Histogram] = {}
+        self.statuses: Dict[Tuple[str, int], Counter] = {}
+
+
+class MetricsMiddleware:
+    # Pure ASGI middleware (no per-request task or Request object). Requests
+    # are labelled with the route template they matched and the router
+    # module it belongs to (delivery, payments, couriers, orders,
+    # notifications; main for the pages). Latency is taken when the
+    # response starts, so SSE streams count their setup, not their life.
+
+    def __init__(self, app: Any):
+        self.app = app
+        self._routes: Optional[Dict[Any, _Route]] = None
+        self._static = _Route("static", "/static")
+        self._unmatched = _Route("none", "")
+
+    def _resolve(self, scope: Dict[str, Any]) -> _Route:
+        if self._routes is None:
+            routes = {}
+            for route in getattr(scope.get("app"), "routes", ()):
+                endpoint = getattr(route, "endpoint", None)
+                if endpoint is not None:
+                    router = getattr(endpoint, "__module__", "").rsplit(".", 1)[-1]
+                    routes[endpoint] = _Route(router, route.path)
+            self._routes = routes
+        route = self._routes.get(scope.get("endpoint"))
+        if route is not None:
+            return route
+        if scope.get("path", "").startswith("/static/"):
+            return self._static
+        return self._unmatched
+
+    def _record(self, scope: Dict[str, Any], status: int, seconds: float) -> None:
+        route = self._resolve(scope)
+        method = scope.get("method", "")
+        histogram = route.durations.get(method)
+        if histogram is None:
+            histogram = route.durations[method] = HTTP_DURATION.labels(route.router, method, route.path)
+        histogram.observe(seconds)
+        counter = route.statuses.get((method, status))
+        if counter is None:
+            counter = route.statuses[(method, status)] = HTTP_REQUESTS.labels(
+                route.router, method, route.path, str(status)
+            )
+        counter.inc()
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        start = time.perf_counter()
+        started = False
+
+        async def send_with_metrics(message):
+            nonlocal started
+            if not started and message["type"] == "http.response.start":
+                started = True
+                self._record(scope, message["status"], time.perf_counter() - start)
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_metrics)
+        except BaseException:
+            if not started:
+                self._record(scope, 500, time.perf_counter() - start)
+            raise
+
+
+class LoopLagMonitor:
+    # Sleeps interval seconds at a time and records how late it wakes up:
+    # anything above a millisecond or so is a handler or callback holding
+    # the event loop.
+
+    def __init__(self, interval: float = LOOP_LAG_INTERVAL_SECONDS):
+        self.interval = interval
+        self.last = 0.0
+        self._task: Optional[asyncio.Task] = None
+        self._histogram = LOOP_LAG.labels()
+
+    def start(self) -> None:
+        if self._task is None and self.interval > 0:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self) -> None:
+        task, self._task = self._task, None
+        if task is None:
+            return
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            t0 = loop.time()
+            await asyncio.sleep(self.interval)
+            self.last = max(0.0, loop.time() - t0 - self.interval)
+            self._histogram.observe(self.last)
+
+
+_monitor: Optional[LoopLagMonitor] = None
+_monitor_lock = threading.Lock()
+
+
+def get_loop_lag_monitor() -> LoopLagMonitor:
+    global _monitor
+    if _monitor is None:
+        with _monitor_lock:
+            if _monitor is None:
+                _monitor = LoopLagMonitor()
+                REGISTRY.collector("parcerogo_event_loop_lag_last_seconds", "gauge",
+                                   "Ultimo retraso medido del event loop.", lambda: [({}, _monitor.last)])
+    return _monitor
@@ -1,3 +1,4 @@
+from app.models.record import Record
 from app.models.order import Order, OrderProduct
 from app.models.product import Product
 from app.models.business import Business
@@ -5,6 +6,7 @@ from app.models.courier import Courier
 from app.models.payment import Payment
 
 __all__ = [
+    "Record",
     "Order",
     "OrderProduct",
     "Product",
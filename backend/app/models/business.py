@@ -1,9 +1,11 @@
 from dataclasses import dataclass
-from typing import Optional
+from typing import Any, Dict, Optional
 
+from app.models.record import Record, field_names, split_extra
 
-@dataclass
-class Business:
+
+@dataclass(slots=True)
+class Business(Record):
     id: int
     name: str
     category: str
@@ -14,6 +16,7 @@ class Business:
     rating: float = 0.0
     is_open: bool = True
     delivery_time: int = 30
+    extra: Optional[Dict[str, Any]] = None
 
     @classmethod
     def from_dict(cls, d: dict) -> "Business":
@@ -28,10 +31,11 @@ class Business:
             rating=d.get("rating", 0.0),
             is_open=d.get("is_open", True),
             delivery_time=d.get("delivery_time", 30),
+            extra=split_extra(d, field_names(cls)),
         )
 
     def to_dict(self) -> dict:
-        return {
+        d = {
             "id": self.id,
             "name": self.name,
             "category": self.category,
@@ -43,3 +47,6 @@ class Business:
             "is_open": self.is_open,
             "delivery_time": self.delivery_time,
         }
+        if self.extra:
+            d.update(self.extra)
+        return d
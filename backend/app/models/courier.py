@@ -1,9 +1,11 @@
-from dataclasses import dataclass
-from typing import Optional
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
 
+from app.models.record import Record, field_names, split_extra
 
-@dataclass
-class Courier:
+
+@dataclass(slots=True)
+class Courier(Record):
     id: int
     name: str
     phone: str
@@ -15,6 +17,12 @@ class Courier:
     rating: float = 0.0
     current_order_id: Optional[int] = None
     total_deliveries: int = 0
+    # Orders carried at once and their pickup/drop-off sequence.
+    current_order_ids: List[int] = field(default_factory=list)
+    route: List[dict] = field(default_factory=list)
+    extra: Optional[Dict[str, Any]] = None
+
+    OPTIONAL_FIELDS = frozenset({"current_order_id", "current_order_ids", "route"})
 
     @classmethod
     def from_dict(cls, d: dict) -> "Courier":
@@ -30,6 +38,9 @@ class Courier:
             rating=d.get("rating", 0.0),
             current_order_id=d.get("current_order_id"),
             total_deliveries=d.get("total_deliveries", 0),
+            current_order_ids=d.get("current_order_ids") or [],
+            route=d.get("route") or [],
+            extra=split_extra(d, field_names(cls)),
         )
 
     def to_dict(self) -> dict:
@@ -47,4 +58,9 @@ class Courier:
         }
         if self.current_order_id is not None:
             d["current_order_id"] = self.current_order_id
+        if self.current_order_ids:
+            d["current_order_ids"] = self.current_order_ids
+            d["route"] = self.route
+        if self.extra:
+            d.update(self.extra)
         return d
@@ -1,30 +1,34 @@
+import sys
 from dataclasses import dataclass, field
-from typing import List, Optional, Any
-from datetime import datetime
+from typing import Any, Dict, List, Optional
 
+from app.models.record import Record, field_names, split_extra
 
-@dataclass
-class OrderProduct:
+
+@dataclass(slots=True)
+class OrderProduct(Record):
     product_id: int
     product_name: str
     quantity: int
     unit_price: float
     subtotal: float
     notes: str = ""
+    extra: Optional[Dict[str, Any]] = None
 
     @classmethod
     def from_dict(cls, d: dict) -> "OrderProduct":
         return cls(
             product_id=d["product_id"],
-            product_name=d["product_name"],
+            product_name=sys.intern(d["product_name"]),
             quantity=d["quantity"],
             unit_price=d["unit_price"],
             subtotal=d["subtotal"],
             notes=d.get("notes") or "",
+            extra=split_extra(d, field_names(cls)),
         )
 
     def to_dict(self) -> dict:
-        return {
+        d = {
             "product_id": self.product_id,
             "product_name": self.product_name,
             "quantity": self.quantity,
@@ -32,10 +36,13 @@ class OrderProduct:
             "subtotal": self.subtotal,
             "notes": self.notes,
         }
+        if self.extra:
+            d.update(self.extra)
+        return d
 
 
-@dataclass
-class Order:
+@dataclass(slots=True)
+class Order(Record):
     id: int
     customer_name: str
     customer_phone: str
@@ -60,7 +67,11 @@ class Order:
     courier_name: Optional[str] = None
     created_at: Optional[str] = None
     updated_at: Optional[str] = None
+    batch_size: Optional[int] = None
     status_history: List[dict] = field(default_factory=list)
+    extra: Optional[Dict[str, Any]] = None
+
+    OPTIONAL_FIELDS = frozenset({"courier_id", "courier_name", "updated_at", "batch_size"})
 
     def to_dict(self) -> dict:
         d = {
@@ -93,10 +104,16 @@ class Order:
             d["courier_name"] = self.courier_name
         if self.updated_at is not None:
             d["updated_at"] = self.updated_at
+        if self.batch_size is not None:
+            d["batch_size"] = self.batch_size
+        if self.extra:
+            d.update(self.extra)
         return d
 
     @classmethod
     def from_dict(cls, d: dict) -> "Order":
+        # Statuses, payment fields and business names repeat across every
+        # order; interned, a million cached orders share one copy of each.
         products = [OrderProduct.from_dict(p) for p in d.get("products", [])]
         return cls(
             id=d["id"],
@@ -106,22 +123,24 @@ class Order:
             customer_lat=d["customer_lat"],
             customer_lng=d["customer_lng"],
             business_id=d["business_id"],
-            business_name=d["business_name"],
+            business_name=sys.intern(d["business_name"]),
             business_lat=d["business_lat"],
             business_lng=d["business_lng"],
             products=products,
             total=d["total"],
             distance_km=d["distance_km"],
             estimated_time=d["estimated_time"],
-            payment_method=d.get("payment_method", "efectivo"),
+            payment_method=sys.intern(d.get("payment_method", "efectivo")),
             tip_amount=d.get("tip_amount", 0),
-            payment_status=d.get("payment_status", "pendiente"),
-            status=d["status"],
+            payment_status=sys.intern(d.get("payment_status", "pendiente")),
+            status=sys.intern(d["status"]),
             delivery_person=d.get("delivery_person"),
             courier_phone=d.get("courier_phone"),
             courier_id=d.get("courier_id"),
             courier_name=d.get("courier_name"),
             created_at=d.get("created_at"),
             updated_at=d.get("updated_at"),
+            batch_size=d.get("batch_size"),
             status_history=d.get("status_history") or [],
+            extra=split_extra(d, field_names(cls)),
         )
@@ -1,8 +1,11 @@
 from dataclasses import dataclass
+from typing import Any, Dict, Optional
 
+from app.models.record import Record, field_names, split_extra
 
-@dataclass
-class Payment:
+
+@dataclass(slots=True)
+class Payment(Record):
     id: int
     order_id: int
     amount: float
@@ -10,6 +13,7 @@ class Payment:
     payment_method: str
     status: str
     created_at: str
+    extra: Optional[Dict[str, Any]] = None
 
     @classmethod
     def from_dict(cls, d: dict) -> "Payment":
@@ -21,10 +25,11 @@ class Payment:
             payment_method=d.get("payment_method", "efectivo"),
             status=d["status"],
             created_at=d["created_at"],
+            extra=split_extra(d, field_names(cls)),
         )
 
     def to_dict(self) -> dict:
-        return {
+        d = {
             "id": self.id,
             "order_id": self.order_id,
             "amount": self.amount,
@@ -33,3 +38,6 @@ class Payment:
             "status": self.status,
             "created_at": self.created_at,
         }
+        if self.extra:
+            d.update(self.extra)
+        return d
@@ -1,9 +1,11 @@
 from dataclasses import dataclass
-from typing import Optional
+from typing import Any, Dict, Optional
 
+from app.models.record import Record, field_names, split_extra
 
-@dataclass
-class Product:
+
+@dataclass(slots=True)
+class Product(Record):
     id: int
     business_id: int
     name: str
@@ -12,6 +14,7 @@ class Product:
     category: str = ""
     available: bool = True
     image: str = ""
+    extra: Optional[Dict[str, Any]] = None
 
     @classmethod
     def from_dict(cls, d: dict) -> "Product":
@@ -24,10 +27,11 @@ class Product:
             category=d.get("category", ""),
             available=d.get("available", True),
             image=d.get("image", ""),
+            extra=split_extra(d, field_names(cls)),
         )
 
     def to_dict(self) -> dict:
-        return {
+        d = {
             "id": self.id,
             "business_id": self.business_id,
             "name": self.name,
@@ -37,3 +41,6 @@ class Product:
             "available": self.available,
             "image": self.image,
         }
+        if self.extra:
+            d.update(self.extra)
+        return d
@@ -0,0 +1,74 @@
+from abc import ABC, abstractmethod
+from dataclasses import fields
+from functools import cache
+from typing import Any, Dict, FrozenSet, Iterator, List, Optional, Tuple
+
+
+@cache
+def field_names(cls: type) -> FrozenSet[str]:
+    return frozenset(field_order(cls))
+
+
+@cache
+def field_order(cls: type) -> Tuple[str, ...]:
+    return tuple(f.name for f in fields(cls) if f.name != "extra")
+
+
+def split_extra(d: Dict[str, Any], known: FrozenSet[str]) -> Optional[Dict[str, Any]]:
+    # Keys a model does not declare, kept so they survive a load/save cycle.
+    if d.keys() <= known:
+        return None
+    return {k: v for k, v in d.items() if k not in known}
+
+
+class Record(ABC):
+    # Base of the slotted models. Code works with attributes; the JSON shape
+    # comes from to_dict(). Read access by key (record["id"],
+    # record.get("status"), dict(record)) is kept for scripts and tests that
+    # still treat records as dicts; it reads the attributes directly.
+    __slots__ = ()
+    # Fields to_dict() leaves out while they are empty (None or []).
+    OPTIONAL_FIELDS: FrozenSet[str] = frozenset()
+
+    @abstractmethod
+    def to_dict(self) -> Dict[str, Any]:
+        ...
+
+    def __getitem__(self, key: str) -> Any:
+        if key in field_names(type(self)):
+            return getattr(self, key)
+        extra = getattr(self, "extra", None)
+        if extra and key in extra:
+            return extra[key]
+        raise KeyError(key)
+
+    def _omitted(self, key: str) -> bool:
+        if key not in self.OPTIONAL_FIELDS:
+            return False
+        value = getattr(self, key)
+        return value is None or value == []
+
+    def get(self, key: str, default: Any = None) -> Any:
+        try:
+            value = self[key]
+        except KeyError:
+            return default
+        if value is None and key in self.OPTIONAL_FIELDS:
+            return default
+        return value
+
+    def __contains__(self, key: object) -> bool:
+        if key in field_names(type(self)):
+            return not self._omitted(key)
+        extra = getattr(self, "extra", None)
+        return bool(extra) and key in extra
+
+    def keys(self) -> List[str]:
+        out = [k for k in field_order(type(self)) if not self._omitted(k)]
+        extra = getattr(self, "extra", None)
+        if extra:
+            out.extend(k for k in extra if k not in field_names(type(self)))
+        return out
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.keys())
@@ -2,6 +2,7 @@ import json
 import os
 from datetime import datetime
 
+from app.outbox import TwilioTransport, get_outbox, register_handler
 from app.utils import DATA_DIR, safe_print
 
 LOG_FILE = os.path.join(DATA_DIR, "notifications.log")
@@ -82,31 +83,48 @@ def _log_and_print(message: str, order_id: int):
 
 
 def _send_twilio(to_phone: str, body: str) -> bool:
-    sid = os.environ.get("TWILIO_ACCOUNT_SID", "").strip()
-    token = os.environ.get("TWILIO_AUTH_TOKEN", "").strip()
-    from_phone = os.environ.get("TWILIO_PHONE", "").strip()
-    if not sid or not token or not from_phone:
-        return False
     try:
-        from twilio.rest import Client
-        client = Client(sid, token)
-        client.messages.create(body=body, from_=from_phone, to=to_phone)
-        return True
+        return TwilioTransport().send(to_phone, body)
     except Exception as e:
         safe_print("[!] Error enviando SMS con Twilio:", e)
         return False
 
 
+def _owner_phone() -> str:
+    config = _get_config()
+    return _normalize_phone(config.get("owner_phone") or "") or OWNER_PHONE_DEFAULT
+
+
 def send_new_order_sms(order: dict) -> None:
     try:
         message = _build_sms_text(order)
         order_id = order.get("id", 0)
         _log_and_print(message, order_id)
-        config = _get_config()
-        owner_phone = _normalize_phone(config.get("owner_phone") or "") or OWNER_PHONE_DEFAULT
+        owner_phone = _owner_phone()
         if _send_twilio(owner_phone, message):
             safe_print("[OK] SMS enviado a tu numero:", owner_phone)
         else:
             safe_print("[i] Notificaciones en data/notifications.log")
     except Exception:
         pass
+
+
+def enqueue_new_order_sms(order: dict) -> str:
+    return get_outbox().enqueue("new_order", {
+        "order_id": order.get("id", 0),
+        "message": _build_sms_text(order),
+    })
+
+
+def _deliver_new_order_sms(msg: dict, transport) -> None:
+    payload = msg["payload"]
+    if msg.get("attempts", 0) == 0:
+        _log_and_print(payload["message"], payload["order_id"])
+    owner_phone = _owner_phone()
+    if transport.send(owner_phone, payload["message"]):
+        safe_print("[OK] SMS enviado a tu numero:", owner_phone)
+    else:
+        safe_print("[i] Notificaciones en data/notifications.log")
+
+
+register_handler("new_order", _deliver_new_order_sms)
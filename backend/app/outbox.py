@@ -0,0 +1,393 @@
+import heapq
+import itertools
+import json
+import os
+import random
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional
+
+from app import metrics
+from app.utils import DATA_DIR, fcntl, file_lock, get_current_timestamp, safe_print, write_text_atomic
+
+OUTBOX_FILE = os.path.join(DATA_DIR, "outbox.jsonl")
+SMS_TRANSPORT = os.environ.get("DELIVERY_SMS_TRANSPORT", "twilio").strip().lower() or "twilio"
+SMS_CONCURRENCY = max(1, int(os.environ.get("DELIVERY_SMS_CONCURRENCY", "4")))
+SMS_MAX_ATTEMPTS = max(1, int(os.environ.get("DELIVERY_SMS_MAX_ATTEMPTS", "5")))
+SMS_RETRY_BASE_SECONDS = float(os.environ.get("DELIVERY_SMS_RETRY_BASE_SECONDS", "2"))
+SMS_RETRY_MAX_SECONDS = 300.0
+COMPACT_AFTER_LINES = 1000
+
+
+class TwilioTransport:
+    name = "twilio"
+
+    def send(self, to_phone: str, body: str) -> bool:
+        sid = os.environ.get("TWILIO_ACCOUNT_SID", "").strip()
+        token = os.environ.get("TWILIO_AUTH_TOKEN", "").strip()
+        from_phone = os.environ.get("TWILIO_PHONE", "").strip()
+        if not sid or not token or not from_phone:
+            return False
+        from twilio.rest import Client
+        client = Client(sid, token)
+        client.messages.create(body=body, from_=from_phone, to=to_phone)
+        return True
+
+
+class LocalStubTransport:
+    name = "stub"
+
+    def __init__(self, fail_times: int = 0, delay: float = 0.0):
+        self.sent: List[Dict[str, str]] = []
+        self.fail_times = fail_times
+        self.delay = delay
+        self._lock = threading.Lock()
+
+    def send(self, to_phone: str, body: str) -> bool:
+        if self.delay:
+            time.sleep(self.delay)
+        with self._lock:
+            if self.fail_times > 0:
+                self.fail_times -= 1
+                raise RuntimeError("fallo simulado del transporte SMS")
+            self.sent.append({"to": to_phone, "body": body})
+        return True
+
+
+def default_transport():
+    return LocalStubTransport() if SMS_TRANSPORT == "stub" else TwilioTransport()
+
+
+# kind -> handler(message, transport). Handlers raise to request a retry.
+_handlers: Dict[str, Callable[[Dict[str, Any], Any], Any]] = {}
+
+
+def register_handler(kind: str, handler: Callable[[Dict[str, Any], Any], Any]) -> None:
+    _handlers[kind] = handler
+
+
+class Outbox:
+    # Durable notification queue. enqueue() appends one JSONL line and returns;
+    # a dispatcher thread delivers due messages on a small pool with
+    # exponential backoff, recording "done"/"failed" lines. Pending messages
+    # are rebuilt from the file on start.
+    #
+    # Several workers share the file. Each line is appended under an flock
+    # (path + ".lock"), and each message names the worker that owns it; a
+    # worker holds an flock on its own owner file (path.<owner>.owner) while
+    # it runs. A worker delivers only its own messages, and adopts (with a
+    # "claim" line) those whose owner's lock is free, i.e. whose worker is
+    # gone: on start and whenever it compacts the file.
+
+    def __init__(self, path: str = OUTBOX_FILE, transport=None,
+                 concurrency: int = SMS_CONCURRENCY, max_attempts: int = SMS_MAX_ATTEMPTS,
+                 retry_base: float = SMS_RETRY_BASE_SECONDS):
+        self.path = path
+        self.transport = transport or default_transport()
+        self.concurrency = concurrency
+        self.max_attempts = max_attempts
+        self.retry_base = retry_base
+        self.owner = uuid.uuid4().hex
+        self._lock_path = path + ".lock"
+        self._owner_fh = None
+        self._cond = threading.Condition()
+        self._pending: Dict[str, Dict[str, Any]] = {}
+        self._due: List = []
+        self._tie = itertools.count()
+        self._in_flight = 0
+        self._lines = 0
+        self._fh = None
+        self._thread: Optional[threading.Thread] = None
+        self._pool: Optional[ThreadPoolExecutor] = None
+        self._stopping = False
+        self.sent = 0
+        self.failed = 0
+        self.retries = 0
+        self.adopted = 0
+        self._hold_owner()
+        with file_lock(self._lock_path):
+            state, self._lines = self._read_state()
+            self._adopt(state)
+
+    def _owner_path(self, owner: str) -> str:
+        return f"{self.path}.{owner}.owner"
+
+    def _hold_owner(self) -> None:
+        if fcntl is None or self._owner_fh is not None:
+            return
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self._owner_fh = open(self._owner_path(self.owner), "a")
+        fcntl.flock(self._owner_fh, fcntl.LOCK_EX | fcntl.LOCK_NB)
+
+    def _release_owner(self) -> None:
+        if self._owner_fh is None:
+            return
+        self._owner_fh.close()
+        self._owner_fh = None
+        try:
+            os.remove(self._owner_path(self.owner))
+        except FileNotFoundError:
+            pass
+
+    def _owner_alive(self, owner: Optional[str]) -> bool:
+        # Without flock there is a single worker: every other owner is gone.
+        if owner == self.owner:
+            return True
+        if fcntl is None or not owner:
+            return False
+        path = self._owner_path(owner)
+        try:
+            fh = open(path, "r")
+        except FileNotFoundError:
+            return False
+        with fh:
+            try:
+                fcntl.flock(fh, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                return True
+            fcntl.flock(fh, fcntl.LOCK_UN)
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        return False
+
+    def _read_state(self):
+        # Pending messages in the file, {id: {"owner", "message"}}, and its
+        # line count. Called with the file lock held.
+        state: Dict[str, Dict[str, Any]] = {}
+        lines = 0
+        if not os.path.exists(self.path):
+            return state, lines
+        with open(self.path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    rec = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                lines += 1
+                op, mid = rec.get("op"), rec.get("id")
+                if op == "enqueue":
+                    state[mid] = {"owner": rec.get("owner"), "message": rec["message"]}
+                elif op == "claim" and mid in state:
+                    state[mid]["owner"] = rec.get("owner")
+                elif op == "attempt" and mid in state:
+                    state[mid]["message"]["attempts"] = rec.get("attempts", 0)
+                elif op in ("done", "failed"):
+                    state.pop(mid, None)
+        return state, lines
+
+    def _adopt(self, state: Dict[str, Dict[str, Any]]) -> int:
+        # Takes over the messages of workers that are gone and returns how
+        # many. Called with the file lock held.
+        adopted = 0
+        alive: Dict[Optional[str], bool] = {}
+        now = time.time()
+        for mid, entry in state.items():
+            owner = entry["owner"]
+            if owner == self.owner:
+                continue
+            if owner not in alive:
+                alive[owner] = self._owner_alive(owner)
+            if alive[owner]:
+                continue
+            self._write_line({"op": "claim", "id": mid, "owner": self.owner})
+            entry["owner"] = self.owner
+            self._pending[mid] = entry["message"]
+            heapq.heappush(self._due, (now, next(self._tie), mid))
+            adopted += 1
+        self.adopted += adopted
+        return adopted
+
+    def _write_line(self, rec: Dict[str, Any]) -> None:
+        # Called with the file lock held. Another worker may have compacted
+        # (replaced) the file since it was opened: follow the new one.
+        if self._fh is not None:
+            try:
+                moved = os.fstat(self._fh.fileno()).st_ino != os.stat(self.path).st_ino
+            except FileNotFoundError:
+                moved = True
+            if moved:
+                self._fh.close()
+                self._fh = None
+        if self._fh is None:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            self._fh = open(self.path, "a", encoding="utf-8")
+        self._fh.write(json.dumps(rec, ensure_ascii=False) + "\n")
+        self._fh.flush()
+        # enqueue() returns only once the message survives a power loss.
+        os.fsync(self._fh.fileno())
+        self._lines += 1
+
+    def _append(self, rec: Dict[str, Any]) -> None:
+        with file_lock(self._lock_path):
+            self._write_line(rec)
+
+    def enqueue(self, kind: str, payload: Dict[str, Any]) -> str:
+        msg = {
+            "id": uuid.uuid4().hex,
+            "kind": kind,
+            "payload": payload,
+            "attempts": 0,
+            "created_at": get_current_timestamp(),
+        }
+        with self._cond:
+            self._append({"op": "enqueue", "id": msg["id"], "owner": self.owner, "message": msg})
+            self._pending[msg["id"]] = msg
+            heapq.heappush(self._due, (time.time(), next(self._tie), msg["id"]))
+            self._cond.notify()
+        self.start()
+        return msg["id"]
+
+    def depth(self) -> int:
+        with self._cond:
+            return len(self._pending)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            return {
+                "transport": getattr(self.transport, "name", type(self.transport).__name__),
+                "pending": len(self._pending),
+                "in_flight": self._in_flight,
+                "sent": self.sent,
+                "failed": self.failed,
+                "retries": self.retries,
+                "adopted": self.adopted,
+            }
+
+    def start(self) -> None:
+        if self._thread is not None:
+            return
+        with self._cond:
+            if self._thread is not None:
+                return
+            self._stopping = False
+            self._hold_owner()
+            self._pool = ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="outbox-send")
+            self._thread = threading.Thread(target=self._run, name="outbox-dispatcher", daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout: float = 5.0) -> None:
+        with self._cond:
+            if self._thread is None:
+                return
+            self._stopping = True
+            self._cond.notify_all()
+            thread, pool = self._thread, self._pool
+        thread.join(timeout)
+        pool.shutdown(wait=True)
+        with self._cond:
+            self._thread = None
+            self._pool = None
+            if self._fh is not None:
+                self._fh.close()
+                self._fh = None
+            # Whatever is still pending goes to the next worker that starts
+            # or compacts.
+            self._release_owner()
+
+    def drain(self, timeout: float = 5.0) -> bool:
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while self._pending:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+            return True
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                while not self._stopping:
+                    if self._due and self._in_flight < self.concurrency:
+                        wait = self._due[0][0] - time.time()
+                        if wait <= 0:
+                            break
+                    else:
+                        wait = None
+                    if self._maybe_compact():
+                        continue
+                    self._cond.wait(wait)
+                if self._stopping:
+                    return
+                _, _, msg_id = heapq.heappop(self._due)
+                msg = self._pending.get(msg_id)
+                if msg is None:
+                    continue
+                self._in_flight += 1
+            self._pool.submit(self._deliver, msg)
+
+    def _deliver(self, msg: Dict[str, Any]) -> None:
+        error = None
+        handler = _handlers.get(msg["kind"])
+        try:
+            if handler is None:
+                raise LookupError("sin handler para '{}'".format(msg["kind"]))
+            handler(msg, self.transport)
+        except Exception as e:
+            error = e
+        with self._cond:
+            self._in_flight -= 1
+            if error is None:
+                self.sent += 1
+                self._pending.pop(msg["id"], None)
+                self._append({"op": "done", "id": msg["id"]})
+            else:
+                msg["attempts"] += 1
+                if msg["attempts"] >= self.max_attempts:
+                    self.failed += 1
+                    self._pending.pop(msg["id"], None)
+                    self._append({"op": "failed", "id": msg["id"], "error": str(error)})
+                    safe_print("[!] SMS descartado tras {} intentos: {}".format(msg["attempts"], error))
+                else:
+                    self.retries += 1
+                    delay = min(SMS_RETRY_MAX_SECONDS, self.retry_base * (2 ** (msg["attempts"] - 1)))
+                    delay *= random.uniform(0.8, 1.2)
+                    self._append({"op": "attempt", "id": msg["id"], "attempts": msg["attempts"]})
+                    heapq.heappush(self._due, (time.time() + delay, next(self._tie), msg["id"]))
+            self._cond.notify_all()
+
+    def _maybe_compact(self) -> bool:
+        # Called with the lock held while the dispatcher is idle: rewrite the
+        # file with only the still-pending messages. The file is re-read
+        # under the file lock, so other workers' messages are kept (they
+        # reopen it on their next append). True if it adopted messages.
+        if self._lines < COMPACT_AFTER_LINES or self._in_flight:
+            return False
+        with file_lock(self._lock_path):
+            state, _ = self._read_state()
+            adopted = self._adopt(state)
+            lines = [json.dumps({"op": "enqueue", "id": mid, "owner": entry["owner"], "message": entry["message"]},
+                                ensure_ascii=False)
+                     for mid, entry in state.items()]
+            if self._fh is not None:
+                self._fh.close()
+                self._fh = None
+            write_text_atomic(self.path, "".join(line + "\n" for line in lines))
+        self._lines = len(lines)
+        return adopted > 0
+
+
+_outbox: Optional[Outbox] = None
+_outbox_lock = threading.Lock()
+
+
+def get_outbox() -> Outbox:
+    global _outbox
+    if _outbox is None:
+        with _outbox_lock:
+            if _outbox is None:
+                _outbox = Outbox()
+                for field, name, kind, help_text in (
+                    ("pending", "parcerogo_sms_outbox_pending", "gauge", "SMS en cola esperando envio o reintento."),
+                    ("in_flight", "parcerogo_sms_outbox_in_flight", "gauge", "SMS enviandose en este momento."),
+                    ("sent", "parcerogo_sms_sent_total", "counter", "SMS enviados."),
+                    ("failed", "parcerogo_sms_failed_total", "counter", "SMS descartados tras agotar reintentos."),
+                    ("retries", "parcerogo_sms_retries_total", "counter", "Reintentos de envio de SMS."),
+                ):
+                    metrics.REGISTRY.collector(name, kind, help_text,
+                                               lambda field=field: [({}, _outbox.stats()[field])])
+    return _outbox
@@ -0,0 +1,447 @@
+import contextvars
+import cProfile
+import functools
+import hmac
+import io
+import marshal
+import os
+import pstats
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Any, Callable, Dict, List, Optional
+
+# Without a token the profiler is not installed at all: no middleware, and
+# the /api/profiler endpoints answer 404.
+PROFILER_TOKEN = os.environ.get("DELIVERY_PROFILER_TOKEN", "").strip()
+PROFILER_ENABLED = bool(PROFILER_TOKEN)
+PROFILER_SAMPLE_INTERVAL_MS = float(os.environ.get("DELIVERY_PROFILER_SAMPLE_INTERVAL_MS", "5"))
+# Upper bound on profiled requests kept between two starts (sessions and
+# X-Profile requests together), so results cannot grow without limit.
+PROFILER_MAX_REQUESTS = max(1, int(os.environ.get("DELIVERY_PROFILER_MAX_REQUESTS", "1000")))
+PROFILER_DEFAULT_REQUESTS = 20
+PROFILER_MAX_SECONDS = 3600
+PROFILER_PATH = "/api/profiler"
+MODES = ("sample", "cprofile")
+MAX_STACK_DEPTH = 128
+
+_BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__))) + os.sep
+_SITE_PACKAGES = "site-packages" + os.sep
+
+# The profiled request the current task (and the IO calls it makes, which
+# copy its context) belongs to.
+_current: contextvars.ContextVar[Optional["_Request"]] = contextvars.ContextVar("profiled_request", default=None)
+
+
+class _Request:
+    __slots__ = ("mode", "loop_thread", "start", "profile", "profiles", "stacks")
+
+    def __init__(self, mode: str):
+        self.mode = mode
+        self.loop_thread = threading.get_ident()
+        self.start = time.perf_counter()
+        # cProfile: one Profile for the event-loop side, one per IO call.
+        self.profile = cProfile.Profile() if mode == "cprofile" else None
+        self.profiles: List[cProfile.Profile] = []
+        self.stacks: Counter = Counter()
+
+
+class _RouteProfile:
+    __slots__ = ("requests", "seconds", "max_seconds", "samples", "stacks", "profiles")
+
+    def __init__(self):
+        self.requests = 0
+        self.seconds = 0.0
+        self.max_seconds = 0.0
+        self.samples = 0
+        self.stacks: Counter = Counter()
+        self.profiles: List[cProfile.Profile] = []
+
+
+def _short_path(path: str) -> str:
+    if path.startswith(_BACKEND_DIR):
+        return path[len(_BACKEND_DIR):]
+    if _SITE_PACKAGES in path:
+        return path.split(_SITE_PACKAGES, 1)[1]
+    return os.path.basename(path)
+
+
+class Profiler:
+    # Profiles whole requests, armed either by a session (the next N
+    # requests under a path prefix, or until a deadline) or by a request
+    # carrying X-Profile: <token>. Both modes follow the request across
+    # threads: the event-loop steps of its task and the run_read/run_write
+    # calls it awaits.
+    #   sample:   a thread takes the stack of those threads every few ms;
+    #             exported as collapsed stacks (flamegraph.pl, speedscope).
+    #   cprofile: deterministic cProfile, exported as pstats.
+    # Results are aggregated per route template until the next start.
+
+    def __init__(self, token: str = PROFILER_TOKEN, interval_ms: float = PROFILER_SAMPLE_INTERVAL_MS,
+                 max_requests: int = PROFILER_MAX_REQUESTS):
+        self.token = token.encode("latin-1")
+        self.interval_ms = interval_ms
+        self.max_requests = max_requests
+        self.session: Optional[Dict[str, Any]] = None
+        self.last_session: Optional[Dict[str, Any]] = None
+        self.results: Dict[str, _RouteProfile] = {}
+        self.profiled = 0
+        self._deadline: Optional[float] = None
+        self._inflight = 0
+        # thread id -> request it is running right now (read by the sampler)
+        self._running: Dict[int, _Request] = {}
+        self._sampling = 0
+        self._sampler: Optional[threading.Thread] = None
+        self._labels: Dict[Any, str] = {}
+        self._stop_codes = (_Stepper.__await__.__code__, _run_profiled.__code__)
+        self._lock = threading.Lock()
+
+    def authorized(self, token: Optional[str]) -> bool:
+        return bool(self.token) and token is not None and hmac.compare_digest(token.encode("latin-1"), self.token)
+
+    def start(self, mode: str = "sample", requests: Optional[int] = None, seconds: Optional[float] = None,
+              path: str = "/", interval_ms: Optional[float] = None) -> Dict[str, Any]:
+        if mode not in MODES:
+            raise ValueError("Modo de perfilado no válido: usa sample o cprofile")
+        if requests is None and seconds is None:
+            requests = PROFILER_DEFAULT_REQUESTS
+        if requests is not None and not 1 <= requests <= self.max_requests:
+            raise ValueError(f"requests debe estar entre 1 y {self.max_requests}")
+        if seconds is not None and not 0 < seconds <= PROFILER_MAX_SECONDS:
+            raise ValueError(f"seconds debe estar entre 0 y {PROFILER_MAX_SECONDS}")
+        if interval_ms is not None and not 1 <= interval_ms <= 1000:
+            raise ValueError("interval_ms debe estar entre 1 y 1000")
+        if not path.startswith("/"):
+            raise ValueError("path debe empezar por /")
+        with self._lock:
+            self.results = {}
+            self.profiled = 0
+            if interval_ms is not None:
+                self.interval_ms = interval_ms
+            self._deadline = time.monotonic() + seconds if seconds is not None else None
+            self.session = {
+                "mode": mode,
+                "path": path,
+                "requests": requests if requests is not None else self.max_requests,
+                "seconds": seconds,
+                "remaining": requests if requests is not None else self.max_requests,
+                "interval_ms": self.interval_ms,
+                "started_at": time.time(),
+            }
+            return dict(self.session)
+
+    def stop(self) -> Dict[str, Any]:
+        with self._lock:
+            self._end_session("detenida")
+            return {"session": None, "last_session": self.last_session}
+
+    def _end_session(self, reason: str) -> None:
+        if self.session is not None:
+            self.last_session = {**self.session, "ended_at": time.time(), "reason": reason}
+            self.session = None
+
+    def _active_session(self) -> Optional[Dict[str, Any]]:
+        session = self.session
+        if session is not None and self._deadline is not None and time.monotonic() >= self._deadline:
+            self._end_session("tiempo cumplido")
+            return None
+        return session
+
+    def claim(self, path: str, mode: Optional[str] = None) -> Optional[_Request]:
+        # mode comes from an X-Profile header; otherwise the request counts
+        # against the running session, if it matches.
+        if path.startswith(PROFILER_PATH):
+            return None
+        with self._lock:
+            if self.profiled >= self.max_requests:
+                return None
+            if mode is None:
+                session = self._active_session()
+                if session is None or not path.startswith(session["path"]):
+                    return None
+                mode = session["mode"]
+                session["remaining"] -= 1
+                if session["remaining"] <= 0:
+                    self._end_session("peticiones cumplidas")
+            self.profiled += 1
+            self._inflight += 1
+            req = _Request(mode)
+            if mode == "sample":
+                self._sampling += 1
+                if self._sampler is None:
+                    self._sampler = threading.Thread(target=self._sample_loop, name="profiler-sampler", daemon=True)
+                    self._sampler.start()
+        return req
+
+    def finish(self, req: _Request, route: str) -> None:
+        elapsed = time.perf_counter() - req.start
+        with self._lock:
+            self._inflight -= 1
+            if req.mode == "sample":
+                self._sampling -= 1
+            entry = self.results.get(route)
+            if entry is None:
+                entry = self.results[route] = _RouteProfile()
+            entry.requests += 1
+            entry.seconds += elapsed
+            entry.max_seconds = max(entry.max_seconds, elapsed)
+            if req.stacks:
+                entry.samples += sum(req.stacks.values())
+                entry.stacks.update(req.stacks)
+            if req.profile is not None:
+                entry.profiles.append(req.profile)
+            entry.profiles.extend(req.profiles)
+
+    # Event-loop side: called around every step of the request's task.
+
+    def enter(self, req: _Request) -> None:
+        if req.profile is not None:
+            _enable(req.profile)
+        else:
+            self._running[req.loop_thread] = req
+
+    def leave(self, req: _Request) -> None:
+        if req.profile is not None:
+            req.profile.disable()
+        else:
+            self._running.pop(req.loop_thread, None)
+
+    # Sampler.
+
+    def _label(self, code: Any) -> str:
+        label = self._labels.get(code)
+        if label is None:
+            label = self._labels[code] = f"{code.co_name} ({_short_path(code.co_filename)}:{code.co_firstlineno})"
+        return label
+
+    def _stack(self, frame: Any, on_loop: bool) -> str:
+        labels = []
+        while frame is not None and len(labels) < MAX_STACK_DEPTH:
+            code = frame.f_code
+            if code in self._stop_codes:
+                break
+            labels.append(self._label(code))
+            frame = frame.f_back
+        labels.append("[event-loop]" if on_loop else "[io]")
+        return ";".join(reversed(labels))
+
+    def _sample_loop(self) -> None:
+        while True:
+            with self._lock:
+                if self._sampling <= 0:
+                    self._sampler = None
+                    return
+                interval = self.interval_ms / 1000
+            running = list(self._running.items())
+            if running:
+                frames = sys._current_frames()
+                taken = []
+                for thread_id, req in running:
+                    frame = frames.get(thread_id)
+                    if frame is not None:
+                        taken.append((req, self._stack(frame, thread_id == req.loop_thread)))
+                del frames
+                with self._lock:
+                    for req, stack in taken:
+                        req.stacks[stack] += 1
+            time.sleep(interval)
+
+    # Export.
+
+    def _entries(self, route: Optional[str]) -> List[tuple]:
+        with self._lock:
+            entries = [(name, entry) for name, entry in self.results.items()
+                       if route is None or name == route or name.split(" ", 1)[-1] == route]
+        if not entries:
+            raise ValueError("No hay resultados de perfilado para esa ruta" if route else "No hay resultados de perfilado")
+        return entries
+
+    def status(self) -> Dict[str, Any]:
+        with self._lock:
+            session = self._active_session()
+            routes = [
+                {
+                    "route": name,
+                    "requests": e.requests,
+                    "avg_ms": round(e.seconds / e.requests * 1000, 3),
+                    "max_ms": round(e.max_seconds * 1000, 3),
+                    "samples": e.samples,
+                    "profiles": len(e.profiles),
+                }
+                for name, e in self.results.items()
+            ]
+            out = {
+                "session": dict(session) if session else None,
+                "last_session": self.last_session,
+                "in_flight": self._inflight,
+                "profiled": self.profiled,
+                "max_requests": self.max_requests,
+            }
+        routes.sort(key=lambda r: r["avg_ms"] * r["requests"], reverse=True)
+        out["routes"] = routes
+        return out
+
+    def collapsed(self, route: Optional[str] = None) -> str:
+        # One "root;...;leaf count" line per distinct stack, with the route
+        # as the root frame.
+        lines = []
+        for name, entry in self._entries(route):
+            with self._lock:
+                stacks = list(entry.stacks.items())
+            lines.extend(f"{name};{stack} {count}" for stack, count in stacks)
+        if not lines:
+            raise ValueError("No hay muestras: perfila con mode=sample")
+        lines.sort()
+        return "\n".join(lines) + "\n"
+
+    def _stats(self, route: Optional[str], stream: Any = None) -> pstats.Stats:
+        profiles = []
+        for _, entry in self._entries(route):
+            with self._lock:
+                profiles.extend(entry.profiles)
+        if not profiles:
+            raise ValueError("No hay datos de cProfile: perfila con mode=cprofile")
+        return pstats.Stats(*profiles, stream=stream)
+
+    def pstats_dump(self, route: Optional[str] = None) -> bytes:
+        # Same bytes as Stats.dump_stats(): load with pstats.Stats(path) or
+        # snakeviz.
+        return marshal.dumps(self._stats(route).stats)
+
+    def pstats_text(self, route: Optional[str] = None, limit: int = 40) -> str:
+        out = io.StringIO()
+        self._stats(route, out).sort_stats("cumulative").print_stats(limit)
+        return out.getvalue()
+
+
+def _enable(profile: cProfile.Profile) -> None:
+    try:
+        profile.enable()
+    except ValueError:
+        # Another profiler already owns the hook; this step goes unprofiled.
+        pass
+
+
+def _run_profiled(req: _Request, fn: Callable, *args, **kwargs) -> Any:
+    if req.mode == "cprofile":
+        profile = cProfile.Profile()
+        _enable(profile)
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            profile.disable()
+            req.profiles.append(profile)
+    profiler = get_profiler()
+    thread_id = threading.get_ident()
+    profiler._running[thread_id] = req
+    try:
+        return fn(*args, **kwargs)
+    finally:
+        profiler._running.pop(thread_id, None)
+
+
+def bind(fn: Callable) -> Callable:
+    # Called by the IO executor on the event loop for every submitted call:
+    # unprofiled requests get fn back untouched.
+    req = _current.get()
+    if req is None:
+        return fn
+    return functools.partial(_run_profiled, req, fn)
+
+
+class _Stepper:
+    # Drives the request's coroutine one step at a time, so the profile is
+    # switched on only while this request (not the others sharing the event
+    # loop) is running.
+    __slots__ = ("coro", "req", "profiler")
+
+    def __init__(self, coro: Any, req: _Request, profiler: Profiler):
+        self.coro = coro
+        self.req = req
+        self.profiler = profiler
+
+    def __await__(self):
+        coro, req, profiler = self.coro, self.req, self.profiler
+        step, value = coro.send, None
+        while True:
+            profiler.enter(req)
+            try:
+                yielded = step(value)
+            except StopIteration as stop:
+                return stop.value
+            finally:
+                profiler.leave(req)
+            try:
+                value = yield yielded
+                step = coro.send
+            except GeneratorExit:
+                coro.close()
+                raise
+            except BaseException as e:
+                step, value = coro.throw, e
+
+
+class ProfilerMiddleware:
+    # Pure ASGI middleware, only installed when DELIVERY_PROFILER_TOKEN is
+    # set. Idle, it costs a scan of the request headers for X-Profile.
+
+    def __init__(self, app: Any, profiler: Optional["Profiler"] = None):
+        self.app = app
+        self.profiler = profiler or get_profiler()
+        self._routes: Optional[Dict[Any, str]] = None
+
+    def _requested_mode(self, scope: Dict[str, Any]) -> Optional[str]:
+        token = mode = None
+        for name, value in scope.get("headers", ()):
+            if name == b"x-profile":
+                token = value
+            elif name == b"x-profile-mode":
+                mode = value
+        if token is None or not hmac.compare_digest(token, self.profiler.token):
+            return None
+        mode = mode.decode("latin-1").strip().lower() if mode else "sample"
+        return mode if mode in MODES else "sample"
+
+    def _route(self, scope: Dict[str, Any]) -> str:
+        if self._routes is None:
+            self._routes = {
+                route.endpoint: route.path
+                for route in getattr(scope.get("app"), "routes", ())
+                if getattr(route, "endpoint", None) is not None
+            }
+        path = self._routes.get(scope.get("endpoint"))
+        if path is None:
+            path = "/static" if scope.get("path", "").startswith("/static/") else "sin ruta"
+        return f"{scope.get('method', '')} {path}"
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        mode = self._requested_mode(scope)
+        req = None
+        if mode is not None or self.profiler.session is not None:
+            req = self.profiler.claim(scope.get("path", ""), mode)
+        if req is None:
+            await self.app(scope, receive, send)
+            return
+        token = _current.set(req)
+        try:
+            await _Stepper(self.app(scope, receive, send), req, self.profiler)
+        finally:
+            _current.reset(token)
+            self.profiler.finish(req, self._route(scope))
+
+
+_profiler: Optional[Profiler] = None
+_profiler_lock = threading.Lock()
+
+
+def get_profiler() -> Profiler:
+    global _profiler
+    if _profiler is None:
+        with _profiler_lock:
+            if _profiler is None:
+                _profiler = Profiler()
+    return _profiler
@@ -1,15 +1,33 @@
-from app.repositories.json_repository import JsonRepository
+from app.repositories.json_repository import JsonRepository, HashIndex, SortedIndex
+from app.repositories.spatial_index import GridIndex
 from app.repositories.order_repository import OrderRepository
 from app.repositories.product_repository import ProductRepository
 from app.repositories.business_repository import BusinessRepository
 from app.repositories.courier_repository import CourierRepository
 from app.repositories.payment_repository import PaymentRepository
+from app.repositories.factory import (
+    STORAGE_BACKEND,
+    order_repository,
+    product_repository,
+    business_repository,
+    courier_repository,
+    payment_repository,
+)
 
 __all__ = [
     "JsonRepository",
+    "HashIndex",
+    "SortedIndex",
+    "GridIndex",
     "OrderRepository",
     "ProductRepository",
     "BusinessRepository",
     "CourierRepository",
     "PaymentRepository",
+    "STORAGE_BACKEND",
+    "order_repository",
+    "product_repository",
+    "business_repository",
+    "courier_repository",
+    "payment_repository",
 ]
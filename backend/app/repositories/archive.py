@@ -0,0 +1,227 @@
+import glob
+import gzip
+import json
+import os
+import threading
+import zlib
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from app.models import Order
+from app.repositories.order_repository import _normalize_phone
+from app.utils import DATA_DIR, file_lock, safe_print, write_text_atomic
+
+ARCHIVE_DIR = os.path.join(DATA_DIR, "archive", "orders")
+# Decoded day segments kept in memory for repeated lookups.
+ARCHIVE_CACHED_SEGMENTS = 4
+
+
+def _day(order: Order) -> str:
+    created = str(order.created_at or "")
+    return created[:10] if len(created) >= 10 else "sin-fecha"
+
+
+class OrderArchive:
+    # Orders moved out of orders.json, one gzip JSON Lines segment per
+    # creation day (orders-2026-01-31.jsonl.gz) plus a sidecar
+    # (orders-2026-01-31.idx.json) listing each order's id, created_at and
+    # phone. The sidecars are loaded into memory on first use, so lookups by
+    # id or phone only open the segments that hold the answer.
+    #
+    # Several workers may share the directory: appends run under an flock
+    # (.lock) and bump a counter in the "generation" file, and a worker
+    # reloads its index (and drops its cached segments) when the counter no
+    # longer matches the one it loaded.
+
+    def __init__(self, directory: str = ARCHIVE_DIR, cached_segments: int = ARCHIVE_CACHED_SEGMENTS):
+        self.directory = directory
+        self.cached_segments = cached_segments
+        self._ids: Optional[Dict[int, Tuple[str, str]]] = None
+        self._max_id = 0
+        self._generation = 0
+        self._phones: Dict[str, List[int]] = {}
+        self._segments: "OrderedDict[str, Dict[int, Order]]" = OrderedDict()
+        self._lock = threading.RLock()
+        self.segment_reads = 0
+
+    def _segment_path(self, day: str) -> str:
+        return os.path.join(self.directory, f"orders-{day}.jsonl.gz")
+
+    def _sidecar_path(self, day: str) -> str:
+        return os.path.join(self.directory, f"orders-{day}.idx.json")
+
+    def _generation_path(self) -> str:
+        return os.path.join(self.directory, "generation")
+
+    def _read_generation(self) -> int:
+        try:
+            with open(self._generation_path(), "r", encoding="utf-8") as f:
+                return int(f.read() or 0)
+        except (OSError, ValueError):
+            return 0
+
+    def _read_sidecar(self, day: str) -> List[List[Any]]:
+        try:
+            with open(self._sidecar_path(day), "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, json.JSONDecodeError):
+            return []
+        return data.get("orders", []) if isinstance(data, dict) else []
+
+    def _index(self) -> Dict[int, Tuple[str, str]]:
+        generation = self._read_generation()
+        if self._ids is not None and generation == self._generation:
+            return self._ids
+        with self._lock:
+            if self._ids is None or generation != self._generation:
+                ids: Dict[int, Tuple[str, str]] = {}
+                phones: Dict[str, List[int]] = {}
+                for path in sorted(glob.glob(os.path.join(self.directory, "orders-*.idx.json"))):
+                    day = os.path.basename(path)[len("orders-"):-len(".idx.json")]
+                    for oid, created_at, phone in self._read_sidecar(day):
+                        if oid not in ids:
+                            phones.setdefault(phone, []).append(oid)
+                        ids[oid] = (day, created_at)
+                self._phones = phones
+                self._max_id = max((oid for oid in ids if isinstance(oid, int)), default=0)
+                self._ids = ids
+                self._generation = generation
+                # Another worker may have appended to a cached day.
+                self._segments.clear()
+        return self._ids
+
+    def _segment(self, day: str) -> Dict[int, Order]:
+        with self._lock:
+            records = self._segments.get(day)
+            if records is not None:
+                self._segments.move_to_end(day)
+                return records
+            records = {}
+            skipped = 0
+            try:
+                # Each append adds a gzip member; later copies of an id win.
+                with gzip.open(self._segment_path(day), "rt", encoding="utf-8") as f:
+                    for line in f:
+                        if not line.strip():
+                            continue
+                        try:
+                            record = Order.from_dict(json.loads(line))
+                        except (AttributeError, KeyError, TypeError, ValueError):
+                            # Torn or corrupt line: the rest of the day is still readable.
+                            skipped += 1
+                            continue
+                        records[record.id] = record
+            except (OSError, EOFError, ValueError, zlib.error):
+                # Damaged gzip data: keep what was read before it.
+                skipped += 1
+            if skipped:
+                safe_print(f"[!] Archivo de pedidos {day}: {skipped} registros ilegibles omitidos")
+            self.segment_reads += 1
+            self._segments[day] = records
+            while len(self._segments) > self.cached_segments:
+                self._segments.popitem(last=False)
+            return records
+
+    def append(self, orders: Iterable[Order]) -> Dict[str, List[int]]:
+        # Writes the orders to their day segments and sidecars and returns the
+        # ids written per day; orders without an int id are skipped. The
+        # segment is fsynced before its sidecar is replaced, and the caller
+        # deletes only the returned ids from orders.json, after this returns,
+        # so a crash leaves at worst an order in both places (lookups prefer
+        # orders.json).
+        by_day: Dict[str, List[Order]] = {}
+        for order in orders:
+            if isinstance(order.id, int):
+                by_day.setdefault(_day(order), []).append(order)
+        if not by_day:
+            return {}
+        os.makedirs(self.directory, exist_ok=True)
+        written = {}
+        with self._lock, file_lock(os.path.join(self.directory, ".lock")):
+            # Loaded under the flock, so it includes every other worker's appends.
+            index = self._index()
+            generation = self._generation + 1
+            try:
+                for day, batch in sorted(by_day.items()):
+                    lines = "".join(json.dumps(o.to_dict(), ensure_ascii=False) + "\n" for o in batch)
+                    with open(self._segment_path(day), "ab") as f:
+                        f.write(gzip.compress(lines.encode("utf-8"), mtime=0))
+                        f.flush()
+                        os.fsync(f.fileno())
+                    entries = {e[0]: e for e in self._read_sidecar(day)}
+                    for o in batch:
+                        entries[o.id] = [o.id, o.created_at or "", _normalize_phone(o.customer_phone)]
+                    write_text_atomic(self._sidecar_path(day), json.dumps(
+                        {"day": day, "orders": sorted(entries.values())}, ensure_ascii=False
+                    ))
+                    for oid, created_at, phone in (entries[o.id] for o in batch):
+                        if oid not in index:
+                            self._phones.setdefault(phone, []).append(oid)
+                        index[oid] = (day, created_at)
+                        self._max_id = max(self._max_id, oid)
+                    self._segments.pop(day, None)
+                    written[day] = [o.id for o in batch]
+            finally:
+                # Bumped after a partial failure too, so every worker (this
+                # one included, as its own counter stays behind) reloads what
+                # did get written.
+                write_text_atomic(self._generation_path(), str(generation))
+            self._generation = generation
+        return written
+
+    def contains(self, order_id: Any) -> bool:
+        return order_id in self._index()
+
+    def max_id(self) -> int:
+        # Highest archived id; new orders must be numbered above it.
+        self._index()
+        return self._max_id
+
+    def find_by_id(self, order_id: Any) -> Optional[Order]:
+        located = self._index().get(order_id)
+        if located is None:
+            return None
+        return self._segment(located[0]).get(order_id)
+
+    def find_by_phone(self, phone: str, limit: int,
+                      before: Optional[Tuple[str, int]] = None) -> List[Order]:
+        # Newest first by (created_at, id), like OrderRepository.find_page.
+        index = self._index()
+        with self._lock:
+            keys = [(index[oid][1], oid) for oid in self._phones.get(_normalize_phone(phone), ())]
+        if before is not None:
+            keys = [k for k in keys if k < tuple(before)]
+        keys.sort(reverse=True)
+        out = []
+        for _, oid in keys[:limit]:
+            record = self.find_by_id(oid)
+            if record is not None:
+                out.append(record)
+        return out
+
+    def stats(self) -> Dict[str, Any]:
+        index = self._index()
+        with self._lock:
+            days = sorted({day for day, _ in index.values()})
+            return {
+                "orders": len(index),
+                "segments": len(days),
+                "oldest_day": days[0] if days else None,
+                "newest_day": days[-1] if days else None,
+                "bytes": sum(os.path.getsize(p) for p in glob.glob(os.path.join(self.directory, "orders-*"))),
+                "cached_segments": len(self._segments),
+                "segment_reads": self.segment_reads,
+            }
+
+
+_archive: Optional[OrderArchive] = None
+_archive_lock = threading.Lock()
+
+
+def get_order_archive() -> OrderArchive:
+    global _archive
+    if _archive is None:
+        with _archive_lock:
+            if _archive is None:
+                _archive = OrderArchive()
+    return _archive
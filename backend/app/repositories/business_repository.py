@@ -1,12 +1,51 @@
-from typing import List, Dict, Optional
+from typing import List, Optional, Tuple
 
-from app.repositories.json_repository import JsonRepository
+from app.models import Business
+from app.repositories.json_repository import JsonRepository, HashIndex
+from app.repositories.spatial_index import GridIndex
+
+# Same rate as OrderService.create_order (delivery_time + 2 min per km).
+ETA_MINUTES_PER_KM = 2
+
+
+def _is_open(business: Business) -> bool:
+    return bool(business.is_open)
+
+
+def _open_delivery_time(business: Business) -> Optional[float]:
+    if not business.is_open:
+        return None
+    try:
+        return float(business.delivery_time)
+    except (TypeError, ValueError):
+        return None
+
+
+def estimated_minutes(business: Business, distance_km: float) -> float:
+    return float(business.delivery_time) + distance_km * ETA_MINUTES_PER_KM
 
 
 class BusinessRepository(JsonRepository):
+    MODEL = Business
+    INDEXES = {
+        "location": GridIndex(lat="latitude", lng="longitude", where=_is_open),
+        "open_delivery_time": HashIndex(_open_delivery_time),
+    }
+
     def __init__(self):
         super().__init__("businesses.json")
 
-    def find_by_id(self, business_id: int) -> Optional[Dict]:
-        businesses = self.find_all()
-        return next((b for b in businesses if b.get("id") == business_id), None)
+    def find_open_by_eta(self, lat: float, lng: float, k: int,
+                         max_km: Optional[float] = None) -> List[Tuple[float, float, Business]]:
+        # k open businesses with the lowest estimated delivery time to
+        # (lat, lng), as (minutes, distance_km, business). No business is
+        # faster than the quickest kitchen, which bounds the ring search.
+        fastest = self._min_key("open_delivery_time")
+        if fastest is None:
+            return []
+        return self._best(
+            "location", lat, lng, k,
+            lambda dist, b: estimated_minutes(b, dist),
+            lambda km: fastest + km * ETA_MINUTES_PER_KM,
+            max_km,
+        )
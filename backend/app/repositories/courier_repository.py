@@ -1,24 +1,40 @@
-from typing import List, Dict, Optional
+from typing import Any, Iterable, List, Dict, Optional, Tuple
 
-from app.repositories.json_repository import JsonRepository
+from app.models import Courier
+from app.repositories.json_repository import JsonRepository, HashIndex
+from app.repositories.spatial_index import GridIndex
+
+
+def _is_available(courier: Courier) -> bool:
+    return bool(courier.available)
 
 
 class CourierRepository(JsonRepository):
+    MODEL = Courier
+    INDEXES = {
+        "available": HashIndex(_is_available),
+        "location": GridIndex(lat="lat", lng="lng", where=_is_available),
+    }
+    # Positions come from the GPS ingest (set_positions) only.
+    LIVE_FIELDS = ("lat", "lng")
+
     def __init__(self):
         super().__init__("couriers.json")
 
-    def find_by_id(self, courier_id: int) -> Optional[Dict]:
-        couriers = self.find_all()
-        return next((c for c in couriers if c.get("id") == courier_id), None)
-
-    def find_available(self) -> List[Dict]:
-        couriers = self.find_all()
-        return [c for c in couriers if c.get("available", True)]
-
-    def update_and_save(self, courier: Dict) -> None:
-        couriers = self.find_all()
-        for i, c in enumerate(couriers):
-            if c.get("id") == courier.get("id"):
-                couriers[i] = courier
-                break
-        self.save_all(couriers)
+    def find_available(self) -> List[Courier]:
+        return self._find_by("available", True)
+
+    def find_available_within(self, lat: float, lng: float, radius_km: float) -> List[Tuple[float, Courier]]:
+        return self._near("location", lat, lng, radius_km=radius_km)
+
+    def find_available_nearest(self, lat: float, lng: float, k: int,
+                               max_km: Optional[float] = None) -> List[Tuple[float, Courier]]:
+        return self._near("location", lat, lng, radius_km=max_km, k=k)
+
+    def set_positions(self, positions: Dict[Any, Tuple[float, float]]) -> List[Courier]:
+        # Live GPS positions: cached records and the location index move at
+        # once, the file only on save_positions.
+        return self.patch_in_memory({cid: {"lat": lat, "lng": lng} for cid, (lat, lng) in positions.items()})
+
+    def save_positions(self, courier_ids: Iterable[Any]) -> None:
+        self.save_cached(courier_ids)
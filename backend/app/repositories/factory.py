@@ -0,0 +1,49 @@
+import os
+
+from app.repositories.business_repository import BusinessRepository
+from app.repositories.courier_repository import CourierRepository
+from app.repositories.order_repository import OrderRepository
+from app.repositories.payment_repository import PaymentRepository
+from app.repositories.product_repository import ProductRepository
+
+# "json" (data/*.json, default) or "sqlite" (DELIVERY_SQLITE_PATH, WAL mode).
+STORAGE_BACKEND = os.environ.get("DELIVERY_STORAGE", "json").strip().lower() or "json"
+
+
+def _use_sqlite() -> bool:
+    return STORAGE_BACKEND == "sqlite"
+
+
+def order_repository() -> OrderRepository:
+    if _use_sqlite():
+        from app.repositories.sqlite_repository import SqliteOrderRepository
+        return SqliteOrderRepository()
+    return OrderRepository()
+
+
+def product_repository() -> ProductRepository:
+    if _use_sqlite():
+        from app.repositories.sqlite_repository import SqliteProductRepository
+        return SqliteProductRepository()
+    return ProductRepository()
+
+
+def business_repository() -> BusinessRepository:
+    if _use_sqlite():
+        from app.repositories.sqlite_repository import SqliteBusinessRepository
+        return SqliteBusinessRepository()
+    return BusinessRepository()
+
+
+def courier_repository() -> CourierRepository:
+    if _use_sqlite():
+        from app.repositories.sqlite_repository import SqliteCourierRepository
+        return SqliteCourierRepository()
+    return CourierRepository()
+
+
+def payment_repository() -> PaymentRepository:
+    if _use_sqlite():
+        from app.repositories.sqlite_repository import SqlitePaymentRepository
+        return SqlitePaymentRepository()
+    return PaymentRepository()
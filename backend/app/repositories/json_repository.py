@@ -1,15 +1,577 @@
-from typing import List, Dict, Any
+import heapq
+import os
+import threading
+from bisect import bisect_left, bisect_right
+from dataclasses import replace
+from operator import attrgetter
+from typing import List, Dict, Any, Optional, Callable, Iterable, Tuple, Union
 
-from app.utils import load_json, save_json
+from app.repositories.journal import Journal, Compactor
+from app.repositories.sequences import get_sequences
+from app.repositories.writer import get_writer, flush_writes
+from app.models.record import Record
+from app.utils import DATA_DIR, dump_records, file_stamp, load_json, safe_print, save_json, write_temp, write_text_atomic
+
+JOURNAL_COMPACT_RECORDS = int(os.environ.get("DELIVERY_JOURNAL_COMPACT_RECORDS", "1000"))
+JOURNAL_COMPACT_SECONDS = float(os.environ.get("DELIVERY_JOURNAL_COMPACT_SECONDS", "60"))
+# A page filter matching at most this many records is scanned directly
+# instead of walking the sorted index.
+PAGE_CANDIDATE_MAX = 5000
+
+
+class HashIndex:
+    def __init__(self, key: Union[str, Callable[[Record], Any]]):
+        self._key_spec = key
+        self._key = key if callable(key) else attrgetter(key)
+        self._buckets: Dict[Any, Dict[Any, None]] = {}
+        self._keys: Dict[Any, Any] = {}
+
+    def empty(self) -> "HashIndex":
+        return HashIndex(self._key_spec)
+
+    def add(self, rid: Any, record: Record) -> None:
+        key = self._key(record)
+        if rid in self._keys:
+            if self._keys[rid] == key:
+                return
+            self.remove(rid)
+        self._keys[rid] = key
+        self._buckets.setdefault(key, {})[rid] = None
+
+    def remove(self, rid: Any) -> None:
+        if rid not in self._keys:
+            return
+        key = self._keys.pop(rid)
+        bucket = self._buckets.get(key)
+        if bucket is not None:
+            bucket.pop(rid, None)
+            if not bucket:
+                del self._buckets[key]
+
+    def get(self, key: Any) -> Iterable[Any]:
+        return self._buckets.get(key, {}).keys()
+
+    def keys(self) -> Iterable[Any]:
+        return self._buckets.keys()
+
+
+class SortedIndex:
+    # Records ordered by (key, id) for range scans and keyset pagination.
+    # Records whose key is None are left out.
+
+    def __init__(self, key: Union[str, Callable[[Record], Any]]):
+        self._key_spec = key
+        self._key = key if callable(key) else attrgetter(key)
+        self._entries: List[Tuple[Any, Any]] = []
+        self._keys: Dict[Any, Any] = {}
+        self._unsorted = False
+
+    def empty(self) -> "SortedIndex":
+        return SortedIndex(self._key_spec)
+
+    def add(self, rid: Any, record: Record) -> None:
+        key = self._key(record)
+        if rid in self._keys:
+            if self._keys[rid] == key:
+                return
+            self.remove(rid)
+        if key is None:
+            return
+        self._keys[rid] = key
+        entry = (key, rid)
+        # Records mostly arrive in key order; anything else is sorted on the
+        # next read (one pass over nearly sorted data).
+        if self._entries and entry < self._entries[-1]:
+            self._unsorted = True
+        self._entries.append(entry)
+
+    def _sorted(self) -> List[Tuple[Any, Any]]:
+        if self._unsorted:
+            self._entries.sort()
+            self._unsorted = False
+        return self._entries
+
+    def remove(self, rid: Any) -> None:
+        if rid not in self._keys:
+            return
+        entry = (self._keys.pop(rid), rid)
+        entries = self._sorted()
+        i = bisect_left(entries, entry)
+        if i < len(entries) and entries[i] == entry:
+            del entries[i]
+
+    def scan_desc(self, lo: Any = None, hi: Any = None, before: Optional[Tuple[Any, Any]] = None) -> Iterable[Any]:
+        # Ids from the largest (key, id) down, with lo <= key <= hi and
+        # (key, id) < before.
+        entries = self._sorted()
+        end = len(entries)
+        if hi is not None:
+            end = bisect_right(entries, (hi,), hi=end)
+            # (hi,) sorts before every (hi, id): step over equal keys.
+            while end < len(entries) and entries[end][0] == hi:
+                end += 1
+        if before is not None:
+            end = min(end, bisect_left(entries, tuple(before)))
+        for i in range(end - 1, -1, -1):
+            key, rid = entries[i]
+            if lo is not None and key < lo:
+                return
+            yield rid
+
+
+class _CachedFile:
+    def __init__(self):
+        self.model: Any = None
+        self.rows: Optional[List[Record]] = None
+        # Rows of the file the model cannot decode, written back untouched.
+        self.invalid: List[Any] = []
+        self.stamp: Any = None
+        self.by_id: Dict[Any, Record] = {}
+        self.positions: Dict[Any, int] = {}
+        self.specs: Dict[str, Any] = {}
+        self.indexes: Dict[str, Any] = {}
+        self.journal: Optional[Journal] = None
+        self.compactor: Optional[Compactor] = None
+        # Set while the group-commit writer holds changes not yet on disk; the
+        # in-memory rows are authoritative until then.
+        self.dirty = False
+        self.version = 0
+        # Bumped by save_all, which rewrites the file under the lock; a
+        # snapshot prepared outside the lock before that must not replace it.
+        self.rewrites = 0
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.RLock()
+
+    def register(self, specs: Dict[str, Any]) -> None:
+        for name, spec in specs.items():
+            if name in self.specs:
+                continue
+            self.specs[name] = spec
+            if self.rows is not None:
+                index = self.indexes[name] = spec.empty()
+                for rid, record in self.by_id.items():
+                    index.add(rid, record)
+
+    def decode(self, row: Any) -> Optional[Record]:
+        if isinstance(row, Record):
+            return row
+        try:
+            return self.model.from_dict(row)
+        except (AttributeError, KeyError, TypeError, ValueError):
+            return None
+
+    def load(self, rows: Iterable[Any], file_name: str = "") -> None:
+        self.rows = []
+        self.invalid = []
+        self.by_id = {}
+        self.positions = {}
+        self.indexes = {name: spec.empty() for name, spec in self.specs.items()}
+        for row in rows:
+            record = self.decode(row)
+            if record is None:
+                self.invalid.append(row)
+            else:
+                self.append(record)
+        if self.invalid:
+            safe_print(f"[!] {file_name}: {len(self.invalid)} registros con formato inválido "
+                       "(se conservan sin usarlos)")
+
+    def snapshot(self) -> List[Any]:
+        # What the file holds: the records (turned into dicts by dump_records
+        # while dumping) followed by the rows that could not be decoded.
+        return self.rows + self.invalid if self.invalid else self.rows
+
+    def _track(self, pos: int, record: Record) -> None:
+        rid = record.id
+        if rid in self.by_id:
+            return
+        self.by_id[rid] = record
+        self.positions[rid] = pos
+        for index in self.indexes.values():
+            index.add(rid, record)
+
+    def append(self, record: Record) -> None:
+        self.rows.append(record)
+        self._track(len(self.rows) - 1, record)
+
+    def replace(self, pos: int, record: Record) -> None:
+        rid = record.id
+        self.rows[pos] = record
+        self.by_id[rid] = record
+        for index in self.indexes.values():
+            index.add(rid, record)
+
+    def put(self, record: Record) -> None:
+        pos = self.positions.get(record.id)
+        if pos is None:
+            self.append(record)
+        else:
+            self.replace(pos, record)
 
 
 class JsonRepository:
+    # Model the rows are decoded into (app.models); cached records are its
+    # slotted instances and only become dicts again when written out.
+    MODEL: Any = None
+    # Secondary indexes maintained for the cached rows, e.g.
+    # {"business_id": HashIndex("business_id")}. Records are keyed by id.
+    INDEXES: Dict[str, Any] = {}
+    # Journaled files append one JSONL record per write instead of rewriting
+    # the whole snapshot; a background compactor folds the log back in.
+    JOURNAL = False
+    # Fields only patch_in_memory writes (live GPS positions). Whole-record
+    # updates carry the copy their caller read, maybe stale by then, so they
+    # keep the stored value of these.
+    LIVE_FIELDS: Tuple[str, ...] = ()
+
+    # One cache entry per data file, shared by every repository instance that
+    # points at it (services and routes each build their own repositories).
+    _cache: Dict[str, _CachedFile] = {}
+    _cache_lock = threading.Lock()
+
     def __init__(self, file_name: str):
         self._file_name = file_name
+        self._path = os.path.join(DATA_DIR, file_name)
+        with JsonRepository._cache_lock:
+            self._entry = JsonRepository._cache.setdefault(file_name, _CachedFile())
+        with self._entry.lock:
+            if self.MODEL is not None:
+                self._entry.model = self.MODEL
+            self._entry.register(self.INDEXES)
+            if self.JOURNAL and self._entry.journal is None:
+                self._entry.journal = Journal(file_name)
+                self._entry.compactor = Compactor(
+                    self.compact, JOURNAL_COMPACT_RECORDS, JOURNAL_COMPACT_SECONDS
+                )
+
+    def _stamp(self) -> Any:
+        journal = self._entry.journal
+        return (file_stamp(self._path), journal.stamp() if journal is not None else None)
+
+    def _loaded(self) -> _CachedFile:
+        entry = self._entry
+        with entry.lock:
+            if entry.rows is not None and entry.dirty:
+                entry.hits += 1
+                return entry
+            stamp = self._stamp()
+            if entry.rows is not None and entry.stamp == stamp:
+                entry.hits += 1
+                return entry
+            entry.misses += 1
+            data = load_json(self._file_name)
+            entry.load(data if isinstance(data, list) else [], self._file_name)
+            if entry.journal is not None:
+                for row in entry.journal.replay():
+                    record = entry.decode(row)
+                    if record is not None:
+                        entry.put(record)
+            entry.stamp = stamp
+            return entry
+
+    def _written(self, entry: _CachedFile) -> None:
+        writer = get_writer()
+        if writer is not None:
+            entry.dirty = True
+            entry.version += 1
+            writer.mark(self._file_name, self._flush_dirty)
+        else:
+            entry.stamp = self._stamp()
+        if entry.journal is not None:
+            entry.compactor.notify(entry.journal.pending)
+
+    def _flush_dirty(self) -> None:
+        entry = self._entry
+        text = None
+        with entry.lock:
+            if not entry.dirty:
+                return
+            version, rewrites = entry.version, entry.rewrites
+            if entry.journal is not None:
+                entry.journal.sync()
+            else:
+                text = dump_records(entry.snapshot())
+        tmp_path = write_temp(self._path, text) if text is not None else None
+        with entry.lock:
+            if tmp_path is not None:
+                if entry.rewrites != rewrites:
+                    os.remove(tmp_path)
+                    return
+                os.replace(tmp_path, self._path)
+            if entry.version == version:
+                entry.dirty = False
+                entry.stamp = self._stamp()
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        return flush_writes(timeout)
+
+    def _rows(self) -> List[Record]:
+        return self._loaded().rows
+
+    def _find_by(self, index_name: str, key: Any) -> List[Record]:
+        entry = self._loaded()
+        with entry.lock:
+            ids = sorted(entry.indexes[index_name].get(key), key=entry.positions.__getitem__)
+            return [entry.by_id[rid] for rid in ids]
+
+    def _near(self, index_name: str, lat: float, lng: float, radius_km: Optional[float] = None,
+              k: Optional[int] = None) -> List[Tuple[float, Record]]:
+        entry = self._loaded()
+        with entry.lock:
+            index = entry.indexes[index_name]
+            if k is None:
+                hits = index.within(lat, lng, radius_km)
+            else:
+                hits = index.nearest(lat, lng, k, radius_km)
+            return [(dist, entry.by_id[rid]) for dist, rid in hits]
+
+    def _best(self, index_name: str, lat: float, lng: float, k: int,
+              score: Callable[[float, Record], Optional[float]], bound: Callable[[float], float],
+              max_km: Optional[float] = None) -> List[Tuple[float, float, Record]]:
+        # k records with the lowest score(distance_km, record); see GridIndex.best.
+        entry = self._loaded()
+        with entry.lock:
+            by_id = entry.by_id
+            hits = entry.indexes[index_name].best(
+                lat, lng, k, lambda dist, rid: score(dist, by_id[rid]), bound, max_km
+            )
+            return [(s, dist, by_id[rid]) for s, dist, rid in hits]
+
+    def _page(self, sort_index: str, limit: int, before: Optional[Tuple[Any, Any]] = None,
+              lo: Any = None, hi: Any = None,
+              filters: Optional[Dict[str, Iterable[Any]]] = None) -> List[Record]:
+        # Up to limit records in descending (sort key, id) order after the
+        # keyset cursor `before`, keeping those whose HashIndex keys match
+        # every filter. A filter narrow enough is used as the candidate set;
+        # otherwise the sorted index is walked and the filters checked.
+        entry = self._loaded()
+        with entry.lock:
+            order = entry.indexes[sort_index]
+            checks = []
+            narrowest = None
+            for name, keys in (filters or {}).items():
+                index = entry.indexes[name]
+                keys = set(keys)
+                size = sum(len(index.get(k)) for k in keys)
+                checks.append((index._keys, keys))
+                if narrowest is None or size < narrowest[0]:
+                    narrowest = (size, index, keys)
+            if narrowest is not None and narrowest[0] <= PAGE_CANDIDATE_MAX:
+                _, index, keys = narrowest
+                top = []
+                for k in keys:
+                    for rid in index.get(k):
+                        key = order._keys.get(rid)
+                        if key is None or (lo is not None and key < lo) or (hi is not None and key > hi):
+                            continue
+                        if before is not None and (key, rid) >= tuple(before):
+                            continue
+                        if all(index_keys.get(rid) in wanted for index_keys, wanted in checks):
+                            top.append((key, rid))
+                top = heapq.nlargest(limit, top)
+                return [entry.by_id[rid] for _, rid in top]
+            out = []
+            if limit <= 0:
+                return out
+            for rid in order.scan_desc(lo, hi, before):
+                if all(index_keys.get(rid) in wanted for index_keys, wanted in checks):
+                    out.append(entry.by_id[rid])
+                    if len(out) >= limit:
+                        break
+            return out
+
+    def _min_key(self, index_name: str) -> Any:
+        # Smallest key of a HashIndex, ignoring None (records left out).
+        entry = self._loaded()
+        with entry.lock:
+            return min((key for key in entry.indexes[index_name].keys() if key is not None), default=None)
+
+    def find_all(self) -> List[Record]:
+        return list(self._rows())
+
+    def find_by_id(self, record_id: Any) -> Optional[Record]:
+        return self._loaded().by_id.get(record_id)
+
+    def _max_id(self) -> int:
+        entry = self._loaded()
+        with entry.lock:
+            return max((rid for rid in entry.by_id if isinstance(rid, int)), default=0)
+
+    def next_id(self, floor: int = 0) -> int:
+        name = self._file_name.rsplit(".", 1)[0]
+        while True:
+            new_id = get_sequences().next_id(name, self._max_id, floor)
+            # Guards against ids written behind the sequence's back (e.g. files
+            # regenerated by init_data.py).
+            if self.find_by_id(new_id) is None:
+                return new_id
+
+    def save_all(self, data: Iterable[Any]) -> None:
+        # Records, or plain dicts (imports, regenerated data) that are decoded
+        # like rows read from the file.
+        data = list(data)
+        entry = self._entry
+        with entry.lock:
+            if entry.journal is not None:
+                write_text_atomic(self._path, dump_records(data))
+                entry.journal.reset()
+            else:
+                save_json(self._file_name, data)
+            entry.load(data, self._file_name)
+            entry.dirty = False
+            entry.version += 1
+            entry.rewrites += 1
+            entry.stamp = self._stamp()
+
+    def append_and_save(self, record: Record) -> None:
+        entry = self._loaded()
+        with entry.lock:
+            deferred = get_writer() is not None
+            if entry.journal is not None:
+                entry.journal.put(record, sync=not deferred)
+            elif not deferred:
+                save_json(self._file_name, entry.snapshot() + [record])
+            entry.append(record)
+            self._written(entry)
+
+    def _keep_live(self, entry: _CachedFile, pos: Optional[int], record: Record) -> Record:
+        if not self.LIVE_FIELDS or pos is None:
+            return record
+        current = entry.rows[pos]
+        live = {f: getattr(current, f) for f in self.LIVE_FIELDS if getattr(current, f) != getattr(record, f)}
+        return replace(record, **live) if live else record
+
+    def update_and_save(self, record: Record) -> None:
+        entry = self._loaded()
+        with entry.lock:
+            pos = entry.positions.get(record.id)
+            record = self._keep_live(entry, pos, record)
+            deferred = get_writer() is not None
+            if entry.journal is not None:
+                if pos is not None:
+                    entry.journal.put(record, sync=not deferred)
+            elif not deferred:
+                rows = list(entry.snapshot())
+                if pos is not None:
+                    rows[pos] = record
+                save_json(self._file_name, rows)
+            if pos is not None:
+                entry.replace(pos, record)
+            self._written(entry)
+
+    def update_many_and_save(self, records: List[Record]) -> None:
+        # Same as update_and_save for each record, with a single snapshot
+        # rewrite (or journal flush) for the whole batch.
+        entry = self._loaded()
+        with entry.lock:
+            known = [(entry.positions.get(r.id), r) for r in records]
+            known = [(pos, self._keep_live(entry, pos, r)) for pos, r in known if pos is not None]
+            if not known:
+                return
+            deferred = get_writer() is not None
+            if entry.journal is not None:
+                for i, (_, record) in enumerate(known):
+                    entry.journal.put(record, sync=not deferred and i == len(known) - 1)
+            elif not deferred:
+                rows = list(entry.snapshot())
+                for pos, record in known:
+                    rows[pos] = record
+                save_json(self._file_name, rows)
+            for pos, record in known:
+                entry.replace(pos, record)
+            self._written(entry)
+
+    def delete_many_and_save(self, record_ids: Iterable[Any]) -> int:
+        # Drops the records and rewrites the snapshot (folding in and
+        # clearing the journal, if any). Returns how many were removed.
+        ids = set(record_ids)
+        entry = self._loaded()
+        with entry.lock:
+            keep = [r for r in entry.rows if r.id not in ids]
+            removed = len(entry.rows) - len(keep)
+            if removed:
+                self.save_all(keep + entry.invalid)
+        return removed
+
+    def patch_in_memory(self, patches: Dict[Any, Dict[str, Any]]) -> List[Record]:
+        # Applies field patches to the cached records (and their indexes)
+        # without touching the file; the next write of the file, or an
+        # explicit update_many_and_save, persists them. Unknown ids are
+        # skipped. Returns the patched records.
+        entry = self._loaded()
+        out = []
+        with entry.lock:
+            for rid, patch in patches.items():
+                pos = entry.positions.get(rid)
+                if pos is None:
+                    continue
+                record = replace(entry.rows[pos], **patch)
+                entry.replace(pos, record)
+                out.append(record)
+        return out
+
+    def save_cached(self, record_ids: Iterable[Any]) -> None:
+        # Persists the cached records as they are now (after patch_in_memory),
+        # read under the same lock as the write so no concurrent update is
+        # overwritten with an older copy.
+        entry = self._loaded()
+        with entry.lock:
+            records = [entry.by_id[rid] for rid in record_ids if rid in entry.by_id]
+            if records:
+                self.update_many_and_save(records)
+
+    def compact(self) -> None:
+        entry = self._loaded()
+        journal = entry.journal
+        if journal is None:
+            return
+        with entry.lock:
+            if journal.pending == 0 and not os.path.exists(journal.rotated_path):
+                return
+            text = dump_records(entry.snapshot())
+            rewrites = entry.rewrites
+            journal.rotate()
+            entry.stamp = self._stamp()
+        # The snapshot is written outside the lock; writes made meanwhile go to
+        # the fresh log and a concurrent reload still replays the rotated one.
+        # It is renamed into place under the lock, and dropped if save_all
+        # rewrote the file in between (e.g. an archive run deleting orders).
+        tmp_path = write_temp(self._path, text)
+        with entry.lock:
+            if entry.rewrites != rewrites:
+                os.remove(tmp_path)
+                return
+            os.replace(tmp_path, self._path)
+            journal.drop_rotated()
+            entry.stamp = self._stamp()
+
+    def data_version(self) -> Any:
+        # Changes whenever the file, its journal or the cached rows change;
+        # equal values mean the records are the same.
+        entry = self._loaded()
+        with entry.lock:
+            return (entry.stamp, entry.version)
+
+    def invalidate(self) -> None:
+        with self._entry.lock:
+            self._entry.rows = None
+            self._entry.stamp = None
 
-    def find_all(self) -> List[Dict[str, Any]]:
-        data = load_json(self._file_name)
-        return data if isinstance(data, list) else []
+    def cache_info(self) -> Dict[str, Any]:
+        entry = self._entry
+        with entry.lock:
+            total = entry.hits + entry.misses
+            return {
+                "file": self._file_name,
+                "hits": entry.hits,
+                "misses": entry.misses,
+                "hit_ratio": round(entry.hits / total, 4) if total else 0.0,
+                "rows": len(entry.rows) if entry.rows is not None else 0,
+            }
 
-    def save_all(self, data: List[Dict[str, Any]]) -> None:
-        save_json(self._file_name, data)
+    @classmethod
+    def cache_stats(cls) -> Dict[str, Dict[str, Any]]:
+        with cls._cache_lock:
+            names = list(cls._cache)
+        return {name: JsonRepository(name).cache_info() for name in names}
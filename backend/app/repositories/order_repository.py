@@ -1,37 +1,58 @@
-from typing import List, Dict, Optional
+import os
+from typing import Any, Dict, Iterable, List, Optional, Tuple
 
-from app.repositories.json_repository import JsonRepository
+from app.models import Order
+from app.repositories.json_repository import JsonRepository, HashIndex, SortedIndex
+
+
+def _normalize_phone(phone: str) -> str:
+    s = "".join(c for c in str(phone or "") if c.isdigit())
+    return s[2:] if len(s) == 12 and s.startswith("57") else s
 
 
 class OrderRepository(JsonRepository):
+    MODEL = Order
+    INDEXES = {
+        "phone": HashIndex(lambda o: _normalize_phone(o.customer_phone)),
+        "courier_id": HashIndex("courier_id"),
+        "business_id": HashIndex("business_id"),
+        "status": HashIndex("status"),
+        "created_at": SortedIndex("created_at"),
+    }
+    JOURNAL = os.environ.get("DELIVERY_ORDER_JOURNAL", "").strip().lower() in ("1", "true", "yes")
+
     def __init__(self):
         super().__init__("orders.json")
 
-    def find_by_id(self, order_id: int) -> Optional[Dict]:
-        orders = self.find_all()
-        return next((o for o in orders if o.get("id") == order_id), None)
-
-    def find_by_phone_normalized(self, normalized_phone: str) -> List[Dict]:
-        orders = self.find_all()
-        return [
-            o for o in orders
-            if self._normalize_phone(o.get("customer_phone", "")) == normalized_phone
-        ]
+    def find_by_phone_normalized(self, normalized_phone: str) -> List[Order]:
+        return self._find_by("phone", normalized_phone)
+
+    def find_by_courier_id(self, courier_id: int) -> List[Order]:
+        return self._find_by("courier_id", courier_id)
+
+    def find_by_business_id(self, business_id: int) -> List[Order]:
+        return self._find_by("business_id", business_id)
+
+    def find_by_status(self, status: str) -> List[Order]:
+        return self._find_by("status", status)
+
+    def find_page(self, limit: int, before: Optional[Tuple[str, int]] = None,
+                  statuses: Optional[Iterable[str]] = None, courier_id: Optional[int] = None,
+                  business_id: Optional[int] = None, phone: Optional[str] = None,
+                  created_from: Optional[str] = None, created_to: Optional[str] = None) -> List[Order]:
+        # Newest first by (created_at, id); `before` is the last (created_at,
+        # id) of the previous page.
+        filters: Dict[str, Any] = {}
+        if statuses is not None:
+            filters["status"] = list(statuses)
+        if courier_id is not None:
+            filters["courier_id"] = [courier_id]
+        if business_id is not None:
+            filters["business_id"] = [business_id]
+        if phone is not None:
+            filters["phone"] = [_normalize_phone(phone)]
+        return self._page("created_at", limit, before, created_from, created_to, filters)
 
     @staticmethod
     def _normalize_phone(phone: str) -> str:
-        s = "".join(c for c in str(phone or "") if c.isdigit())
-        return s[2:] if len(s) == 12 and s.startswith("57") else s
-
-    def append_and_save(self, order: Dict) -> None:
-        orders = self.find_all()
-        orders.append(order)
-        self.save_all(orders)
-
-    def update_and_save(self, order: Dict) -> None:
-        orders = self.find_all()
-        for i, o in enumerate(orders):
-            if o.get("id") == order.get("id"):
-                orders[i] = order
-                break
-        self.save_all(orders)
+        return _normalize_phone(phone)
@@ -1,17 +1,18 @@
-from typing import List, Dict, Optional
+from typing import Optional
 
-from app.repositories.json_repository import JsonRepository
+from app.models import Payment
+from app.repositories.json_repository import JsonRepository, HashIndex
 
 
 class PaymentRepository(JsonRepository):
+    MODEL = Payment
+    INDEXES = {
+        "order_id": HashIndex("order_id"),
+    }
+
     def __init__(self):
         super().__init__("payments.json")
 
-    def find_by_order_id(self, order_id: int) -> Optional[Dict]:
-        payments = self.find_all()
-        return next((p for p in payments if p.get("order_id") == order_id), None)
-
-    def append_and_save(self, payment: Dict) -> None:
-        payments = self.find_all()
-        payments.append(payment)
-        self.save_all(payments)
+    def find_by_order_id(self, order_id: int) -> Optional[Payment]:
+        payments = self._find_by("order_id", order_id)
+        return payments[0] if payments else None
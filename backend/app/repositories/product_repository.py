@@ -1,19 +1,20 @@
-from typing import List, Dict, Optional
+from typing import List
 
-from app.repositories.json_repository import JsonRepository
+from app.models import Product
+from app.repositories.json_repository import JsonRepository, HashIndex
 
 
 class ProductRepository(JsonRepository):
+    MODEL = Product
+    INDEXES = {
+        "business_id": HashIndex("business_id"),
+    }
+
     def __init__(self):
         super().__init__("products.json")
 
-    def find_by_id(self, product_id: int) -> Optional[Dict]:
-        products = self.find_all()
-        return next((p for p in products if p.get("id") == product_id), None)
-
-    def find_by_business_id(self, business_id: int, only_available: bool = True) -> List[Dict]:
-        products = self.find_all()
-        out = [p for p in products if p.get("business_id") == business_id]
+    def find_by_business_id(self, business_id: int, only_available: bool = True) -> List[Product]:
+        out = self._find_by("business_id", business_id)
         if only_available:
-            out = [p for p in out if p.get("available", True)]
+            out = [p for p in out if p.available]
         return out
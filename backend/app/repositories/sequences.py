@@ -0,0 +1,66 @@
+import json
+import os
+import threading
+from typing import Callable, Dict, List
+
+from app.utils import DATA_DIR, file_lock, write_text_atomic
+
+SEQUENCES_FILE = "sequences.json"
+ID_BLOCK_SIZE = max(1, int(os.environ.get("DELIVERY_ID_BLOCK_SIZE", "50")))
+
+
+class SequenceStore:
+    # Monotonic id sequences persisted in data/sequences.json as the highest id
+    # reserved so far per sequence. Ids are handed out from reserved blocks, and
+    # a block is written (fsync + rename) before any of its ids is used, so a
+    # crash can only skip ids, never reuse them. Worker processes coordinate
+    # through an flock on the file's lock sidecar where available.
+
+    def __init__(self, file_name: str = SEQUENCES_FILE, block_size: int = ID_BLOCK_SIZE):
+        self._path = os.path.join(DATA_DIR, file_name)
+        self._lock_path = self._path + ".lock"
+        self._block_size = block_size
+        self._blocks: Dict[str, List[int]] = {}
+        self._lock = threading.Lock()
+
+    def _read(self) -> Dict[str, int]:
+        try:
+            with open(self._path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            return data if isinstance(data, dict) else {}
+        except (OSError, json.JSONDecodeError):
+            return {}
+
+    def _reserve(self, name: str, seed: Callable[[], int], floor: int) -> List[int]:
+        with file_lock(self._lock_path):
+            state = self._read()
+            high = state.get(name)
+            if high is None:
+                high = int(seed() or 0)
+            high = max(high, floor)
+            limit = high + self._block_size
+            state[name] = limit
+            write_text_atomic(self._path, json.dumps(state, indent=2))
+        return [high + 1, limit]
+
+    def next_id(self, name: str, seed: Callable[[], int], floor: int = 0) -> int:
+        # Ids up to floor are taken outside the sequence (archived orders);
+        # a block below it is dropped and a new one reserved above it.
+        with self._lock:
+            block = self._blocks.get(name)
+            if block is None or block[0] > block[1] or block[0] <= floor:
+                block = self._blocks[name] = self._reserve(name, seed, floor)
+            value = block[0]
+            block[0] += 1
+            return value
+
+    def reset(self) -> None:
+        with self._lock:
+            self._blocks.clear()
+
+
+_store = SequenceStore()
+
+
+def get_sequences() -> SequenceStore:
+    return _store
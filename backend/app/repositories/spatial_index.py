@@ -0,0 +1,160 @@
+import math
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from app.utils import EARTH_RADIUS_KM, calculate_distances
+
+# Same sphere as utils.calculate_distance.
+KM_PER_DEG = EARTH_RADIUS_KM * math.pi / 180
+MEDELLIN_LAT = 6.25
+# Cells are exactly cell_km wide only at ref_lat; the ring lower bound is
+# shrunk a little so it stays valid a couple of degrees away from it.
+_RING_SLACK = 0.98
+
+
+class GridIndex:
+    # Uniform lat/lng grid (cells of roughly cell_km x cell_km around ref_lat)
+    # over records that pass `where`; lat and lng name the records'
+    # attributes. Radius and k-nearest queries only visit the cells around
+    # the query point, ring by ring.
+
+    def __init__(self, lat: str, lng: str, where: Optional[Callable[[Any], bool]] = None,
+                 cell_km: float = 1.0, ref_lat: float = MEDELLIN_LAT):
+        self.lat_field = lat
+        self.lng_field = lng
+        self.where = where
+        self.cell_km = cell_km
+        self.ref_lat = ref_lat
+        self._dlat = cell_km / KM_PER_DEG
+        self._dlng = cell_km / (KM_PER_DEG * math.cos(math.radians(ref_lat)))
+        self._cells: Dict[Tuple[int, int], Dict[Any, Tuple[float, float]]] = {}
+        self._where_is: Dict[Any, Tuple[int, int]] = {}
+        self._bounds: Optional[List[int]] = None
+
+    def empty(self) -> "GridIndex":
+        return GridIndex(self.lat_field, self.lng_field, self.where, self.cell_km, self.ref_lat)
+
+    def __len__(self) -> int:
+        return len(self._where_is)
+
+    def _cell(self, lat: float, lng: float) -> Tuple[int, int]:
+        return (math.floor(lat / self._dlat), math.floor(lng / self._dlng))
+
+    def point(self, record: Any) -> Optional[Tuple[float, float]]:
+        if self.where is not None and not self.where(record):
+            return None
+        try:
+            return float(getattr(record, self.lat_field)), float(getattr(record, self.lng_field))
+        except (AttributeError, TypeError, ValueError):
+            return None
+
+    def add(self, rid: Any, record: Any) -> None:
+        p = self.point(record)
+        if p is None:
+            self.remove(rid)
+        else:
+            self.move(rid, p[0], p[1])
+
+    def move(self, rid: Any, lat: float, lng: float) -> None:
+        cell = self._cell(lat, lng)
+        old = self._where_is.get(rid)
+        if old is not None and old != cell:
+            self._drop(rid, old)
+        self._cells.setdefault(cell, {})[rid] = (lat, lng)
+        self._where_is[rid] = cell
+        if self._bounds is None:
+            self._bounds = [cell[0], cell[0], cell[1], cell[1]]
+        else:
+            b = self._bounds
+            b[0], b[1] = min(b[0], cell[0]), max(b[1], cell[0])
+            b[2], b[3] = min(b[2], cell[1]), max(b[3], cell[1])
+
+    def remove(self, rid: Any) -> None:
+        cell = self._where_is.pop(rid, None)
+        if cell is not None:
+            self._drop(rid, cell)
+
+    def _drop(self, rid: Any, cell: Tuple[int, int]) -> None:
+        bucket = self._cells.get(cell)
+        if bucket is not None:
+            bucket.pop(rid, None)
+            if not bucket:
+                del self._cells[cell]
+
+    def _ring_cells(self, center: Tuple[int, int], n: int) -> Iterator[Tuple[int, int]]:
+        cy, cx = center
+        if n == 0:
+            yield center
+            return
+        for dx in range(-n, n + 1):
+            yield (cy - n, cx + dx)
+            yield (cy + n, cx + dx)
+        for dy in range(-n + 1, n):
+            yield (cy + dy, cx - n)
+            yield (cy + dy, cx + n)
+
+    def _max_ring(self, center: Tuple[int, int]) -> int:
+        if self._bounds is None:
+            return -1
+        b = self._bounds
+        return max(abs(center[0] - b[0]), abs(center[0] - b[1]), abs(center[1] - b[2]), abs(center[1] - b[3]))
+
+    def rings(self, lat: float, lng: float) -> Iterator[Tuple[float, List[Tuple[float, Any]]]]:
+        # Yields (min_km, hits) per ring n: hits are (distance_km, id) for the
+        # ring's points, and every point in rings after n is at least min_km
+        # away from (lat, lng).
+        center = self._cell(lat, lng)
+        for n in range(self._max_ring(center) + 1):
+            ids, points = [], []
+            for cell in self._ring_cells(center, n):
+                bucket = self._cells.get(cell)
+                if bucket:
+                    ids.extend(bucket.keys())
+                    points.extend(bucket.values())
+            hits = list(zip(calculate_distances(lat, lng, points), ids)) if points else []
+            yield n * self.cell_km * _RING_SLACK, hits
+
+    def within(self, lat: float, lng: float, radius_km: float) -> List[Tuple[float, Any]]:
+        out = []
+        for min_km, hits in self.rings(lat, lng):
+            out.extend(h for h in hits if h[0] <= radius_km)
+            if min_km > radius_km:
+                break
+        out.sort(key=lambda h: h[0])
+        return out
+
+    def nearest(self, lat: float, lng: float, k: int, max_km: Optional[float] = None) -> List[Tuple[float, Any]]:
+        found: List[Tuple[float, Any]] = []
+        if k <= 0:
+            return found
+        for min_km, hits in self.rings(lat, lng):
+            found.extend(h for h in hits if max_km is None or h[0] <= max_km)
+            found.sort(key=lambda h: h[0])
+            del found[k:]
+            if len(found) >= k and found[-1][0] <= min_km:
+                break
+            if max_km is not None and min_km > max_km:
+                break
+        return found[:k]
+
+    def best(self, lat: float, lng: float, k: int, score: Callable[[float, Any], Optional[float]],
+             bound: Callable[[float], float], max_km: Optional[float] = None) -> List[Tuple[float, float, Any]]:
+        # k lowest (score, distance_km, id), where score(distance_km, id) is
+        # None for points to skip and bound(km) is a lower bound of the score
+        # of any point at least km away.
+        found: List[Tuple[float, float, Any]] = []
+        if k <= 0:
+            return found
+        for min_km, hits in self.rings(lat, lng):
+            for dist, rid in hits:
+                if max_km is not None and dist > max_km:
+                    continue
+                s = score(dist, rid)
+                if s is not None:
+                    found.append((s, dist, rid))
+            found.sort(key=lambda h: (h[0], h[1]))
+            del found[k:]
+            if len(found) >= k and found[-1][0] <= bound(min_km):
+                break
+            if max_km is not None and min_km > max_km:
+                break
+        return found
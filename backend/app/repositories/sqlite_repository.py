@@ -0,0 +1,410 @@
+import json
+import math
+import os
+import sqlite3
+import threading
+from dataclasses import replace
+from typing import List, Dict, Any, Optional, Iterable, Tuple, Callable
+
+from app.models.record import Record
+from app.repositories.business_repository import BusinessRepository
+from app.repositories.courier_repository import CourierRepository
+from app.repositories.json_repository import HashIndex, SortedIndex
+from app.repositories.order_repository import OrderRepository
+from app.repositories.payment_repository import PaymentRepository
+from app.repositories.product_repository import ProductRepository
+from app.repositories.spatial_index import GridIndex, KM_PER_DEG
+from app.utils import DATA_DIR, calculate_distances
+
+SQLITE_PATH = os.environ.get("DELIVERY_SQLITE_PATH", "").strip() or os.path.join(DATA_DIR, "parcerogo.db")
+
+_local = threading.local()
+
+
+def get_connection(db_path: Optional[str] = None) -> sqlite3.Connection:
+    db_path = db_path or SQLITE_PATH
+    conns = getattr(_local, "conns", None)
+    if conns is None:
+        conns = _local.conns = {}
+    conn = conns.get(db_path)
+    if conn is None:
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        # Autocommit mode; multi-statement writes open their own transaction.
+        conn = sqlite3.connect(db_path, isolation_level=None, cached_statements=256, timeout=10)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("PRAGMA busy_timeout=10000")
+        conns[db_path] = conn
+    return conn
+
+
+def _point_part(index: GridIndex, part: int) -> Callable[[Record], Any]:
+    def key(record: Record) -> Any:
+        p = index.point(record)
+        return p[part] if p is not None else None
+    return key
+
+
+class SqliteRepository:
+    # Stores each record as JSON in a "data" column next to indexed columns
+    # derived from the JSON repository's INDEXES (one per HashIndex or
+    # SortedIndex, a lat/lng pair per GridIndex), so the same declarative
+    # keys and the domain finders built on _find_by/_near work unchanged.
+    TABLE = ""
+    _ready: set = set()
+    _ready_lock = threading.Lock()
+
+    def __init__(self, db_path: Optional[str] = None):
+        self._db_path = db_path or SQLITE_PATH
+        column_keys: List[Tuple[str, Callable]] = []
+        for name, index in self.INDEXES.items():
+            if isinstance(index, (HashIndex, SortedIndex)):
+                column_keys.append((name, index._key))
+            elif isinstance(index, GridIndex):
+                column_keys.append((f"{name}_lat", _point_part(index, 0)))
+                column_keys.append((f"{name}_lng", _point_part(index, 1)))
+        self._columns = [c for c, _ in column_keys]
+        self._keys = [k for _, k in column_keys]
+        cols = "".join(", " + c for c in self._columns)
+        marks = ", ?" * len(self._columns)
+        self._sql_select = f"SELECT data FROM {self.TABLE}"
+        self._sql_insert = f"INSERT INTO {self.TABLE} (id{cols}, data) VALUES (?{marks}, ?)"
+        self._sql_upsert = self._sql_insert.replace("INSERT", "INSERT OR REPLACE", 1)
+        sets = "".join(f"{c} = ?, " for c in self._columns)
+        self._sql_update = f"UPDATE {self.TABLE} SET {sets}data = ? WHERE id = ?"
+        self._ensure_schema()
+
+    @property
+    def _conn(self) -> sqlite3.Connection:
+        return get_connection(self._db_path)
+
+    def _ensure_schema(self) -> None:
+        key = (self._db_path, self.TABLE)
+        if key in SqliteRepository._ready:
+            return
+        with SqliteRepository._ready_lock:
+            conn = self._conn
+            cols = "".join(f", {c}" for c in self._columns)
+            conn.execute(f"CREATE TABLE IF NOT EXISTS {self.TABLE} (id INTEGER PRIMARY KEY{cols}, data TEXT NOT NULL)")
+            existing = {row[1] for row in conn.execute(f"PRAGMA table_info({self.TABLE})")}
+            missing = [c for c in self._columns if c not in existing]
+            for c in missing:
+                conn.execute(f"ALTER TABLE {self.TABLE} ADD COLUMN {c}")
+            if missing:
+                self._backfill()
+            for name, index in self.INDEXES.items():
+                if isinstance(index, (HashIndex, SortedIndex)):
+                    conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{self.TABLE}_{name} ON {self.TABLE} ({name}, id)")
+                elif isinstance(index, GridIndex):
+                    conn.execute(
+                        f"CREATE INDEX IF NOT EXISTS idx_{self.TABLE}_{name} "
+                        f"ON {self.TABLE} ({name}_lat, {name}_lng)"
+                    )
+            conn.execute("CREATE TABLE IF NOT EXISTS sequences (name TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+            conn.execute("CREATE TABLE IF NOT EXISTS table_versions (name TEXT PRIMARY KEY, version INTEGER NOT NULL)")
+            # Bumped by triggers so writes from any connection or process
+            # change data_version().
+            for op in ("INSERT", "UPDATE", "DELETE"):
+                conn.execute(
+                    f"CREATE TRIGGER IF NOT EXISTS trg_{self.TABLE}_version_{op.lower()} "
+                    f"AFTER {op} ON {self.TABLE} BEGIN "
+                    f"INSERT INTO table_versions (name, version) VALUES ('{self.TABLE}', 1) "
+                    f"ON CONFLICT(name) DO UPDATE SET version = version + 1; END"
+                )
+            SqliteRepository._ready.add(key)
+
+    def _params(self, record: Record) -> list:
+        return [key(record) for key in self._keys]
+
+    def _load(self, data: str) -> Record:
+        return self.MODEL.from_dict(json.loads(data))
+
+    @staticmethod
+    def _dump(record: Record) -> str:
+        return json.dumps(record.to_dict(), ensure_ascii=False)
+
+    def _backfill(self) -> None:
+        conn = self._conn
+        rows = [self._load(r[0]) for r in conn.execute(f"SELECT data FROM {self.TABLE}")]
+        sets = ", ".join(f"{c} = ?" for c in self._columns)
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.executemany(
+                f"UPDATE {self.TABLE} SET {sets} WHERE id = ?",
+                ([*self._params(r), r.id] for r in rows),
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def _decode(self, rows: Iterable) -> List[Record]:
+        return [self._load(r[0]) for r in rows]
+
+    def _rows(self) -> List[Record]:
+        return self.find_all()
+
+    def _find_by(self, index_name: str, key: Any) -> List[Record]:
+        if not isinstance(self.INDEXES.get(index_name), HashIndex):
+            raise KeyError(index_name)
+        cur = self._conn.execute(f"{self._sql_select} WHERE {index_name} = ? ORDER BY id", (key,))
+        return self._decode(cur)
+
+    def _in_box(self, index_name: str, lat: float, lng: float,
+                radius_km: Optional[float]) -> List[Tuple[float, Record]]:
+        la, ln = f"{index_name}_lat", f"{index_name}_lng"
+        sql = f"SELECT data, {la}, {ln} FROM {self.TABLE} WHERE {la} IS NOT NULL"
+        params: list = []
+        if radius_km is not None:
+            dlat = radius_km / KM_PER_DEG
+            dlng = radius_km / (KM_PER_DEG * max(0.01, math.cos(math.radians(abs(lat) + dlat))))
+            sql += f" AND {la} BETWEEN ? AND ? AND {ln} BETWEEN ? AND ?"
+            params = [lat - dlat, lat + dlat, lng - dlng, lng + dlng]
+        rows = self._conn.execute(sql, params).fetchall()
+        dists = calculate_distances(lat, lng, [(plat, plng) for _, plat, plng in rows])
+        hits = [(dist, row[0]) for dist, row in zip(dists, rows) if radius_km is None or dist <= radius_km]
+        hits.sort(key=lambda h: h[0])
+        return hits
+
+    def _near(self, index_name: str, lat: float, lng: float, radius_km: Optional[float] = None,
+              k: Optional[int] = None) -> List[Tuple[float, Record]]:
+        if not isinstance(self.INDEXES.get(index_name), GridIndex):
+            raise KeyError(index_name)
+        if k is None:
+            hits = self._in_box(index_name, lat, lng, radius_km)
+        else:
+            # Grow the bounding box until it holds k points (or hits max_km).
+            r = 2.0 if radius_km is None else min(2.0, radius_km)
+            while True:
+                hits = self._in_box(index_name, lat, lng, r)
+                if len(hits) >= k or (radius_km is not None and r >= radius_km):
+                    break
+                if r >= 100.0:
+                    hits = self._in_box(index_name, lat, lng, radius_km)
+                    break
+                r = r * 2 if radius_km is None else min(r * 2, radius_km)
+            hits = hits[:k]
+        return [(dist, self._load(data)) for dist, data in hits]
+
+    def _best(self, index_name: str, lat: float, lng: float, k: int,
+              score: Callable[[float, Record], Optional[float]], bound: Callable[[float], float],
+              max_km: Optional[float] = None) -> List[Tuple[float, float, Record]]:
+        if not isinstance(self.INDEXES.get(index_name), GridIndex):
+            raise KeyError(index_name)
+        if k <= 0:
+            return []
+        def scored_within(radius: Optional[float]) -> List[Tuple[float, float, Record]]:
+            out = []
+            for dist, data in self._in_box(index_name, lat, lng, radius):
+                record = self._load(data)
+                s = score(dist, record)
+                if s is not None:
+                    out.append((s, dist, record))
+            out.sort(key=lambda h: (h[0], h[1]))
+            return out
+
+        # Grow the box until the k-th score beats anything outside radius r.
+        r = 2.0 if max_km is None else min(2.0, max_km)
+        while True:
+            scored = scored_within(r)
+            if len(scored) >= k and scored[k - 1][0] <= bound(r):
+                break
+            if max_km is not None and r >= max_km:
+                break
+            if r >= 100.0:
+                scored = scored_within(max_km)
+                break
+            r = r * 2 if max_km is None else min(r * 2, max_km)
+        return scored[:k]
+
+    def _page(self, sort_index: str, limit: int, before: Optional[Tuple[Any, Any]] = None,
+              lo: Any = None, hi: Any = None,
+              filters: Optional[Dict[str, Iterable[Any]]] = None) -> List[Record]:
+        if not isinstance(self.INDEXES.get(sort_index), SortedIndex):
+            raise KeyError(sort_index)
+        where = [f"{sort_index} IS NOT NULL"]
+        params: list = []
+        for name, keys in (filters or {}).items():
+            if not isinstance(self.INDEXES.get(name), HashIndex):
+                raise KeyError(name)
+            keys = list(keys)
+            if not keys:
+                return []
+            where.append(f"{name} IN ({', '.join('?' * len(keys))})")
+            params.extend(keys)
+        if lo is not None:
+            where.append(f"{sort_index} >= ?")
+            params.append(lo)
+        if hi is not None:
+            where.append(f"{sort_index} <= ?")
+            params.append(hi)
+        if before is not None:
+            where.append(f"({sort_index}, id) < (?, ?)")
+            params.extend(before)
+        sql = (f"{self._sql_select} WHERE {' AND '.join(where)} "
+               f"ORDER BY {sort_index} DESC, id DESC LIMIT ?")
+        return self._decode(self._conn.execute(sql, [*params, limit]))
+
+    def _min_key(self, index_name: str) -> Any:
+        if not isinstance(self.INDEXES.get(index_name), HashIndex):
+            raise KeyError(index_name)
+        return self._conn.execute(f"SELECT MIN({index_name}) FROM {self.TABLE}").fetchone()[0]
+
+    def find_all(self) -> List[Record]:
+        return self._decode(self._conn.execute(f"{self._sql_select} ORDER BY id"))
+
+    def find_by_id(self, record_id: Any) -> Optional[Record]:
+        row = self._conn.execute(f"{self._sql_select} WHERE id = ?", (record_id,)).fetchone()
+        return self._load(row[0]) if row else None
+
+    def count(self) -> int:
+        return self._conn.execute(f"SELECT COUNT(*) FROM {self.TABLE}").fetchone()[0]
+
+    def next_id(self, floor: int = 0) -> int:
+        conn = self._conn
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute("SELECT value FROM sequences WHERE name = ?", (self.TABLE,)).fetchone()
+            if row is None:
+                row = conn.execute(f"SELECT COALESCE(MAX(id), 0) FROM {self.TABLE}").fetchone()
+            value = max(row[0], floor) + 1
+            conn.execute("INSERT OR REPLACE INTO sequences (name, value) VALUES (?, ?)", (self.TABLE, value))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return value
+
+    def save_all(self, data: Iterable[Any]) -> None:
+        # Records, or plain dicts (imports) decoded through the model first.
+        records = (r if isinstance(r, Record) else self.MODEL.from_dict(r) for r in data)
+        conn = self._conn
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute(f"DELETE FROM {self.TABLE}")
+            conn.execute("DELETE FROM sequences WHERE name = ?", (self.TABLE,))
+            conn.executemany(
+                self._sql_upsert,
+                ([r.id, *self._params(r), self._dump(r)] for r in records),
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def append_and_save(self, record: Record) -> None:
+        self._conn.execute(self._sql_insert, [record.id, *self._params(record), self._dump(record)])
+
+    def _stored_live(self, conn: sqlite3.Connection, records: List[Record]) -> List[Record]:
+        # LIVE_FIELDS as stored now; runs inside the write transaction, so no
+        # other connection can change them before the update lands.
+        extract = ", ".join(f"json_extract(data, '$.{f}')" for f in self.LIVE_FIELDS)
+        marks = ", ".join("?" * len(records))
+        stored = {row[0]: row[1:] for row in conn.execute(
+            f"SELECT id, {extract} FROM {self.TABLE} WHERE id IN ({marks})", [r.id for r in records]
+        )}
+        out = []
+        for r in records:
+            values = stored.get(r.id)
+            if values is not None:
+                live = {f: v for f, v in zip(self.LIVE_FIELDS, values) if v is not None and v != getattr(r, f)}
+                if live:
+                    r = replace(r, **live)
+            out.append(r)
+        return out
+
+    def update_and_save(self, record: Record) -> None:
+        if self.LIVE_FIELDS:
+            self.update_many_and_save([record])
+            return
+        self._conn.execute(self._sql_update, [*self._params(record), self._dump(record), record.id])
+
+    def update_many_and_save(self, records: List[Record]) -> None:
+        if not records:
+            return
+        conn = self._conn
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            if self.LIVE_FIELDS:
+                records = self._stored_live(conn, records)
+            conn.executemany(
+                self._sql_update,
+                ([*self._params(r), self._dump(r), r.id] for r in records),
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def delete_many_and_save(self, record_ids: Iterable[Any]) -> int:
+        conn = self._conn
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            cur = conn.executemany(f"DELETE FROM {self.TABLE} WHERE id = ?", ((rid,) for rid in record_ids))
+            removed = max(cur.rowcount, 0)
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return removed
+
+    def data_version(self) -> Any:
+        row = self._conn.execute("SELECT version FROM table_versions WHERE name = ?", (self.TABLE,)).fetchone()
+        return row[0] if row else 0
+
+    def invalidate(self) -> None:
+        pass
+
+    def compact(self) -> None:
+        pass
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        return True
+
+
+class SqliteOrderRepository(SqliteRepository, OrderRepository):
+    TABLE = "orders"
+
+
+class SqliteProductRepository(SqliteRepository, ProductRepository):
+    TABLE = "products"
+
+
+class SqliteBusinessRepository(SqliteRepository, BusinessRepository):
+    TABLE = "businesses"
+
+
+class SqliteCourierRepository(SqliteRepository, CourierRepository):
+    TABLE = "couriers"
+
+    # No in-memory copy to patch here: positions go straight to the table,
+    # one transaction per ingest batch. Only lat/lng (and the location
+    # columns of available couriers) are written, so assignments made by
+    # other connections in the meantime are kept.
+    def set_positions(self, positions: Dict[Any, Tuple[float, float]]) -> List[Record]:
+        if not positions:
+            return []
+        ids = list(positions)
+        marks = ", ".join("?" * len(ids))
+        conn = self._conn
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.executemany(
+                f"UPDATE {self.TABLE} SET data = json_set(data, '$.lat', ?, '$.lng', ?), "
+                "location_lat = CASE WHEN available THEN ? END, location_lng = CASE WHEN available THEN ? END "
+                "WHERE id = ?",
+                ((lat, lng, lat, lng, cid) for cid, (lat, lng) in positions.items()),
+            )
+            records = self._decode(conn.execute(f"{self._sql_select} WHERE id IN ({marks})", ids))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return records
+
+    def save_positions(self, courier_ids: Iterable[Any]) -> None:
+        pass
+
+
+class SqlitePaymentRepository(SqliteRepository, PaymentRepository):
+    TABLE = "payments"
@@ -0,0 +1,115 @@
+import atexit
+import os
+import threading
+import time
+from typing import Callable, Dict, Optional
+
+from app.utils import safe_print
+
+WRITE_WINDOW_MS = float(os.environ.get("DELIVERY_WRITE_WINDOW_MS", "0"))
+WRITE_MAX_PENDING = int(os.environ.get("DELIVERY_WRITE_MAX_PENDING", "256"))
+
+
+class GroupCommitWriter:
+    # Collects dirty files and flushes them together once per window, or as
+    # soon as max_pending changes are queued or a caller asks for a barrier.
+    # Each mark() gets a sequence number; flush() waits until every change
+    # marked before it has been written.
+
+    def __init__(self, window_ms: float, max_pending: int):
+        self.window = window_ms / 1000.0
+        self.max_pending = max(1, max_pending)
+        self._dirty: Dict[str, Callable[[], None]] = {}
+        self._cond = threading.Condition()
+        self._seq = 0
+        self._durable = 0
+        self._urgent = False
+        self._thread: Optional[threading.Thread] = None
+        self.batches = 0
+        self.writes = 0
+
+    def mark(self, key: str, flush_fn: Callable[[], None]) -> None:
+        with self._cond:
+            self._dirty[key] = flush_fn
+            self._seq += 1
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="group-commit-writer", daemon=True)
+                self._thread.start()
+            if self._seq - self._durable >= self.max_pending:
+                self._urgent = True
+            self._cond.notify_all()
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            target = self._seq
+            if self._durable >= target:
+                return True
+            self._urgent = True
+            self._cond.notify_all()
+            while self._durable < target:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+            return True
+
+    def pending(self) -> int:
+        with self._cond:
+            return self._seq - self._durable
+
+    def stats(self) -> dict:
+        with self._cond:
+            return {
+                "window_ms": self.window * 1000,
+                "pending": self._seq - self._durable,
+                "changes": self._seq,
+                "batches": self.batches,
+                "file_writes": self.writes,
+            }
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                while not self._dirty:
+                    self._cond.wait()
+                deadline = time.monotonic() + self.window
+                while not self._urgent:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                batch, self._dirty = self._dirty, {}
+                target = self._seq
+                self._urgent = False
+            failed = {}
+            for key, flush_fn in batch.items():
+                try:
+                    flush_fn()
+                except Exception as e:
+                    failed[key] = flush_fn
+                    safe_print("[!] Error guardando {}:".format(key), e)
+            with self._cond:
+                self.batches += 1
+                self.writes += len(batch) - len(failed)
+                if failed:
+                    # Retried on the next window; the barrier stays closed.
+                    for key, flush_fn in failed.items():
+                        self._dirty.setdefault(key, flush_fn)
+                else:
+                    self._durable = max(self._durable, target)
+                self._cond.notify_all()
+
+
+_writer: Optional[GroupCommitWriter] = None
+if WRITE_WINDOW_MS > 0:
+    _writer = GroupCommitWriter(WRITE_WINDOW_MS, WRITE_MAX_PENDING)
+    atexit.register(_writer.flush, 10)
+
+
+def get_writer() -> Optional[GroupCommitWriter]:
+    return _writer
+
+
+def flush_writes(timeout: Optional[float] = None) -> bool:
+    return _writer.flush(timeout) if _writer is not None else True
@@ -1,9 +1,22 @@
+from typing import List, Optional, Union
+
 from fastapi import APIRouter, HTTPException
+from fastapi.responses import StreamingResponse
 
+from app.events import SSE_HEADERS, courier_topic, get_event_bus, sse_stream
 from app.services.courier_service import CourierService
+from app.services.dispatch_scheduler import get_dispatch_scheduler
+from app.services.io_executor import run_read, run_write
+from app.services.location_service import LOCATION_MAX_BATCH, get_location_tracker
 
 router = APIRouter()
 _courier_service = CourierService()
+_scheduler = get_dispatch_scheduler()
+_dispatch_service = _scheduler.dispatcher
+_tracker = get_location_tracker()
+# GPS pings only touch memory until the periodic snapshot; their own lane keeps
+# them in order without queueing behind order writes.
+LOCATIONS_LANE = "locations"
 
 
 def _to_404(e: ValueError) -> bool:
@@ -12,26 +25,107 @@ def _to_404(e: ValueError) -> bool:
 
 @router.get("/")
 async def get_couriers():
-    return _courier_service.get_all()
+    return await run_read(_courier_service.get_all)
 
 
 @router.get("/available")
 async def get_available_couriers():
-    return _courier_service.get_available()
+    return await run_read(_courier_service.get_available)
+
+
+@router.post("/dispatch")
+async def dispatch_orders(dry_run: bool = False):
+    return await run_write(_dispatch_service.dispatch, dry_run)
+
+
+@router.get("/dispatch/stats")
+async def get_dispatch_stats():
+    return _dispatch_service.stats()
+
+
+@router.get("/dispatch/throughput")
+async def get_dispatch_throughput(hours: float = 24.0):
+    return await run_read(_dispatch_service.throughput, hours)
+
+
+@router.get("/dispatch/scheduler")
+async def get_dispatch_scheduler_stats():
+    return _scheduler.stats()
+
+
+@router.post("/dispatch/scheduler/pause")
+async def pause_dispatch_scheduler():
+    _scheduler.pause()
+    return {"message": "Despacho automático pausado", "scheduler": _scheduler.stats()}
+
+
+@router.post("/dispatch/scheduler/resume")
+async def resume_dispatch_scheduler():
+    _scheduler.resume()
+    return {"message": "Despacho automático reanudado", "scheduler": _scheduler.stats()}
+
+
+@router.post("/locations")
+async def ingest_locations(payload: Union[List[dict], dict]):
+    fixes = payload.get("fixes", []) if isinstance(payload, dict) else payload
+    if not isinstance(fixes, list):
+        raise HTTPException(status_code=400, detail="fixes debe ser una lista de posiciones")
+    if len(fixes) > LOCATION_MAX_BATCH:
+        raise HTTPException(status_code=400, detail=f"Máximo {LOCATION_MAX_BATCH} posiciones por lote")
+    return await run_write(_tracker.ingest, fixes, lane=LOCATIONS_LANE)
+
+
+@router.get("/locations/stats")
+async def get_location_stats():
+    return _tracker.stats()
 
 
 @router.get("/{courier_id}")
 async def get_courier(courier_id: int):
-    courier = _courier_service.get_by_id(courier_id)
+    courier = await run_read(_courier_service.get_by_id, courier_id)
+    if not courier:
+        raise HTTPException(status_code=404, detail="Repartidor no encontrado")
+    return courier.to_dict()
+
+
+@router.post("/{courier_id}/location")
+async def update_courier_location(courier_id: int, fix: dict):
+    result = await run_write(_tracker.ingest, [{**fix, "courier_id": courier_id}], lane=LOCATIONS_LANE)
+    if not result["accepted"]:
+        courier = await run_read(_courier_service.get_by_id, courier_id)
+        if not courier:
+            raise HTTPException(status_code=404, detail="Repartidor no encontrado")
+        raise HTTPException(status_code=400, detail="Posición inválida o más antigua que la última recibida")
+    return {"courier_id": courier_id, **result}
+
+
+@router.get("/{courier_id}/track")
+async def get_courier_track(courier_id: int, limit: Optional[int] = None):
+    return {"courier_id": courier_id, "fixes": _tracker.track(courier_id, limit)}
+
+
+@router.get("/{courier_id}/events")
+async def stream_courier_events(courier_id: int):
+    # Subscribed before the snapshot is read, so no update falls in between.
+    bus = get_event_bus()
+    sub = bus.subscribe([courier_topic(courier_id)])
+    seen = bus.last_id()
+    try:
+        courier = await run_read(_courier_service.get_by_id, courier_id)
+    except BaseException:
+        sub.close()
+        raise
     if not courier:
+        sub.close()
         raise HTTPException(status_code=404, detail="Repartidor no encontrado")
-    return courier
+    first = {"id": seen, "event": "snapshot", "data": {"courier_id": courier_id, "courier": courier.to_dict()}}
+    return StreamingResponse(sse_stream(sub, first), media_type="text/event-stream", headers=SSE_HEADERS)
 
 
 @router.post("/{courier_id}/assign-order/{order_id}")
 async def assign_order_to_courier(courier_id: int, order_id: int):
     try:
-        return _courier_service.assign_order(courier_id, order_id)
+        return await run_write(_courier_service.assign_order, courier_id, order_id)
     except ValueError as e:
         raise HTTPException(status_code=404 if _to_404(e) else 400, detail=str(e))
 
@@ -39,11 +133,16 @@ async def assign_order_to_courier(courier_id: int, order_id: int):
 @router.post("/{courier_id}/complete-order/{order_id}")
 async def complete_order(courier_id: int, order_id: int):
     try:
-        return _courier_service.complete_order(courier_id, order_id)
+        return await run_write(_courier_service.complete_order, courier_id, order_id)
     except ValueError as e:
         raise HTTPException(status_code=404 if _to_404(e) else 400, detail=str(e))
 
 
 @router.get("/nearby/{lat}/{lng}")
 async def get_nearby_couriers(lat: float, lng: float, max_distance: float = 5.0):
-    return _courier_service.get_nearby(lat, lng, max_distance)
+    return await run_read(_courier_service.get_nearby, lat, lng, max_distance)
+
+
+@router.get("/nearest/{lat}/{lng}")
+async def get_nearest_couriers(lat: float, lng: float, k: int = 5, max_distance: Optional[float] = None):
+    return await run_read(_courier_service.get_nearest, lat, lng, k, max_distance)
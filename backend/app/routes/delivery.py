@@ -1,78 +1,215 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import Response, StreamingResponse
 from typing import Optional
 
-from app.repositories.business_repository import BusinessRepository
-from app.repositories.product_repository import ProductRepository
-from app.services.order_service import OrderService
+from app import metrics
+from app.events import SSE_HEADERS, get_event_bus, order_topic, sse_stream
+from app.repositories.factory import business_repository, courier_repository, product_repository
+from app.repositories.json_repository import JsonRepository
+from app.repositories.writer import get_writer
+from app.services.archive_service import get_order_archiver
+from app.services.business_service import NEARBY_DEFAULT_LIMIT, BusinessService
+from app.services.catalog_service import CATALOG_MAX_AGE_SECONDS, CatalogService, Snapshot
+from app.services.dispatch_scheduler import get_dispatch_scheduler
+from app.services.io_executor import run_read, run_write
+from app.services.order_service import ORDERS_PAGE_DEFAULT, OrderService
+from app.services.search_service import SEARCH_DEFAULT_LIMIT, SearchService
 
 router = APIRouter()
 
 _order_service = OrderService()
-_business_repo = BusinessRepository()
-_product_repo = ProductRepository()
+_business_repo = business_repository()
+_product_repo = product_repository()
+_catalog = CatalogService(_business_repo, _product_repo)
+_search = SearchService(_business_repo, _product_repo)
+_business_service = BusinessService(_business_repo)
+_CATALOG_CACHE_CONTROL = f"public, max-age={CATALOG_MAX_AGE_SECONDS}, must-revalidate"
+
+
+def _repository_cache(field: str):
+    return lambda: [({"file": name}, info[field]) for name, info in JsonRepository.cache_stats().items()]
+
+
+def _catalog_hit_ratio() -> list:
+    stats = _catalog.stats()
+    total = stats["hits"] + stats["builds"]
+    return [({}, stats["hits"] / total if total else 0.0)]
+
+
+metrics.REGISTRY.collector("parcerogo_repository_cache_hits_total", "counter",
+                           "Lecturas de archivos JSON servidas desde memoria.", _repository_cache("hits"))
+metrics.REGISTRY.collector("parcerogo_repository_cache_misses_total", "counter",
+                           "Recargas de archivos JSON desde disco.", _repository_cache("misses"))
+metrics.REGISTRY.collector("parcerogo_repository_cache_hit_ratio", "gauge",
+                           "Proporcion de lecturas servidas desde memoria por archivo.", _repository_cache("hit_ratio"))
+metrics.REGISTRY.collector("parcerogo_catalog_cache_hits_total", "counter",
+                           "Respuestas de catalogo servidas desde un snapshot.", lambda: [({}, _catalog.stats()["hits"])])
+metrics.REGISTRY.collector("parcerogo_catalog_cache_builds_total", "counter",
+                           "Snapshots de catalogo generados.", lambda: [({}, _catalog.stats()["builds"])])
+metrics.REGISTRY.collector("parcerogo_catalog_cache_hit_ratio", "gauge",
+                           "Proporcion de respuestas de catalogo servidas desde un snapshot.", _catalog_hit_ratio)
+metrics.REGISTRY.collector("parcerogo_write_pending", "gauge", "Cambios esperando la escritura agrupada a disco.",
+                           lambda: [({}, get_writer().stats()["pending"])] if get_writer() else [])
+
+
+def _accepts_gzip(request: Request) -> bool:
+    for part in request.headers.get("accept-encoding", "").split(","):
+        coding, _, params = part.partition(";")
+        if coding.strip().lower() not in ("gzip", "*"):
+            continue
+        _, _, q = params.partition("=")
+        try:
+            return float(q) > 0 if q.strip() else True
+        except ValueError:
+            return True
+    return False
+
+
+def _catalog_response(request: Request, snap: Snapshot) -> Response:
+    # Strong ETag per representation; If-None-Match compares weakly (RFC
+    # 9110), so either variant's tag revalidates the same data.
+    use_gzip = snap.gzip_body is not None and _accepts_gzip(request)
+    headers = {
+        "ETag": snap.gzip_etag if use_gzip else snap.etag,
+        "Cache-Control": _CATALOG_CACHE_CONTROL,
+        "Vary": "Accept-Encoding",
+    }
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match:
+        tags = {t.strip()[2:] if t.strip().startswith("W/") else t.strip() for t in if_none_match.split(",")}
+        if "*" in tags or snap.etag in tags or (snap.gzip_etag and snap.gzip_etag in tags):
+            return Response(status_code=304, headers=headers)
+    if use_gzip:
+        headers["Content-Encoding"] = "gzip"
+        return Response(snap.gzip_body, media_type="application/json", headers=headers)
+    return Response(snap.body, media_type="application/json", headers=headers)
 
 
 @router.get("/businesses")
-async def get_businesses():
-    businesses = _business_repo.find_all()
-    return {"businesses": businesses}
+async def get_businesses(request: Request):
+    return _catalog_response(request, await run_read(_catalog.businesses))
+
+
+@router.get("/businesses/nearby")
+async def get_nearby_businesses(lat: float, lng: float, limit: int = NEARBY_DEFAULT_LIMIT, offset: int = 0,
+                                max_distance: Optional[float] = None):
+    try:
+        return await run_read(_business_service.get_nearby, lat, lng, limit, offset, max_distance)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
 
 @router.get("/businesses/{business_id}")
 async def get_business(business_id: int):
-    business = _business_repo.find_by_id(business_id)
+    business = await run_read(_business_repo.find_by_id, business_id)
     if not business:
         raise HTTPException(status_code=404, detail="Negocio no encontrado")
-    return business
+    return business.to_dict()
 
 
 @router.get("/businesses/{business_id}/products")
-async def get_business_products(business_id: int):
-    products = _product_repo.find_by_business_id(business_id, only_available=True)
-    return {"products": products}
+async def get_business_products(business_id: int, request: Request):
+    return _catalog_response(request, await run_read(_catalog.business_products, business_id))
 
 
 @router.get("/products")
-async def get_all_products(category: Optional[str] = None):
-    all_products = _product_repo.find_all()
-    if category:
-        all_products = [p for p in all_products if p.get("category", "").lower() == category.lower()]
-    return {"products": all_products, "count": len(all_products), "category": category}
+async def get_all_products(request: Request, category: Optional[str] = None):
+    return _catalog_response(request, await run_read(_catalog.products, category))
+
+
+@router.get("/search")
+async def search_catalog(q: str = "", type: Optional[str] = None, limit: int = SEARCH_DEFAULT_LIMIT):
+    try:
+        return await run_read(_search.search, q, type, limit)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@router.get("/search/stats")
+async def search_stats():
+    return await run_read(_search.stats)
 
 
 @router.post("/orders")
 async def create_order(order_data: dict):
     try:
-        return _order_service.create_order(order_data)
+        result = await run_write(_order_service.create_order, order_data)
     except ValueError as e:
         msg = str(e)
         if "no encontrado" in msg.lower():
             raise HTTPException(status_code=404, detail=msg)
         raise HTTPException(status_code=400, detail=msg)
+    get_dispatch_scheduler().wake()
+    return result
 
 
 @router.get("/orders")
-async def get_orders(courier_id: Optional[int] = None, business_id: Optional[int] = None):
-    return _order_service.get_orders(courier_id=courier_id, business_id=business_id)
+async def get_orders(courier_id: Optional[int] = None, business_id: Optional[int] = None,
+                     status: Optional[str] = None, created_from: Optional[str] = None,
+                     created_to: Optional[str] = None, limit: int = ORDERS_PAGE_DEFAULT,
+                     cursor: Optional[str] = None, fields: Optional[str] = None):
+    try:
+        return await run_read(
+            _order_service.get_orders, courier_id=courier_id, business_id=business_id, status=status,
+            created_from=created_from, created_to=created_to, limit=limit, cursor=cursor, fields=fields,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
 
 @router.get("/orders/by-phone/{phone}")
-async def get_orders_by_phone(phone: str):
-    return _order_service.get_orders_by_phone(phone)
+async def get_orders_by_phone(phone: str, limit: int = ORDERS_PAGE_DEFAULT, cursor: Optional[str] = None,
+                              fields: Optional[str] = None):
+    try:
+        return await run_read(_order_service.get_orders_by_phone, phone, limit, cursor, fields)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@router.post("/archive/run")
+async def run_order_archive(older_than_days: Optional[float] = None):
+    try:
+        return await run_write(get_order_archiver().run, older_than_days)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@router.get("/archive/stats")
+async def get_archive_stats():
+    return await run_read(get_order_archiver().stats)
 
 
 @router.get("/orders/{order_id}")
 async def get_order(order_id: int):
-    order = _order_service.get_order_by_id(order_id)
+    order = await run_read(_order_service.get_order_by_id, order_id)
+    if not order:
+        raise HTTPException(status_code=404, detail="Pedido no encontrado")
+    return {"order": order.to_dict()}
+
+
+@router.get("/orders/{order_id}/events")
+async def stream_order_events(order_id: int):
+    # Subscribed before the snapshot is read, so no update falls in between.
+    bus = get_event_bus()
+    sub = bus.subscribe([order_topic(order_id)])
+    seen = bus.last_id()
+    try:
+        order = await run_read(_order_service.get_order_by_id, order_id)
+    except BaseException:
+        sub.close()
+        raise
     if not order:
+        sub.close()
         raise HTTPException(status_code=404, detail="Pedido no encontrado")
-    return {"order": order}
+    first = {"id": seen, "event": "snapshot",
+             "data": {"order_id": order_id, "status": order.status, "order": order.to_dict()}}
+    return StreamingResponse(sse_stream(sub, first), media_type="text/event-stream", headers=SSE_HEADERS)
 
 
 @router.patch("/orders/{order_id}/status")
 async def update_order_status(order_id: int, status_data: dict):
     try:
-        return _order_service.update_status(order_id, status_data)
+        return await run_write(_order_service.update_status, order_id, status_data)
     except ValueError as e:
         if "no encontrado" in str(e).lower():
             raise HTTPException(status_code=404, detail=str(e))
@@ -81,9 +218,15 @@ async def update_order_status(order_id: int, status_data: dict):
 
 @router.get("/delivery-persons")
 async def get_delivery_persons():
-    from app.repositories.courier_repository import CourierRepository
-    couriers = CourierRepository().find_all()
-    return {"delivery_persons": couriers}
+    couriers = await run_read(courier_repository().find_all)
+    return {"delivery_persons": [c.to_dict() for c in couriers]}
+
+
+@router.get("/cache-stats")
+async def get_cache_stats():
+    writer = get_writer()
+    cache = await run_read(JsonRepository.cache_stats)
+    return {"cache": cache, "writer": writer.stats() if writer else None, "catalog": _catalog.stats()}
 
 
 @router.get("/cart")
@@ -93,34 +236,34 @@ async def get_cart():
 
 @router.post("/cart/add")
 async def add_to_cart(cart_item: dict):
-    product = _product_repo.find_by_id(cart_item["product_id"])
+    product = await run_read(_product_repo.find_by_id, cart_item["product_id"])
     if not product:
         raise HTTPException(status_code=404, detail="Producto no encontrado")
-    if not product.get("available", True):
-        raise HTTPException(status_code=400, detail=f"Producto {product['name']} no disponible")
+    if not product.available:
+        raise HTTPException(status_code=400, detail=f"Producto {product.name} no disponible")
     quantity = cart_item.get("quantity", 1)
     return {
         "success": True,
         "product": {
-            "id": product["id"],
-            "name": product["name"],
-            "price": product["price"],
-            "image": product.get("image", ""),
-            "category": product.get("category", ""),
+            "id": product.id,
+            "name": product.name,
+            "price": product.price,
+            "image": product.image,
+            "category": product.category,
             "quantity": quantity,
-            "subtotal": product["price"] * quantity,
+            "subtotal": product.price * quantity,
         },
-        "message": f"{product['name']} agregado al carrito",
+        "message": f"{product.name} agregado al carrito",
     }
 
 
 @router.delete("/cart/remove/{product_id}")
 async def remove_from_cart(product_id: int):
-    product = _product_repo.find_by_id(product_id)
+    product = await run_read(_product_repo.find_by_id, product_id)
     if not product:
         raise HTTPException(status_code=404, detail="Producto no encontrado")
     return {
         "success": True,
         "product_id": product_id,
-        "message": f"{product['name']} removido del carrito",
+        "message": f"{product.name} removido del carrito",
     }
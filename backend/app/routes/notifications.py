@@ -2,11 +2,25 @@ from datetime import datetime
 
 from fastapi import APIRouter, HTTPException
 
-from app.utils import load_json, safe_print
+from app.events import get_event_bus
+from app.outbox import get_outbox
+from app.repositories.factory import order_repository
+from app.services.io_executor import run_read
+from app.utils import safe_print
 
 router = APIRouter()
 
 
+@router.get("/outbox")
+async def get_outbox_stats():
+    return get_outbox().stats()
+
+
+@router.get("/events")
+async def get_event_stats():
+    return get_event_bus().stats()
+
+
 @router.post("/send-sms")
 async def send_sms_notification(notification_data: dict):
     phone = notification_data.get("phone")
@@ -29,28 +43,27 @@ async def send_sms_notification(notification_data: dict):
 
 @router.post("/notify-order-status/{order_id}")
 async def notify_order_status_change(order_id: int):
-    orders = load_json("orders.json")
-    order = next((o for o in orders if o["id"] == order_id), None)
+    order = await run_read(order_repository().find_by_id, order_id)
     if not order:
         raise HTTPException(status_code=404, detail="Pedido no encontrado")
 
     status_messages = {
         "pendiente": f"Tu pedido #{order_id} ha sido recibido y está siendo procesado.",
-        "preparando": f"Tu pedido #{order_id} está siendo preparado por {order['business_name']}.",
-        "en_camino": f"¡Tu pedido #{order_id} está en camino! Repartidor: {order.get('delivery_person', 'Asignado')}",
+        "preparando": f"Tu pedido #{order_id} está siendo preparado por {order.business_name}.",
+        "en_camino": f"¡Tu pedido #{order_id} está en camino! Repartidor: {order.delivery_person}",
         "entregado": f"✅ Tu pedido #{order_id} ha sido entregado exitosamente. ¡Gracias por tu compra!",
         "cancelado": f"Tu pedido #{order_id} ha sido cancelado."
     }
-    message = status_messages.get(order["status"], f"El estado de tu pedido #{order_id} ha cambiado.")
+    message = status_messages.get(order.status, f"El estado de tu pedido #{order_id} ha cambiado.")
 
-    safe_print("[NOTIF] Pedido #{} - Estado: {}".format(order_id, order["status"]))
+    safe_print("[NOTIF] Pedido #{} - Estado: {}".format(order_id, order.status))
     safe_print("   Mensaje: {}".format(message))
-    safe_print("   Telefono: {}".format(order.get("customer_phone", "")))
+    safe_print("   Telefono: {}".format(order.customer_phone))
 
     return {
         "success": True,
         "order_id": order_id,
-        "status": order["status"],
+        "status": order.status,
         "message": message,
         "notification_sent": True
     }
@@ -1,19 +1,20 @@
 from fastapi import APIRouter, HTTPException
 
+from app.services.io_executor import run_read, run_write
 from app.services.payment_service import PaymentService
 
 router = APIRouter()
 _payment_service = PaymentService()
 
 
-def process_payment_core(payment_data: dict) -> dict:
-    return _payment_service.process_payment(payment_data)
+async def process_payment_core(payment_data: dict) -> dict:
+    return await run_write(_payment_service.process_payment, payment_data)
 
 
 @router.post("/process")
 async def process_payment(payment_data: dict):
     try:
-        return process_payment_core(payment_data)
+        return await process_payment_core(payment_data)
     except ValueError as e:
         if "no encontrado" in str(e).lower():
             raise HTTPException(status_code=404, detail=str(e))
@@ -22,12 +23,12 @@ async def process_payment(payment_data: dict):
 
 @router.get("/history")
 async def get_payment_history():
-    return _payment_service.get_history()
+    return await run_read(_payment_service.get_history)
 
 
 @router.get("/orders/{order_id}/payment")
 async def get_order_payment(order_id: int):
     try:
-        return _payment_service.get_order_payment(order_id)
+        return await run_read(_payment_service.get_order_payment, order_id)
     except ValueError as e:
         raise HTTPException(status_code=404, detail=str(e))
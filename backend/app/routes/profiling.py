@@ -0,0 +1,65 @@
+import re
+from typing import Optional
+
+from fastapi import APIRouter, Header, HTTPException
+from fastapi.responses import Response
+
+from app.profiler import PROFILER_ENABLED, get_profiler
+from app.services.io_executor import run_read
+
+router = APIRouter()
+
+_FORMATS = {
+    # format -> (media type, file extension)
+    "collapsed": ("text/plain; charset=utf-8", "collapsed.txt"),
+    "pstats": ("application/octet-stream", "pstats"),
+    "text": ("text/plain; charset=utf-8", "txt"),
+}
+
+
+def _authorize(token: Optional[str]) -> None:
+    if not PROFILER_ENABLED:
+        raise HTTPException(status_code=404, detail="Perfilador desactivado (configura DELIVERY_PROFILER_TOKEN)")
+    if not get_profiler().authorized(token):
+        raise HTTPException(status_code=403, detail="Token de perfilador inválido")
+
+
+@router.get("")
+async def get_profiler_status(x_profile_token: Optional[str] = Header(None)):
+    _authorize(x_profile_token)
+    return get_profiler().status()
+
+
+@router.post("/start")
+async def start_profiler(mode: str = "sample", requests: Optional[int] = None, seconds: Optional[float] = None,
+                         path: str = "/", interval_ms: Optional[float] = None,
+                         x_profile_token: Optional[str] = Header(None)):
+    _authorize(x_profile_token)
+    try:
+        return {"session": get_profiler().start(mode, requests, seconds, path, interval_ms)}
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@router.post("/stop")
+async def stop_profiler(x_profile_token: Optional[str] = Header(None)):
+    _authorize(x_profile_token)
+    return get_profiler().stop()
+
+
+@router.get("/download")
+async def download_profile(format: str = "collapsed", route: Optional[str] = None,
+                           x_profile_token: Optional[str] = Header(None)):
+    _authorize(x_profile_token)
+    if format not in _FORMATS:
+        raise HTTPException(status_code=400, detail="Formato no válido: usa collapsed, pstats o text")
+    profiler = get_profiler()
+    export = {"collapsed": profiler.collapsed, "pstats": profiler.pstats_dump, "text": profiler.pstats_text}[format]
+    try:
+        body = await run_read(export, route)
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    media_type, extension = _FORMATS[format]
+    name = re.sub(r"[^A-Za-z0-9]+", "-", route or "todas").strip("-") or "todas"
+    headers = {"Content-Disposition": f'attachment; filename="parcerogo-{name}.{extension}"'}
+    return Response(body, media_type=media_type, headers=headers)
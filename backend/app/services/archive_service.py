@@ -0,0 +1,137 @@
+import asyncio
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+
+from app.models import Order
+from app.repositories.archive import OrderArchive, get_order_archive
+from app.repositories.factory import order_repository
+from app.repositories.order_repository import OrderRepository
+from app.services.io_executor import run_write
+from app.utils import get_current_timestamp, safe_print
+
+# Terminal orders older than this are moved to the archive. Off (0) unless
+# set: archiving moves data out of orders.json, so it is opt-in.
+# POST /api/delivery/archive/run works either way.
+ARCHIVE_AFTER_DAYS = float(os.environ.get("DELIVERY_ARCHIVE_AFTER_DAYS", "0"))
+ARCHIVE_INTERVAL_SECONDS = float(os.environ.get("DELIVERY_ARCHIVE_INTERVAL_SECONDS", "3600"))
+# Orders moved per run, so one run never holds the orders lane for long.
+ARCHIVE_BATCH = max(1, int(os.environ.get("DELIVERY_ARCHIVE_BATCH", "5000")))
+TERMINAL_STATUSES = ("entregado", "cancelado")
+
+
+def _finished_at(order: Order) -> str:
+    history = order.status_history
+    if history and isinstance(history[-1], dict) and history[-1].get("timestamp"):
+        return str(history[-1]["timestamp"])
+    return str(order.created_at or "")
+
+
+class OrderArchiver:
+    # Moves delivered and cancelled orders whose last status change is older
+    # than after_days from the orders repository into the OrderArchive. Runs
+    # on the orders write lane, like every other orders write.
+
+    def __init__(self, order_repo: Optional[OrderRepository] = None, archive: Optional[OrderArchive] = None,
+                 after_days: float = ARCHIVE_AFTER_DAYS, interval_seconds: float = ARCHIVE_INTERVAL_SECONDS,
+                 batch: int = ARCHIVE_BATCH):
+        self._orders = order_repo or order_repository()
+        self.archive = archive or get_order_archive()
+        self.after_days = after_days
+        self.interval_seconds = interval_seconds
+        self.batch = batch
+        self._task: Optional[asyncio.Task] = None
+        self._lock = threading.Lock()
+        self.runs = 0
+        self.archived_total = 0
+        self.last_run: Optional[Dict[str, Any]] = None
+        self.last_error: Optional[str] = None
+
+    def run(self, after_days: Optional[float] = None, now: Optional[datetime] = None) -> Dict[str, Any]:
+        after_days = self.after_days if after_days is None else after_days
+        if after_days < 0:
+            raise ValueError("La antigüedad mínima no puede ser negativa")
+        t0 = time.perf_counter()
+        cutoff = ((now or datetime.now()) - timedelta(days=after_days)).isoformat()
+        candidates: List[Order] = []
+        for status in TERMINAL_STATUSES:
+            candidates.extend(o for o in self._orders.find_by_status(status) if _finished_at(o) < cutoff)
+        # str(id): ids are not all ints in older files.
+        candidates.sort(key=lambda o: (str(o.created_at or ""), str(o.id)))
+        batch = candidates[:self.batch]
+        written = self.archive.append(batch) if batch else {}
+        # Only what reached the archive leaves the orders repository.
+        ids = [oid for day_ids in written.values() for oid in day_ids]
+        removed = self._orders.delete_many_and_save(ids) if ids else 0
+        result = {
+            "archived": removed,
+            "remaining": len(candidates) - len(batch),
+            "segments": {day: len(day_ids) for day, day_ids in written.items()},
+            "cutoff": cutoff,
+            "ms": round((time.perf_counter() - t0) * 1000, 3),
+        }
+        with self._lock:
+            self.runs += 1
+            self.archived_total += removed
+            self.last_run = {"at": get_current_timestamp(), **result}
+            self.last_error = None
+        return result
+
+    def start(self) -> None:
+        if self._task is not None or self.after_days <= 0:
+            return
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self) -> None:
+        task, self._task = self._task, None
+        if task is None:
+            return
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                result = await run_write(self.run)
+                # Keep going while a backlog is left, one batch at a time.
+                if result["remaining"]:
+                    await asyncio.sleep(1)
+                    continue
+            except Exception as e:
+                with self._lock:
+                    self.last_error = f"{type(e).__name__}: {e}"
+                safe_print(f"[!] Error archivando pedidos: {e}")
+            await asyncio.sleep(self.interval_seconds)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            out = {
+                "running": self._task is not None,
+                "after_days": self.after_days,
+                "interval_seconds": self.interval_seconds,
+                "batch": self.batch,
+                "runs": self.runs,
+                "archived_total": self.archived_total,
+                "last_run": self.last_run,
+                "last_error": self.last_error,
+            }
+        out["archive"] = self.archive.stats()
+        return out
+
+
+_archiver: Optional[OrderArchiver] = None
+_archiver_lock = threading.Lock()
+
+
+def get_order_archiver() -> OrderArchiver:
+    global _archiver
+    if _archiver is None:
+        with _archiver_lock:
+            if _archiver is None:
+                _archiver = OrderArchiver()
+    return _archiver
@@ -0,0 +1,43 @@
+from typing import Optional
+
+from app.repositories.business_repository import BusinessRepository
+from app.repositories.factory import business_repository
+from app.services.geo_service import GeoService
+
+NEARBY_DEFAULT_LIMIT = 20
+NEARBY_MAX_LIMIT = 50
+
+
+class BusinessService:
+    def __init__(self, business_repo: Optional[BusinessRepository] = None, geo: Optional[GeoService] = None):
+        self._businesses = business_repo or business_repository()
+        self._geo = geo or GeoService()
+
+    def get_nearby(self, lat: float, lng: float, limit: int = NEARBY_DEFAULT_LIMIT, offset: int = 0,
+                   max_distance: Optional[float] = None) -> dict:
+        # Open businesses ordered by the ETA order creation would quote
+        # (delivery_time + 2 min per km), one page at a time.
+        if not self._geo.are_valid_for_medellin(lat, lng):
+            raise ValueError("Coordenadas fuera del rango válido para Medellín")
+        if limit < 1 or limit > NEARBY_MAX_LIMIT:
+            raise ValueError(f"limit debe estar entre 1 y {NEARBY_MAX_LIMIT}")
+        if offset < 0:
+            raise ValueError("offset no puede ser negativo")
+        # One extra to know whether another page exists.
+        hits = self._businesses.find_open_by_eta(lat, lng, offset + limit + 1, max_distance)
+        page = []
+        for eta, dist, business in hits[offset:offset + limit]:
+            row = business.to_dict()
+            row["distance_km"] = round(dist, 2)
+            row["estimated_time"] = int(eta)
+            page.append(row)
+        has_more = len(hits) > offset + limit
+        return {
+            "businesses": page,
+            "count": len(page),
+            "offset": offset,
+            "limit": limit,
+            "next_offset": offset + limit if has_more else None,
+            "location": {"lat": lat, "lng": lng},
+            "max_distance_km": max_distance,
+        }
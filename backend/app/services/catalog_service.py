@@ -0,0 +1,104 @@
+import gzip
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional
+
+from app.repositories.business_repository import BusinessRepository
+from app.repositories.factory import business_repository, product_repository
+from app.repositories.product_repository import ProductRepository
+from app.utils import json_default
+
+CATALOG_MAX_AGE_SECONDS = max(0, int(os.environ.get("DELIVERY_CATALOG_MAX_AGE_SECONDS", "30")))
+CATALOG_CACHE_ENTRIES = max(1, int(os.environ.get("DELIVERY_CATALOG_CACHE_ENTRIES", "1024")))
+# Smaller bodies fit in one packet either way.
+CATALOG_GZIP_MIN_BYTES = 1024
+
+
+def render_json(content: Any) -> bytes:
+    # Same bytes as FastAPI's JSONResponse; models are written through their
+    # to_dict() as the encoder reaches them.
+    return json.dumps(content, ensure_ascii=False, allow_nan=False, indent=None,
+                      separators=(",", ":"), default=json_default).encode("utf-8")
+
+
+class Snapshot:
+    # A rendered catalog response. The ETag is a hash of the body, so it is
+    # the same across restarts and workers while the data does not change;
+    # the gzip variant gets its own tag.
+
+    def __init__(self, version: Any, body: bytes):
+        self.version = version
+        self.body = body
+        digest = hashlib.blake2b(body, digest_size=16).hexdigest()
+        self.etag = f'"{digest}"'
+        if len(body) >= CATALOG_GZIP_MIN_BYTES:
+            self.gzip_body: Optional[bytes] = gzip.compress(body, compresslevel=6, mtime=0)
+            self.gzip_etag: Optional[str] = f'"{digest}-gz"'
+        else:
+            self.gzip_body = None
+            self.gzip_etag = None
+
+
+class CatalogService:
+    # Catalog responses (businesses, products) rendered once per data version
+    # of businesses/products and served as bytes until the data changes. The
+    # version check is a stat of the data file (JSON) or a one-row lookup
+    # (SQLite), so edits to the files are picked up on the next request.
+
+    def __init__(self, business_repo: Optional[BusinessRepository] = None,
+                 product_repo: Optional[ProductRepository] = None,
+                 max_entries: int = CATALOG_CACHE_ENTRIES):
+        self._businesses = business_repo or business_repository()
+        self._products = product_repo or product_repository()
+        self.max_entries = max_entries
+        self._snapshots: "OrderedDict[Hashable, Snapshot]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.builds = 0
+
+    def _get(self, key: Hashable, version: Any, build: Callable[[], Any]) -> Snapshot:
+        with self._lock:
+            snap = self._snapshots.get(key)
+            if snap is not None and snap.version == version:
+                self._snapshots.move_to_end(key)
+                self.hits += 1
+                return snap
+        snap = Snapshot(version, render_json(build()))
+        with self._lock:
+            self.builds += 1
+            self._snapshots[key] = snap
+            self._snapshots.move_to_end(key)
+            while len(self._snapshots) > self.max_entries:
+                self._snapshots.popitem(last=False)
+        return snap
+
+    def businesses(self) -> Snapshot:
+        return self._get(("businesses",), self._businesses.data_version(),
+                         lambda: {"businesses": self._businesses.find_all()})
+
+    def business_products(self, business_id: int) -> Snapshot:
+        return self._get(
+            ("business_products", business_id), self._products.data_version(),
+            lambda: {"products": self._products.find_by_business_id(business_id, only_available=True)},
+        )
+
+    def products(self, category: Optional[str] = None) -> Snapshot:
+        def build() -> Dict[str, Any]:
+            products = self._products.find_all()
+            if category:
+                products = [p for p in products if p.category.lower() == category.lower()]
+            return {"products": products, "count": len(products), "category": category}
+        return self._get(("products", category), self._products.data_version(), build)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "entries": len(self._snapshots),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "builds": self.builds,
+                "bytes": sum(len(s.body) + len(s.gzip_body or b"") for s in self._snapshots.values()),
+            }
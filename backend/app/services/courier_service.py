@@ -1,8 +1,15 @@
-from typing import Dict, Optional
+from dataclasses import replace
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
 
+from app.events import publish_courier, publish_order
+from app.models import Courier, Order
+from app.repositories.business_repository import BusinessRepository
 from app.repositories.order_repository import OrderRepository
 from app.repositories.courier_repository import CourierRepository
+from app.repositories.factory import business_repository, order_repository, courier_repository
 from app.services.geo_service import GeoService
+from app.services.route_planner import RoutePlanner
 
 
 class CourierService:
@@ -11,51 +18,95 @@ class CourierService:
         order_repo: Optional[OrderRepository] = None,
         courier_repo: Optional[CourierRepository] = None,
         geo: Optional[GeoService] = None,
+        business_repo: Optional[BusinessRepository] = None,
     ):
-        self._orders = order_repo or OrderRepository()
-        self._couriers = courier_repo or CourierRepository()
+        self._orders = order_repo or order_repository()
+        self._couriers = courier_repo or courier_repository()
+        self._businesses = business_repo or business_repository()
         self._geo = geo or GeoService()
+        self._planner = RoutePlanner(self._geo)
 
     def get_all(self) -> dict:
-        couriers = self._couriers.find_all()
+        couriers = [c.to_dict() for c in self._couriers.find_all()]
         return {"couriers": couriers}
 
     def get_available(self) -> dict:
-        couriers = self._couriers.find_available()
+        couriers = [c.to_dict() for c in self._couriers.find_available()]
         return {"couriers": couriers, "count": len(couriers)}
 
-    def get_by_id(self, courier_id: int) -> Optional[Dict]:
+    def get_by_id(self, courier_id: int) -> Optional[Courier]:
         return self._couriers.find_by_id(courier_id)
 
     def assign_order(self, courier_id: int, order_id: int) -> dict:
         courier = self._couriers.find_by_id(courier_id)
         if not courier:
             raise ValueError("Repartidor no encontrado")
-        if not courier.get("available", True):
+        if not courier.available:
             raise ValueError("El repartidor no está disponible")
 
         order = self._orders.find_by_id(order_id)
         if not order:
             raise ValueError("Pedido no encontrado")
-        if order.get("status") not in ["pendiente", "preparando"]:
-            raise ValueError(f"El pedido no puede ser asignado. Estado actual: {order.get('status')}")
+        if order.status not in ["pendiente", "preparando"]:
+            raise ValueError(f"El pedido no puede ser asignado. Estado actual: {order.status}")
 
-        order["courier_id"] = courier_id
-        order["courier_name"] = courier["name"]
-        order["courier_phone"] = courier["phone"]
-        order["status"] = "en_camino"
-        courier["available"] = False
-        courier["current_order_id"] = order_id
+        route = self._planner.plan([order], self._position(courier))
+        etas = self._planner.estimated_times(route, self.delivery_times(self._businesses, [order]))
+        orders, courier = self.assigned([order], courier, route, etas)
+        order = orders[0]
 
         self._orders.update_and_save(order)
         self._couriers.update_and_save(courier)
+        publish_order(order)
+        publish_courier(courier, "assigned", order_ids=[order_id])
 
         return {
-            "message": f"Pedido {order_id} asignado a {courier['name']}",
-            "order": order,
-            "courier": courier,
+            "message": f"Pedido {order_id} asignado a {courier.name}",
+            "order": order.to_dict(),
+            "courier": courier.to_dict(),
         }
 
+    @staticmethod
+    def _position(courier: Courier):
+        try:
+            return float(courier.lat), float(courier.lng)
+        except (TypeError, ValueError):
+            return None
+
+    @staticmethod
+    def _history(order: Order, status: str) -> None:
+        order.status_history = list(order.status_history) + [{
+            "status": status,
+            "timestamp": datetime.now().isoformat(),
+        }]
+
+    @staticmethod
+    def delivery_times(businesses: BusinessRepository, orders: List[Order]) -> Dict[int, int]:
+        # Each order's business preparation time, the base of its ETA.
+        out = {}
+        for order in orders:
+            business = businesses.find_by_id(order.business_id)
+            out[order.id] = int(business.delivery_time) if business else 30
+        return out
+
+    @classmethod
+    def assigned(cls, orders: List[Order], courier: Courier, route: List[Dict],
+                 etas: Dict[int, int]) -> Tuple[List[Order], Courier]:
+        # Copies of the orders and the courier with the assignment applied;
+        # route is the courier's ordered list of pickup/drop-off stops and
+        # etas the minutes RoutePlanner.estimated_times gives each order on it.
+        out = []
+        for order in orders:
+            order = replace(order, courier_id=courier.id, courier_name=courier.name, courier_phone=courier.phone,
+                            status="en_camino", batch_size=len(orders),
+                            estimated_time=etas.get(order.id, order.estimated_time))
+            cls._history(order, "en_camino")
+            out.append(order)
+        ids = [o.id for o in out]
+        courier = replace(courier, available=False, current_order_ids=ids,
+                          current_order_id=ids[0] if ids else None, route=route)
+        return out, courier
+
     def complete_order(self, courier_id: int, order_id: int) -> dict:
         courier = self._couriers.find_by_id(courier_id)
         if not courier:
@@ -63,35 +114,58 @@ class CourierService:
         order = self._orders.find_by_id(order_id)
         if not order:
             raise ValueError("Pedido no encontrado")
-        if order.get("courier_id") != courier_id:
+        if order.courier_id != courier_id:
             raise ValueError("Este pedido no está asignado a este repartidor")
-
-        order["status"] = "entregado"
-        courier["available"] = True
-        courier["current_order_id"] = None
+        if order.status != "en_camino":
+            raise ValueError(f"El pedido no puede ser entregado. Estado actual: {order.status}")
+
+        order = replace(order, status="entregado")
+        self._history(order, "entregado")
+        remaining = [oid for oid in courier.current_order_ids if oid != order_id]
+        courier = replace(
+            courier,
+            current_order_ids=remaining,
+            current_order_id=remaining[0] if remaining else None,
+            route=[s for s in courier.route if s.get("order_id") != order_id],
+            available=not remaining,
+            total_deliveries=int(courier.total_deliveries or 0) + 1,
+        )
 
         self._orders.update_and_save(order)
         self._couriers.update_and_save(courier)
+        publish_order(order)
+        publish_courier(courier, "completed", order_ids=[order_id])
 
         return {
             "message": f"Pedido {order_id} marcado como entregado",
-            "order": order,
-            "courier": courier,
+            "order": order.to_dict(),
+            "courier": courier.to_dict(),
         }
 
+    @staticmethod
+    def _with_distance(hits) -> list:
+        out = []
+        for dist, c in hits:
+            row = c.to_dict()
+            row["distance_km"] = round(dist, 2)
+            out.append(row)
+        return out
+
     def get_nearby(self, lat: float, lng: float, max_distance: float = 5.0) -> dict:
-        available = self._couriers.find_available()
-        nearby = []
-        for c in available:
-            dist = self._geo.distance_km(lat, lng, c["lat"], c["lng"])
-            if dist <= max_distance:
-                copy = c.copy()
-                copy["distance_km"] = round(dist, 2)
-                nearby.append(copy)
-        nearby.sort(key=lambda x: x["distance_km"])
+        nearby = self._with_distance(self._couriers.find_available_within(lat, lng, max_distance))
         return {
             "couriers": nearby,
             "count": len(nearby),
             "location": {"lat": lat, "lng": lng},
             "max_distance_km": max_distance,
         }
+
+    def get_nearest(self, lat: float, lng: float, k: int = 5, max_distance: Optional[float] = None) -> dict:
+        nearest = self._with_distance(self._couriers.find_available_nearest(lat, lng, k, max_distance))
+        return {
+            "couriers": nearest,
+            "count": len(nearest),
+            "location": {"lat": lat, "lng": lng},
+            "k": k,
+            "max_distance_km": max_distance,
+        }
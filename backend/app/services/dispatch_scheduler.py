@@ -0,0 +1,169 @@
+import asyncio
+import os
+import threading
+import time
+from collections import deque
+from typing import Any, Dict, Optional
+
+from app.services.dispatch_service import DispatchService
+from app.services.io_executor import run_write
+from app.utils import get_current_timestamp, safe_print
+
+AUTODISPATCH_ENABLED = os.environ.get("DELIVERY_AUTODISPATCH", "").strip().lower() in ("1", "true", "yes")
+AUTODISPATCH_TICK_SECONDS = float(os.environ.get("DELIVERY_AUTODISPATCH_TICK_SECONDS", "15"))
+AUTODISPATCH_BUDGET_MS = float(os.environ.get("DELIVERY_AUTODISPATCH_BUDGET_MS", "200"))
+# Pause after each cycle so a burst of new orders is handled in one batch.
+AUTODISPATCH_MIN_INTERVAL_SECONDS = float(os.environ.get("DELIVERY_AUTODISPATCH_MIN_INTERVAL_SECONDS", "1"))
+AUTODISPATCH_MAX_BATCH = 2000
+AUTODISPATCH_MIN_BATCH = 10
+_LATENCY_WINDOW = 100
+
+
+class DispatchScheduler:
+    # Runs DispatchService on the orders write lane every tick, or sooner when
+    # wake() is called (new order). Cycles over budget shrink the batch of
+    # orders handled per cycle; fast cycles grow it back, so one cycle never
+    # holds the lane much longer than budget_ms.
+
+    def __init__(self, dispatcher: Optional[DispatchService] = None,
+                 tick_seconds: float = AUTODISPATCH_TICK_SECONDS,
+                 budget_ms: float = AUTODISPATCH_BUDGET_MS,
+                 min_interval: float = AUTODISPATCH_MIN_INTERVAL_SECONDS,
+                 paused: bool = not AUTODISPATCH_ENABLED):
+        self.dispatcher = dispatcher or DispatchService()
+        self.tick_seconds = tick_seconds
+        self.budget_ms = budget_ms
+        self.min_interval = min_interval
+        self.batch_limit = AUTODISPATCH_MAX_BATCH
+        self._paused = paused
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._event: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._wake_reason: Optional[str] = None
+        self._lock = threading.Lock()
+        self._latencies: deque = deque(maxlen=_LATENCY_WINDOW)
+        self.cycles = 0
+        self.over_budget = 0
+        self.assigned_total = 0
+        self.wakeups: Dict[str, int] = {"tick": 0, "new_order": 0, "resume": 0}
+        self.last_cycle: Optional[Dict[str, Any]] = None
+        self.last_error: Optional[str] = None
+
+    @property
+    def paused(self) -> bool:
+        return self._paused
+
+    def start(self) -> None:
+        if self._task is not None:
+            return
+        self._loop = asyncio.get_running_loop()
+        self._event = asyncio.Event()
+        self._task = self._loop.create_task(self._run())
+
+    async def stop(self) -> None:
+        task, self._task = self._task, None
+        if task is None:
+            return
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+
+    def wake(self, reason: str = "new_order") -> None:
+        # Safe to call from the event loop or from worker threads.
+        loop = self._loop
+        if loop is None or self._paused:
+            return
+        self._wake_reason = reason
+        try:
+            loop.call_soon_threadsafe(self._event.set)
+        except RuntimeError:
+            pass
+
+    def pause(self) -> None:
+        self._paused = True
+
+    def resume(self) -> None:
+        self._paused = False
+        self.wake("resume")
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._event.wait(), timeout=self.tick_seconds)
+                reason = self._wake_reason or "new_order"
+            except asyncio.TimeoutError:
+                reason = "tick"
+            self._event.clear()
+            self._wake_reason = None
+            if self._paused:
+                continue
+            await self.run_cycle(reason)
+            await asyncio.sleep(self.min_interval)
+
+    async def run_cycle(self, reason: str = "manual") -> Optional[Dict[str, Any]]:
+        t0 = time.perf_counter()
+        try:
+            result = await run_write(self.dispatcher.dispatch, False, self.batch_limit, self.budget_ms)
+        except Exception as e:
+            with self._lock:
+                self.last_error = f"{type(e).__name__}: {e}"
+            safe_print(f"[!] Error en despacho automatico: {e}")
+            return None
+        elapsed_ms = (time.perf_counter() - t0) * 1000
+        stats = result["stats"]
+        with self._lock:
+            self.cycles += 1
+            self.wakeups[reason] = self.wakeups.get(reason, 0) + 1
+            self.assigned_total += stats["assigned"]
+            self._latencies.append(stats["total_ms"])
+            if stats["total_ms"] > self.budget_ms:
+                self.over_budget += 1
+                ratio = self.budget_ms / stats["total_ms"]
+                self.batch_limit = max(AUTODISPATCH_MIN_BATCH, int(self.batch_limit * ratio * 0.8))
+            elif stats["total_ms"] < self.budget_ms / 2 and stats["orders"] >= self.batch_limit:
+                self.batch_limit = min(AUTODISPATCH_MAX_BATCH, self.batch_limit * 2)
+            self.last_cycle = {
+                "reason": reason,
+                "at": get_current_timestamp(),
+                "latency_ms": round(elapsed_ms, 3),
+                **stats,
+            }
+            self.last_error = None
+        return result
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            latencies = sorted(self._latencies)
+            return {
+                "running": self._task is not None,
+                "paused": self._paused,
+                "tick_seconds": self.tick_seconds,
+                "budget_ms": self.budget_ms,
+                "batch_limit": self.batch_limit,
+                "cycles": self.cycles,
+                "over_budget": self.over_budget,
+                "assigned_total": self.assigned_total,
+                "queue_depth": self.last_cycle["queue_depth"] if self.last_cycle else None,
+                "latency_ms": {
+                    "p50": latencies[len(latencies) // 2] if latencies else None,
+                    "max": latencies[-1] if latencies else None,
+                },
+                "wakeups": dict(self.wakeups),
+                "last_cycle": self.last_cycle,
+                "last_error": self.last_error,
+            }
+
+
+_scheduler: Optional[DispatchScheduler] = None
+_scheduler_lock = threading.Lock()
+
+
+def get_dispatch_scheduler() -> DispatchScheduler:
+    global _scheduler
+    if _scheduler is None:
+        with _scheduler_lock:
+            if _scheduler is None:
+                _scheduler = DispatchScheduler()
+    return _scheduler
@@ -0,0 +1,402 @@
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.events import publish_courier, publish_order
+from app.models import Courier, Order
+from app.repositories.business_repository import BusinessRepository
+from app.repositories.courier_repository import CourierRepository
+from app.repositories.factory import business_repository, courier_repository, order_repository
+from app.repositories.order_repository import OrderRepository
+from app.repositories.spatial_index import GridIndex
+from app.services.courier_service import CourierService
+from app.services.geo_service import GeoService
+from app.services.route_planner import RoutePlanner
+
+DISPATCHABLE_STATUSES = ("pendiente", "preparando")
+DISPATCH_MAX_PICKUP_KM = float(os.environ.get("DELIVERY_DISPATCH_MAX_PICKUP_KM", "20"))
+# Cost is expressed in km of pickup distance: each rating point below 5 costs
+# RATING_WEIGHT_KM, each minute an order has waited (up to AGE_CAP_MINUTES)
+# discounts AGE_WEIGHT_KM.
+DISPATCH_RATING_WEIGHT_KM = float(os.environ.get("DELIVERY_DISPATCH_RATING_WEIGHT_KM", "1.0"))
+DISPATCH_AGE_WEIGHT_KM = float(os.environ.get("DELIVERY_DISPATCH_AGE_WEIGHT_KM", "0.1"))
+DISPATCH_AGE_CAP_MINUTES = 60.0
+# Exact assignment while orders x couriers is at most DISPATCH_EXACT_MAX^2
+# pairs; above it, greedy over the nearest candidates of each order.
+DISPATCH_EXACT_MAX = int(os.environ.get("DELIVERY_DISPATCH_EXACT_MAX", "150"))
+DISPATCH_GREEDY_CANDIDATES = 8
+# Orders a courier may carry at once. A pending order joins a batch when its
+# pickup is within BATCH_PICKUP_RADIUS_KM of the batch's first pickup, the
+# combined route is shorter than riding it separately, and no order in the
+# batch rides more than BATCH_MAX_EXTRA_KM beyond its direct distance.
+COURIER_CAPACITY = max(1, int(os.environ.get("DELIVERY_COURIER_CAPACITY", "3")))
+BATCH_PICKUP_RADIUS_KM = float(os.environ.get("DELIVERY_BATCH_PICKUP_RADIUS_KM", "1.0"))
+BATCH_MAX_EXTRA_KM = float(os.environ.get("DELIVERY_BATCH_MAX_EXTRA_KM", "2.0"))
+BATCH_CANDIDATES = 10
+_INFEASIBLE = 1e9
+
+
+def _hungarian(cost: List[List[float]]) -> List[Tuple[int, int]]:
+    # Minimum-cost assignment for a rows <= cols matrix (potentials method,
+    # O(rows^2 * cols)). Returns (row, col) for every row.
+    n, m = len(cost), len(cost[0])
+    u = [0.0] * (n + 1)
+    v = [0.0] * (m + 1)
+    p = [0] * (m + 1)
+    way = [0] * (m + 1)
+    for i in range(1, n + 1):
+        p[0] = i
+        j0 = 0
+        minv = [float("inf")] * (m + 1)
+        used = [False] * (m + 1)
+        while True:
+            used[j0] = True
+            i0 = p[j0]
+            row = cost[i0 - 1]
+            ui0 = u[i0]
+            delta = float("inf")
+            j1 = 0
+            for j in range(1, m + 1):
+                if not used[j]:
+                    cur = row[j - 1] - ui0 - v[j]
+                    if cur < minv[j]:
+                        minv[j] = cur
+                        way[j] = j0
+                    if minv[j] < delta:
+                        delta = minv[j]
+                        j1 = j
+            for j in range(m + 1):
+                if used[j]:
+                    u[p[j]] += delta
+                    v[j] -= delta
+                else:
+                    minv[j] -= delta
+            j0 = j1
+            if p[j0] == 0:
+                break
+        while j0:
+            j1 = way[j0]
+            p[j0] = p[j1]
+            j0 = j1
+    return [(p[j] - 1, j - 1) for j in range(1, m + 1) if p[j]]
+
+
+class DispatchService:
+    # Groups dispatchable orders without courier into batches of nearby
+    # pickups and assigns the batches to the available couriers in one pass,
+    # minimizing pickup distance (courier to first business) adjusted by
+    # courier rating and order age. Each courier's route is then sequenced
+    # from its position and all changes are committed with one batch write
+    # per repository.
+
+    def __init__(
+        self,
+        order_repo: Optional[OrderRepository] = None,
+        courier_repo: Optional[CourierRepository] = None,
+        geo: Optional[GeoService] = None,
+        business_repo: Optional[BusinessRepository] = None,
+        max_pickup_km: float = DISPATCH_MAX_PICKUP_KM,
+        capacity: int = COURIER_CAPACITY,
+    ):
+        self._orders = order_repo or order_repository()
+        self._couriers = courier_repo or courier_repository()
+        self._businesses = business_repo or business_repository()
+        self._geo = geo or GeoService()
+        self._planner = RoutePlanner(self._geo)
+        self.max_pickup_km = max_pickup_km
+        self.capacity = capacity
+        self._lock = threading.Lock()
+        self._runs = 0
+        self._assigned_total = 0
+        self._last: Optional[Dict[str, Any]] = None
+
+    def pending_orders(self) -> List[Order]:
+        orders = []
+        for status in DISPATCHABLE_STATUSES:
+            orders.extend(o for o in self._orders.find_by_status(status) if not o.courier_id)
+        orders.sort(key=lambda o: (o.created_at or "", o.id or 0))
+        return orders
+
+    @staticmethod
+    def _pickup(order: Order) -> Optional[Tuple[float, float]]:
+        try:
+            return float(order.business_lat), float(order.business_lng)
+        except (TypeError, ValueError):
+            return None
+
+    @staticmethod
+    def _geo_point(courier: Courier) -> Optional[Tuple[float, float]]:
+        try:
+            return float(courier.lat), float(courier.lng)
+        except (TypeError, ValueError):
+            return None
+
+    @staticmethod
+    def _age_minutes(order: Order, now: datetime) -> float:
+        try:
+            created = datetime.fromisoformat(order.created_at)
+        except (TypeError, ValueError):
+            return 0.0
+        return max(0.0, (now - created).total_seconds() / 60)
+
+    @staticmethod
+    def _courier_penalty(courier: Courier) -> float:
+        try:
+            rating = float(courier.rating or 0)
+        except (TypeError, ValueError):
+            rating = 0.0
+        return DISPATCH_RATING_WEIGHT_KM * max(0.0, 5.0 - rating)
+
+    def _order_bonus(self, order: Order, now: datetime) -> float:
+        return DISPATCH_AGE_WEIGHT_KM * min(self._age_minutes(order, now), DISPATCH_AGE_CAP_MINUTES)
+
+    def _direct_km(self, order: Order) -> Optional[float]:
+        try:
+            return self._geo.distance_km(float(order.business_lat), float(order.business_lng),
+                                         float(order.customer_lat), float(order.customer_lng))
+        except (TypeError, ValueError):
+            return None
+
+    def _batches(self, orders: List[Order], deadline: Optional[float] = None) -> List[List[int]]:
+        # Oldest order first: each unbatched order seeds a batch and pulls in
+        # the nearest unbatched pickups that pass the batching rules.
+        if self.capacity <= 1 or len(orders) < 2:
+            return [[i] for i in range(len(orders))]
+        index = GridIndex(lat="business_lat", lng="business_lng")
+        for i, order in enumerate(orders):
+            index.add(i, order)
+        direct = [self._direct_km(o) for o in orders]
+        taken = set()
+        batches = []
+        for i, seed in enumerate(orders):
+            if i in taken:
+                continue
+            taken.add(i)
+            index.remove(i)
+            batch = [i]
+            batches.append(batch)
+            if direct[i] is None or (deadline is not None and time.perf_counter() > deadline):
+                continue
+            length = direct[i]
+            lat, lng = float(seed.business_lat), float(seed.business_lng)
+            for _, k in index.nearest(lat, lng, BATCH_CANDIDATES, BATCH_PICKUP_RADIUS_KM):
+                if len(batch) >= self.capacity:
+                    break
+                if direct[k] is None:
+                    continue
+                members = batch + [k]
+                route = self._planner.plan([orders[m] for m in members])
+                route_len = self._planner.length_km(route)
+                if route_len - length >= direct[k]:
+                    continue
+                legs = self._planner.legs_km(route)
+                if any(legs[orders[m].id][0] > direct[m] + BATCH_MAX_EXTRA_KM for m in members):
+                    continue
+                batch.append(k)
+                taken.add(k)
+                index.remove(k)
+                length = route_len
+        return batches
+
+    def _solve_exact(self, units, points, couriers, bonus, penalty) -> List[Tuple[int, int, float, float]]:
+        dists = self._geo.distance_matrix_km(points, [self._geo_point(c) for c in couriers])
+        cost = [
+            [d + penalty[j] - bonus[i] if d <= self.max_pickup_km else _INFEASIBLE for j, d in enumerate(row)]
+            for i, row in enumerate(dists)
+        ]
+        if len(units) <= len(couriers):
+            pairs = _hungarian(cost)
+        else:
+            transposed = [list(col) for col in zip(*cost)]
+            pairs = [(i, j) for j, i in _hungarian(transposed)]
+        return [(i, j, dists[i][j], cost[i][j]) for i, j in pairs if cost[i][j] < _INFEASIBLE]
+
+    def _solve_greedy(self, units, points, couriers, bonus, penalty,
+                      deadline: Optional[float] = None) -> List[Tuple[int, int, float, float]]:
+        index = GridIndex(lat="lat", lng="lng")
+        for j, c in enumerate(couriers):
+            index.add(j, c)
+        open_units = list(range(len(units)))
+        pairs = []
+        while open_units and len(index):
+            if pairs and deadline is not None and time.perf_counter() > deadline:
+                break
+            edges = []
+            for i in open_units:
+                lat, lng = points[i]
+                for dist, j in index.nearest(lat, lng, DISPATCH_GREEDY_CANDIDATES, self.max_pickup_km):
+                    edges.append((dist + penalty[j] - bonus[i], i, j, dist))
+            if not edges:
+                break
+            edges.sort()
+            taken_units, taken_couriers = set(), set()
+            for cost, i, j, dist in edges:
+                if i in taken_units or j in taken_couriers:
+                    continue
+                taken_units.add(i)
+                taken_couriers.add(j)
+                index.remove(j)
+                pairs.append((i, j, dist, cost))
+            open_units = [i for i in open_units if i not in taken_units]
+        return pairs
+
+    def dispatch(self, dry_run: bool = False, max_orders: Optional[int] = None,
+                 budget_ms: Optional[float] = None) -> dict:
+        # max_orders caps the batch to the oldest pending orders; budget_ms
+        # stops the greedy rounds early (the exact solver is bounded by size).
+        t0 = time.perf_counter()
+        deadline = t0 + budget_ms / 1000 if budget_ms else None
+        now = datetime.now()
+        candidates = self.pending_orders()
+        couriers = [c for c in self._couriers.find_available() if self._geo_point(c) is not None]
+        orders = [o for o in candidates[:max_orders] if self._pickup(o) is not None]
+        t_load = time.perf_counter()
+
+        batches = self._batches(orders, deadline)
+        # Batches are assigned as units, located at their seed's pickup.
+        points = [self._pickup(orders[b[0]]) for b in batches]
+        t_batch = time.perf_counter()
+
+        pairs: List[Tuple[int, int, float, float]] = []
+        method = "none"
+        if batches and couriers:
+            bonus = [sum(self._order_bonus(orders[i], now) for i in b) for b in batches]
+            penalty = [self._courier_penalty(c) for c in couriers]
+            if len(batches) * len(couriers) <= DISPATCH_EXACT_MAX ** 2:
+                method = "hungarian"
+                pairs = self._solve_exact(batches, points, couriers, bonus, penalty)
+            else:
+                method = "greedy"
+                pairs = self._solve_greedy(batches, points, couriers, bonus, penalty, deadline)
+        t_solve = time.perf_counter()
+
+        updated_orders, updated_couriers, assignments, routes = [], [], [], []
+        for u, j, dist, cost in sorted(pairs):
+            members = [orders[i] for i in batches[u]]
+            courier = couriers[j]
+            route = self._planner.plan(members, self._geo_point(courier))
+            etas = self._planner.estimated_times(route, CourierService.delivery_times(self._businesses, members))
+            assigned, courier = CourierService.assigned(members, courier, route, etas)
+            for order in assigned:
+                updated_orders.append(order)
+                assignments.append({
+                    "order_id": order.id,
+                    "courier_id": courier.id,
+                    "courier_name": courier.name,
+                    "batch_size": len(assigned),
+                    "pickup_km": round(dist, 2),
+                    "estimated_time": order.estimated_time,
+                    "cost": round(cost, 3),
+                })
+            updated_couriers.append(courier)
+            routes.append({
+                "courier_id": courier.id,
+                "order_ids": courier.current_order_ids,
+                "route_km": round(self._planner.length_km(route, self._geo_point(courier)), 2),
+                "stops": route,
+            })
+        if not dry_run and assignments:
+            self._orders.update_many_and_save(updated_orders)
+            self._couriers.update_many_and_save(updated_couriers)
+            for order in updated_orders:
+                publish_order(order)
+            for courier in updated_couriers:
+                publish_courier(courier, "assigned", order_ids=courier.current_order_ids)
+        t_commit = time.perf_counter()
+
+        assigned_ids = {a["order_id"] for a in assignments}
+        stats = {
+            "method": method,
+            "dry_run": dry_run,
+            "pending": len(candidates),
+            "orders": len(orders),
+            "batches": len(batches),
+            "couriers": len(couriers),
+            "assigned": len(assignments),
+            "assigned_couriers": len(routes),
+            "queue_depth": len(candidates) - (0 if dry_run else len(assignments)),
+            "load_ms": round((t_load - t0) * 1000, 3),
+            "batch_ms": round((t_batch - t_load) * 1000, 3),
+            "solve_ms": round((t_solve - t_batch) * 1000, 3),
+            "commit_ms": round((t_commit - t_solve) * 1000, 3),
+            "total_ms": round((t_commit - t0) * 1000, 3),
+        }
+        with self._lock:
+            self._runs += 1
+            if not dry_run:
+                self._assigned_total += len(assignments)
+            self._last = stats
+        return {
+            "message": f"{len(assignments)} pedidos asignados",
+            "assignments": assignments,
+            "routes": routes,
+            "unassigned_order_ids": [o.id for o in candidates if o.id not in assigned_ids],
+            "stats": stats,
+        }
+
+    @staticmethod
+    def _timestamp(value: Any) -> Optional[datetime]:
+        try:
+            return datetime.fromisoformat(value)
+        except (TypeError, ValueError):
+            return None
+
+    def throughput(self, hours: float = 24.0) -> dict:
+        # Orders delivered per courier-hour over the last `hours`. A courier
+        # counts as busy from each order's "en_camino" to its "entregado" (or
+        # now, while still on the way); overlapping batched orders count once.
+        now = datetime.now()
+        since = now - timedelta(hours=hours)
+        busy: Dict[Any, List[Tuple[datetime, datetime]]] = {}
+        delivered = 0
+        for status in ("en_camino", "entregado"):
+            for order in self._orders.find_by_status(status):
+                courier_id = order.courier_id
+                if not courier_id:
+                    continue
+                start = end = None
+                for entry in order.status_history:
+                    if entry.get("status") == "en_camino":
+                        start = self._timestamp(entry.get("timestamp"))
+                    elif entry.get("status") == "entregado":
+                        end = self._timestamp(entry.get("timestamp"))
+                if status == "en_camino":
+                    end = now
+                if start is None or end is None or end < since:
+                    continue
+                if status == "entregado":
+                    delivered += 1
+                busy.setdefault(courier_id, []).append((max(start, since), end))
+        seconds = 0.0
+        for intervals in busy.values():
+            intervals.sort()
+            cur_start, cur_end = intervals[0]
+            for start, end in intervals[1:]:
+                if start <= cur_end:
+                    cur_end = max(cur_end, end)
+                else:
+                    seconds += (cur_end - cur_start).total_seconds()
+                    cur_start, cur_end = start, end
+            seconds += (cur_end - cur_start).total_seconds()
+        courier_hours = seconds / 3600
+        return {
+            "window_hours": hours,
+            "orders_delivered": delivered,
+            "couriers": len(busy),
+            "courier_hours": round(courier_hours, 3),
+            "orders_per_courier_hour": round(delivered / courier_hours, 3) if courier_hours else None,
+        }
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "runs": self._runs,
+                "assigned_total": self._assigned_total,
+                "last_run": self._last,
+                "max_pickup_km": self.max_pickup_km,
+                "exact_max": DISPATCH_EXACT_MAX,
+                "capacity": self.capacity,
+                "vectorized": self._geo.is_vectorized(),
+            }
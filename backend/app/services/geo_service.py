@@ -1,4 +1,7 @@
-from app.utils import calculate_distance, validate_coordinates
+from typing import List, Sequence, Tuple
+
+from app import utils
+from app.utils import calculate_distance, calculate_distance_matrix, calculate_distances, validate_coordinates
 
 
 class GeoService:
@@ -6,6 +9,19 @@ class GeoService:
     def distance_km(lat1: float, lng1: float, lat2: float, lng2: float) -> float:
         return calculate_distance(lat1, lng1, lat2, lng2)
 
+    @staticmethod
+    def distances_km(lat: float, lng: float, points: Sequence[Tuple[float, float]]) -> List[float]:
+        return calculate_distances(lat, lng, points)
+
+    @staticmethod
+    def distance_matrix_km(origins: Sequence[Tuple[float, float]],
+                           destinations: Sequence[Tuple[float, float]]) -> List[List[float]]:
+        return calculate_distance_matrix(origins, destinations)
+
+    @staticmethod
+    def is_vectorized() -> bool:
+        return utils.np is not None
+
     @staticmethod
     def are_valid_for_medellin(lat: float, lng: float) -> bool:
         return validate_coordinates(lat, lng)
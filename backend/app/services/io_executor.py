@@ -0,0 +1,71 @@
+import asyncio
+import contextvars
+import functools
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict
+
+from app import profiler
+
+IO_THREADS = max(1, int(os.environ.get("DELIVERY_IO_THREADS", "8")))
+
+
+class IOExecutor:
+    # Runs blocking repository/service calls off the event loop. Reads share a
+    # bounded pool; writes go through named single-thread lanes so that
+    # read-modify-write sequences on the same data never interleave.
+
+    def __init__(self, max_workers: int = IO_THREADS):
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="repo-io")
+        self._lanes: Dict[str, ThreadPoolExecutor] = {}
+        self._lock = threading.Lock()
+
+    def _lane(self, name: str) -> ThreadPoolExecutor:
+        lane = self._lanes.get(name)
+        if lane is None:
+            with self._lock:
+                lane = self._lanes.get(name)
+                if lane is None:
+                    lane = self._lanes[name] = ThreadPoolExecutor(
+                        max_workers=1, thread_name_prefix=f"repo-write-{name}"
+                    )
+        return lane
+
+    @staticmethod
+    def _submit(executor: ThreadPoolExecutor, fn: Callable, args, kwargs) -> "asyncio.Future":
+        # Copy the caller's context so contextvars (request-scoped state)
+        # are visible inside the worker thread.
+        ctx = contextvars.copy_context()
+        call = functools.partial(ctx.run, profiler.bind(fn), *args, **kwargs)
+        return asyncio.get_running_loop().run_in_executor(executor, call)
+
+    async def read(self, fn: Callable, *args, **kwargs) -> Any:
+        return await self._submit(self._pool, fn, args, kwargs)
+
+    async def write(self, lane: str, fn: Callable, *args, **kwargs) -> Any:
+        return await self._submit(self._lane(lane), fn, args, kwargs)
+
+    def shutdown(self) -> None:
+        self._pool.shutdown(wait=True)
+        for lane in list(self._lanes.values()):
+            lane.shutdown(wait=True)
+
+
+_executor = IOExecutor()
+
+# Every order-domain mutation (orders, payments, courier assignment) touches
+# orders.json, so they share one lane.
+ORDERS_LANE = "orders"
+
+
+async def run_read(fn: Callable, *args, **kwargs) -> Any:
+    return await _executor.read(fn, *args, **kwargs)
+
+
+async def run_write(fn: Callable, *args, lane: str = ORDERS_LANE, **kwargs) -> Any:
+    return await _executor.write(lane, fn, *args, **kwargs)
+
+
+def get_executor() -> IOExecutor:
+    return _executor
@@ -0,0 +1,173 @@
+import os
+import threading
+import time
+from collections import deque
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from app.events import publish_positions
+from app.repositories.courier_repository import CourierRepository
+from app.repositories.factory import courier_repository
+from app.utils import safe_print
+
+LOCATION_HISTORY = max(1, int(os.environ.get("DELIVERY_LOCATION_HISTORY", "120")))
+LOCATION_SNAPSHOT_SECONDS = float(os.environ.get("DELIVERY_LOCATION_SNAPSHOT_SECONDS", "30"))
+LOCATION_MAX_BATCH = 5000
+
+# (timestamp, lat, lng)
+Fix = Tuple[float, float, float]
+
+
+class LocationTracker:
+    # Keeps the last LOCATION_HISTORY GPS fixes per courier in memory and
+    # moves the courier in the repository (cached record + location index)
+    # as fixes arrive. The file is rewritten only by the periodic snapshot,
+    # once for every courier that moved since the previous one.
+
+    def __init__(self, courier_repo: Optional[CourierRepository] = None,
+                 history: int = LOCATION_HISTORY, snapshot_seconds: float = LOCATION_SNAPSHOT_SECONDS):
+        self._couriers = courier_repo or courier_repository()
+        self.history = history
+        self.snapshot_seconds = snapshot_seconds
+        self._tracks: Dict[Any, deque] = {}
+        self._moved: Dict[Any, None] = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.accepted = 0
+        self.rejected = 0
+        self.batches = 0
+        self.snapshots = 0
+        self.last_snapshot: Optional[Dict[str, Any]] = None
+
+    @staticmethod
+    def _parse(fix: Dict[str, Any], now: float) -> Optional[Fix]:
+        try:
+            lat = float(fix["lat"])
+            lng = float(fix["lng"])
+            ts = float(fix.get("timestamp") or now)
+        except (KeyError, TypeError, ValueError):
+            return None
+        if not (-90.0 <= lat <= 90.0 and -180.0 <= lng <= 180.0):
+            return None
+        return ts, lat, lng
+
+    def ingest(self, fixes: Iterable[Dict[str, Any]]) -> Dict[str, int]:
+        # fixes: [{"courier_id", "lat", "lng", "timestamp"?}], timestamp in
+        # epoch seconds. Fixes older than the courier's latest are kept out
+        # of the buffer; unknown couriers and bad coordinates are rejected.
+        now = time.time()
+        latest: Dict[Any, Tuple[float, float]] = {}
+        stamps: Dict[Any, float] = {}
+        accepted = rejected = 0
+        with self._lock:
+            for raw in fixes:
+                try:
+                    courier_id = int(raw["courier_id"])
+                    fix = self._parse(raw, now)
+                except (KeyError, TypeError, ValueError):
+                    fix = None
+                if fix is None:
+                    rejected += 1
+                    continue
+                track = self._tracks.get(courier_id)
+                if track is None:
+                    if self._couriers.find_by_id(courier_id) is None:
+                        rejected += 1
+                        continue
+                    track = self._tracks[courier_id] = deque(maxlen=self.history)
+                if track and fix[0] < track[-1][0]:
+                    rejected += 1
+                    continue
+                track.append(fix)
+                latest[courier_id] = (fix[1], fix[2])
+                stamps[courier_id] = fix[0]
+                accepted += 1
+            self.accepted += accepted
+            self.rejected += rejected
+            self.batches += 1
+            for courier_id in latest:
+                self._moved[courier_id] = None
+        if latest:
+            publish_positions(self._couriers.set_positions(latest), stamps)
+        return {"accepted": accepted, "rejected": rejected}
+
+    def track(self, courier_id: Any, limit: Optional[int] = None) -> List[Dict[str, float]]:
+        with self._lock:
+            fixes = list(self._tracks.get(courier_id) or ())
+        if limit is not None:
+            fixes = fixes[-limit:] if limit > 0 else []
+        return [{"timestamp": ts, "lat": lat, "lng": lng} for ts, lat, lng in fixes]
+
+    def latest(self, courier_id: Any) -> Optional[Dict[str, float]]:
+        fixes = self.track(courier_id, 1)
+        return fixes[0] if fixes else None
+
+    def snapshot(self) -> int:
+        with self._lock:
+            moved, self._moved = list(self._moved), {}
+        if not moved:
+            return 0
+        t0 = time.perf_counter()
+        try:
+            self._couriers.save_positions(moved)
+        except Exception:
+            with self._lock:
+                for courier_id in moved:
+                    self._moved[courier_id] = None
+            raise
+        with self._lock:
+            self.snapshots += 1
+            self.last_snapshot = {
+                "at": time.time(),
+                "couriers": len(moved),
+                "ms": round((time.perf_counter() - t0) * 1000, 3),
+            }
+        return len(moved)
+
+    def start(self) -> None:
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="location-snapshot", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 5.0) -> None:
+        thread, self._thread = self._thread, None
+        if thread is not None:
+            self._stop.set()
+            thread.join(timeout)
+        self.snapshot()
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.snapshot_seconds):
+            try:
+                self.snapshot()
+            except Exception as e:
+                safe_print(f"[!] Error guardando posiciones de repartidores: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "couriers_tracked": len(self._tracks),
+                "accepted": self.accepted,
+                "rejected": self.rejected,
+                "batches": self.batches,
+                "pending_snapshot": len(self._moved),
+                "snapshots": self.snapshots,
+                "snapshot_seconds": self.snapshot_seconds,
+                "history": self.history,
+                "last_snapshot": self.last_snapshot,
+            }
+
+
+_tracker: Optional[LocationTracker] = None
+_tracker_lock = threading.Lock()
+
+
+def get_location_tracker() -> LocationTracker:
+    global _tracker
+    if _tracker is None:
+        with _tracker_lock:
+            if _tracker is None:
+                _tracker = LocationTracker()
+    return _tracker
@@ -1,14 +1,62 @@
+import base64
+import json
+from dataclasses import replace
 from datetime import datetime
-from typing import List, Dict, Optional
+from typing import List, Optional, Tuple
 
+from app.models import Order, OrderProduct
+from app.repositories.archive import OrderArchive, get_order_archive
 from app.repositories.order_repository import OrderRepository
 from app.repositories.product_repository import ProductRepository
-from app.repositories.business_repository import BusinessRepository
+from app.repositories.business_repository import BusinessRepository, estimated_minutes
 from app.repositories.courier_repository import CourierRepository
+from app.repositories.factory import (
+    order_repository,
+    product_repository,
+    business_repository,
+    courier_repository,
+)
+from app.events import publish_order
 from app.services.geo_service import GeoService
 from app.utils import get_current_timestamp, safe_print
 
 
+ORDERS_PAGE_DEFAULT = 50
+ORDERS_PAGE_MAX = 500
+
+
+def _encode_cursor(order: Order) -> str:
+    raw = json.dumps([order.created_at, order.id], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def _decode_cursor(cursor: Optional[str]) -> Optional[Tuple[str, int]]:
+    if not cursor:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        created_at, order_id = json.loads(raw)
+    except (ValueError, TypeError):
+        raise ValueError("Cursor inválido")
+    if not isinstance(created_at, str) or not isinstance(order_id, int):
+        raise ValueError("Cursor inválido")
+    return created_at, order_id
+
+
+def _parse_bound(value: Optional[str], end: bool = False) -> Optional[str]:
+    # ISO date or datetime, compared as text against created_at; a plain
+    # date as upper bound covers the whole day.
+    if not value:
+        return None
+    try:
+        datetime.fromisoformat(value)
+    except ValueError:
+        raise ValueError(f"Fecha inválida: {value}. Use el formato AAAA-MM-DD o AAAA-MM-DDTHH:MM:SS")
+    if end and len(value) == 10:
+        return value + "T23:59:59.999999"
+    return value
+
+
 class OrderService:
     VALID_STATUSES = ["pendiente", "preparando", "en_camino", "entregado", "cancelado"]
 
@@ -19,40 +67,48 @@ class OrderService:
         business_repo: Optional[BusinessRepository] = None,
         courier_repo: Optional[CourierRepository] = None,
         geo: Optional[GeoService] = None,
+        archive: Optional[OrderArchive] = None,
     ):
-        self._orders = order_repo or OrderRepository()
-        self._products = product_repo or ProductRepository()
-        self._businesses = business_repo or BusinessRepository()
-        self._couriers = courier_repo or CourierRepository()
+        self._orders = order_repo or order_repository()
+        self._products = product_repo or product_repository()
+        self._businesses = business_repo or business_repository()
+        self._couriers = courier_repo or courier_repository()
         self._geo = geo or GeoService()
+        self._archive = archive or get_order_archive()
+
+    def _next_id(self) -> int:
+        # Archived orders keep their ids (GET /orders/{id} and the by-phone
+        # history still find them), so new ids start above the archive's.
+        while True:
+            new_id = self._orders.next_id(floor=self._archive.max_id())
+            if not self._archive.contains(new_id):
+                return new_id
 
     def create_order(self, order_data: dict) -> dict:
         business = self._businesses.find_by_id(order_data["business_id"])
         if not business:
             raise ValueError("Negocio no encontrado")
 
-        all_products = self._products.find_all()
-        product_index = {p.get("id"): p for p in all_products if isinstance(p, dict)}
         total = 0
         order_products = []
         for item in order_data["products"]:
-            product = product_index.get(item["product_id"])
+            product = self._products.find_by_id(item["product_id"])
             if not product:
                 raise ValueError(f"Producto {item['product_id']} no encontrado")
-            if not product.get("available", True):
-                raise ValueError(f"Producto {product['name']} no disponible")
+            if not product.available:
+                raise ValueError(f"Producto {product.name} no disponible")
             quantity = item.get("quantity", 1)
             notes = (item.get("notes") or "").strip()[:500]
-            subtotal = product["price"] * quantity
+            subtotal = product.price * quantity
             total += subtotal
-            order_products.append({
-                "product_id": product["id"],
-                "product_name": product["name"],
-                "quantity": quantity,
-                "unit_price": product["price"],
-                "subtotal": subtotal,
-                "notes": notes,
-            })
+            order_products.append(OrderProduct(
+                product_id=product.id,
+                product_name=product.name,
+                quantity=quantity,
+                unit_price=product.price,
+                subtotal=subtotal,
+                notes=notes,
+            ))
 
         if not self._geo.are_valid_for_medellin(order_data["customer_lat"], order_data["customer_lng"]):
             raise ValueError("Coordenadas fuera del rango válido para Medellín")
@@ -65,100 +121,130 @@ class OrderService:
         total += tip_amount
 
         distance = self._geo.distance_km(
-            business["latitude"], business["longitude"],
+            business.latitude, business.longitude,
             order_data["customer_lat"], order_data["customer_lng"],
         )
-        estimated_time = int(business.get("delivery_time", 30) + (distance * 2))
-
-        orders = self._orders.find_all()
-        new_id = (max([o.get("id", 0) for o in orders]) + 1) if orders else 1
-        new_order = {
-            "id": new_id,
-            "customer_name": order_data["customer_name"],
-            "customer_phone": order_data["customer_phone"],
-            "customer_address": order_data["customer_address"],
-            "customer_lat": order_data["customer_lat"],
-            "customer_lng": order_data["customer_lng"],
-            "business_id": business["id"],
-            "business_name": business["name"],
-            "business_lat": business["latitude"],
-            "business_lng": business["longitude"],
-            "products": order_products,
-            "total": total,
-            "distance_km": round(distance, 2),
-            "estimated_time": estimated_time,
-            "payment_method": order_data.get("payment_method", "efectivo"),
-            "tip_amount": tip_amount,
-            "payment_status": "pendiente",
-            "status": "pendiente",
-            "delivery_person": None,
-            "courier_phone": None,
-            "created_at": get_current_timestamp(),
-            "status_history": [{"status": "pendiente", "timestamp": datetime.now().isoformat()}],
-        }
+        estimated_time = int(estimated_minutes(business, distance))
+
+        new_id = self._next_id()
+        new_order = Order(
+            id=new_id,
+            customer_name=order_data["customer_name"],
+            customer_phone=order_data["customer_phone"],
+            customer_address=order_data["customer_address"],
+            customer_lat=order_data["customer_lat"],
+            customer_lng=order_data["customer_lng"],
+            business_id=business.id,
+            business_name=business.name,
+            business_lat=business.latitude,
+            business_lng=business.longitude,
+            products=order_products,
+            total=total,
+            distance_km=round(distance, 2),
+            estimated_time=estimated_time,
+            payment_method=order_data.get("payment_method", "efectivo"),
+            tip_amount=tip_amount,
+            payment_status="pendiente",
+            status="pendiente",
+            created_at=get_current_timestamp(),
+            status_history=[{"status": "pendiente", "timestamp": datetime.now().isoformat()}],
+        )
         self._orders.append_and_save(new_order)
+        payload = new_order.to_dict()
 
         try:
-            from app.notify_sms import send_new_order_sms
-            send_new_order_sms(new_order)
+            from app.notify_sms import enqueue_new_order_sms
+            enqueue_new_order_sms(payload)
         except Exception:
             pass
 
-        return {"order": new_order, "message": "Pedido creado exitosamente"}
-
-    def get_orders(self, courier_id: Optional[int] = None, business_id: Optional[int] = None) -> dict:
-        orders = self._orders.find_all()
-        if courier_id is not None:
-            orders = [o for o in orders if o.get("courier_id") == courier_id]
-        if business_id is not None:
-            orders = [o for o in orders if o.get("business_id") == business_id]
-        return {"orders": orders, "count": len(orders)}
-
-    def get_orders_by_phone(self, phone: str) -> dict:
-        normalized = OrderRepository._normalize_phone(phone)
-        customer_orders = self._orders.find_by_phone_normalized(normalized)
-        customer_orders.sort(key=lambda x: x.get("created_at", ""), reverse=True)
-        return {"orders": customer_orders, "count": len(customer_orders)}
-
-    def get_order_by_id(self, order_id: int) -> Optional[Dict]:
-        return self._orders.find_by_id(order_id)
+        return {"order": payload, "message": "Pedido creado exitosamente"}
+
+    def get_orders(self, courier_id: Optional[int] = None, business_id: Optional[int] = None,
+                   status: Optional[str] = None, created_from: Optional[str] = None,
+                   created_to: Optional[str] = None, limit: int = ORDERS_PAGE_DEFAULT,
+                   cursor: Optional[str] = None, fields: Optional[str] = None) -> dict:
+        statuses = None
+        if status:
+            statuses = [s.strip() for s in status.split(",") if s.strip()]
+            invalid = [s for s in statuses if s not in self.VALID_STATUSES]
+            if invalid:
+                raise ValueError(f"Estado inválido: {', '.join(invalid)}. Válidos: {self.VALID_STATUSES}")
+        created_from, created_to = _parse_bound(created_from), _parse_bound(created_to, end=True)
+        return self._page(limit, cursor, fields, lambda n, before: self._orders.find_page(
+            n, before, statuses=statuses, courier_id=courier_id, business_id=business_id,
+            created_from=created_from, created_to=created_to,
+        ))
+
+    def get_orders_by_phone(self, phone: str, limit: int = ORDERS_PAGE_DEFAULT,
+                            cursor: Optional[str] = None, fields: Optional[str] = None) -> dict:
+        # A customer's history includes archived orders; both sources are
+        # newest first, so one page is the newest of their two pages.
+        def fetch(n: int, before: Optional[Tuple[str, int]]) -> List[Order]:
+            hot = self._orders.find_page(n, before, phone=phone)
+            hot_ids = {o.id for o in hot}
+            cold = [o for o in self._archive.find_by_phone(phone, n, before) if o.id not in hot_ids]
+            merged = sorted(hot + cold, key=lambda o: (o.created_at or "", o.id), reverse=True)
+            return merged[:n]
+        return self._page(limit, cursor, fields, fetch)
+
+    def _page(self, limit: int, cursor: Optional[str], fields: Optional[str], fetch) -> dict:
+        # Newest first, one page at a time: next_cursor resumes after the
+        # last order returned and is None on the last page.
+        if limit < 1 or limit > ORDERS_PAGE_MAX:
+            raise ValueError(f"limit debe estar entre 1 y {ORDERS_PAGE_MAX}")
+        orders = fetch(limit + 1, _decode_cursor(cursor))
+        next_cursor = None
+        if len(orders) > limit:
+            orders = orders[:limit]
+            next_cursor = _encode_cursor(orders[-1])
+        rows = [o.to_dict() for o in orders]
+        if fields:
+            keep = {"id", *(f.strip() for f in fields.split(",") if f.strip())}
+            rows = [{k: v for k, v in row.items() if k in keep} for row in rows]
+        return {"orders": rows, "count": len(rows), "next_cursor": next_cursor}
+
+    def get_order_by_id(self, order_id: int) -> Optional[Order]:
+        return self._orders.find_by_id(order_id) or self._archive.find_by_id(order_id)
 
     def update_status(self, order_id: int, status_data: dict) -> dict:
         order = self._orders.find_by_id(order_id)
         if not order:
             raise ValueError("Pedido no encontrado")
+        # Cached records are shared with concurrent readers: change a copy and
+        # let update_and_save swap it in.
+        order = replace(order)
 
-        old_status = order["status"]
+        old_status = order.status
         new_status = status_data.get("status")
         if new_status not in self.VALID_STATUSES:
             raise ValueError(f"Estado inválido. Válidos: {self.VALID_STATUSES}")
 
-        order["status"] = new_status
+        order.status = new_status
         courier_id = status_data.get("courier_id")
 
         if new_status == "en_camino":
             if courier_id:
                 courier = self._couriers.find_by_id(courier_id)
                 if courier:
-                    order["courier_id"] = courier_id
-                    order["delivery_person"] = courier.get("name", "")
-                    order["courier_phone"] = courier.get("phone", "")
-            elif not order.get("delivery_person"):
+                    order.courier_id = courier_id
+                    order.delivery_person = courier.name
+                    order.courier_phone = courier.phone
+            elif not order.delivery_person:
                 delivery_persons = ["Carlos", "María", "Pedro", "Ana"]
-                order["delivery_person"] = delivery_persons[order_id % len(delivery_persons)]
-                order["courier_phone"] = f"+57 300 {1000000 + order_id}"
+                order.delivery_person = delivery_persons[order_id % len(delivery_persons)]
+                order.courier_phone = f"+57 300 {1000000 + order_id}"
 
-        if "status_history" not in order:
-            order["status_history"] = []
-        order["status_history"].append({
+        order.status_history = list(order.status_history) + [{
             "status": new_status,
             "timestamp": datetime.now().isoformat(),
-        })
-        order["updated_at"] = datetime.now().isoformat()
+        }]
+        order.updated_at = datetime.now().isoformat()
 
         self._orders.update_and_save(order)
+        publish_order(order, previous=old_status)
 
         safe_print("[NOTIF] Pedido #{} de '{}' a '{}'".format(order_id, old_status, new_status))
-        safe_print("   Cliente: {} - Telefono: {}".format(order.get("customer_name", ""), order.get("customer_phone", "")))
+        safe_print("   Cliente: {} - Telefono: {}".format(order.customer_name, order.customer_phone))
 
-        return {"order": order, "message": f"Estado actualizado de '{old_status}' a '{new_status}'"}
+        return {"order": order.to_dict(), "message": f"Estado actualizado de '{old_status}' a '{new_status}'"}
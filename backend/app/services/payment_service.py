@@ -1,7 +1,11 @@
+from dataclasses import replace
 from typing import Optional
 
+from app.events import publish_order
+from app.models import Payment
 from app.repositories.order_repository import OrderRepository
 from app.repositories.payment_repository import PaymentRepository
+from app.repositories.factory import order_repository, payment_repository
 from app.utils import get_current_timestamp
 
 
@@ -13,14 +17,14 @@ class PaymentService:
         order_repo: Optional[OrderRepository] = None,
         payment_repo: Optional[PaymentRepository] = None,
     ):
-        self._orders = order_repo or OrderRepository()
-        self._payments = payment_repo or PaymentRepository()
+        self._orders = order_repo or order_repository()
+        self._payments = payment_repo or payment_repository()
 
     def process_payment(self, payment_data: dict) -> dict:
         order = self._orders.find_by_id(payment_data["order_id"])
         if not order:
             raise ValueError("Pedido no encontrado")
-        if order.get("payment_status") == "pagado":
+        if order.payment_status == "pagado":
             raise ValueError("El pedido ya está pagado")
 
         payment_method = payment_data.get("payment_method", "efectivo")
@@ -44,37 +48,37 @@ class PaymentService:
             payment_status = "pendiente"
             payment_message = "Pago en efectivo registrado. Se cobrará al momento de la entrega."
 
-        order["payment_method"] = payment_method
-        order["payment_status"] = payment_status
+        order = replace(order, payment_method=payment_method, payment_status=payment_status)
 
-        payments = self._payments.find_all()
-        tip_amount = order.get("tip_amount") or 0
-        payment_record = {
-            "id": len(payments) + 1,
-            "order_id": order["id"],
-            "amount": order["total"],
-            "tip_amount": tip_amount,
-            "payment_method": payment_method,
-            "status": payment_status,
-            "created_at": get_current_timestamp(),
-        }
+        payment_record = Payment(
+            id=self._payments.next_id(),
+            order_id=order.id,
+            amount=order.total,
+            tip_amount=order.tip_amount or 0,
+            payment_method=payment_method,
+            status=payment_status,
+            created_at=get_current_timestamp(),
+        )
         self._payments.append_and_save(payment_record)
         self._orders.update_and_save(order)
+        publish_order(order, "payment")
+        if payment_status == "pagado":
+            self._payments.flush()
 
         try:
-            from app.sms_service import send_order_sms
-            send_order_sms()
+            from app.sms_service import enqueue_order_sms
+            enqueue_order_sms(order.id)
         except Exception:
             pass
 
         return {
-            "payment": payment_record,
+            "payment": payment_record.to_dict(),
             "message": payment_message,
-            "order": order,
+            "order": order.to_dict(),
         }
 
     def get_history(self) -> dict:
-        payments = self._payments.find_all()
+        payments = [p.to_dict() for p in self._payments.find_all()]
         return {"payments": payments}
 
     def get_order_payment(self, order_id: int) -> dict:
@@ -84,8 +88,8 @@ class PaymentService:
         payment = self._payments.find_by_order_id(order_id)
         return {
             "order_id": order_id,
-            "total": order["total"],
-            "payment_method": order.get("payment_method", "efectivo"),
-            "payment_status": order.get("payment_status", "pendiente"),
-            "payment_record": payment,
+            "total": order.total,
+            "payment_method": order.payment_method,
+            "payment_status": order.payment_status,
+            "payment_record": payment.to_dict() if payment else None,
         }
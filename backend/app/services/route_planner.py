@@ -0,0 +1,126 @@
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from app.models import Order
+from app.repositories.business_repository import ETA_MINUTES_PER_KM
+from app.services.geo_service import GeoService
+
+STOP_MINUTES = 3
+
+Point = Tuple[float, float]
+
+
+def _stops_for(orders: Sequence[Order]) -> List[Dict]:
+    stops = []
+    for order in orders:
+        try:
+            pickup = float(order.business_lat), float(order.business_lng)
+            dropoff = float(order.customer_lat), float(order.customer_lng)
+        except (TypeError, ValueError):
+            continue
+        stops.append({"type": "pickup", "order_id": order.id, "lat": pickup[0], "lng": pickup[1]})
+        stops.append({"type": "dropoff", "order_id": order.id, "lat": dropoff[0], "lng": dropoff[1]})
+    return stops
+
+
+def _feasible(seq: Sequence[int]) -> bool:
+    # Stop 2k is order k's pickup and 2k + 1 its drop-off.
+    seen = set()
+    for s in seq:
+        if s % 2 and s - 1 not in seen:
+            return False
+        seen.add(s)
+    return True
+
+
+class RoutePlanner:
+    # Orders a courier's pickups and drop-offs: nearest neighbour among the
+    # stops that are allowed next (a drop-off only after its pickup), then
+    # 2-opt improvement that keeps every pickup before its drop-off.
+
+    def __init__(self, geo: Optional[GeoService] = None):
+        self._geo = geo or GeoService()
+
+    def plan(self, orders: Sequence[Order], start: Optional[Point] = None) -> List[Dict]:
+        stops = _stops_for(orders)
+        if not stops:
+            return []
+        points = [(s["lat"], s["lng"]) for s in stops]
+        nodes = ([start] if start is not None else []) + points
+        dist = self._geo.distance_matrix_km(nodes, nodes)
+        offset = 1 if start is not None else 0
+
+        def d(a: Optional[int], b: int) -> float:
+            # a is None for the route's start.
+            if a is None:
+                return dist[0][b + offset] if start is not None else 0.0
+            return dist[a + offset][b + offset]
+
+        def length(seq: Sequence[int]) -> float:
+            total, prev = 0.0, None
+            for s in seq:
+                total += d(prev, s)
+                prev = s
+            return total
+
+        seq: List[int] = []
+        done = set()
+        prev = None if start is not None else 0
+        if start is None:
+            seq.append(0)
+            done.add(0)
+        while len(seq) < len(stops):
+            allowed = [s for s in range(len(stops)) if s not in done and (s % 2 == 0 or s - 1 in done)]
+            nxt = min(allowed, key=lambda s: d(prev, s))
+            seq.append(nxt)
+            done.add(nxt)
+            prev = nxt
+
+        # Without a start the first pickup is fixed, so moves only touch the
+        # rest. Reversals alone rarely keep pickups ahead of drop-offs, so
+        # single-stop relocations are tried as well.
+        first = 0 if start is not None else 1
+        best = length(seq)
+        improved = True
+        while improved:
+            improved = False
+            for i in range(first, len(seq) - 1):
+                for j in range(i + 1, len(seq)):
+                    for cand in (seq[:i] + seq[i:j + 1][::-1] + seq[j + 1:],
+                                 seq[:i] + seq[i + 1:j + 1] + [seq[i]] + seq[j + 1:],
+                                 seq[:i] + [seq[j]] + seq[i:j] + seq[j + 1:]):
+                        if not _feasible(cand):
+                            continue
+                        cand_len = length(cand)
+                        if cand_len < best - 1e-9:
+                            seq, best = cand, cand_len
+                            improved = True
+        return [stops[s] for s in seq]
+
+    def length_km(self, stops: Sequence[Dict], start: Optional[Point] = None) -> float:
+        points = ([start] if start is not None else []) + [(s["lat"], s["lng"]) for s in stops]
+        return sum(GeoService.distance_km(a[0], a[1], b[0], b[1]) for a, b in zip(points, points[1:]))
+
+    def legs_km(self, stops: Sequence[Dict]) -> Dict[int, Tuple[float, int]]:
+        # order_id -> (km ridden from its pickup to its drop-off along the
+        # route, stops made in between).
+        out: Dict[int, Tuple[float, int]] = {}
+        picked: Dict[int, Tuple[float, int]] = {}
+        km = 0.0
+        for i, s in enumerate(stops):
+            if i:
+                km += GeoService.distance_km(stops[i - 1]["lat"], stops[i - 1]["lng"], s["lat"], s["lng"])
+            if s["type"] == "pickup":
+                picked[s["order_id"]] = (km, i)
+            elif s["order_id"] in picked:
+                km0, i0 = picked[s["order_id"]]
+                out[s["order_id"]] = (km - km0, i - i0 - 1)
+        return out
+
+    def estimated_times(self, stops: Sequence[Dict], delivery_times: Dict[int, int]) -> Dict[int, int]:
+        # Same formula as order creation, with the direct distance replaced by
+        # the distance ridden on this route plus a few minutes per extra stop.
+        return {
+            oid: int(delivery_times.get(oid, 30) + km * ETA_MINUTES_PER_KM + between * STOP_MINUTES)
+            for oid, (km, between) in self.legs_km(stops).items()
+        }
+
@@ -0,0 +1,308 @@
+import heapq
+import math
+import os
+import re
+import threading
+from bisect import bisect_left
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Set, Tuple
+
+from app.repositories.business_repository import BusinessRepository
+from app.repositories.factory import business_repository, product_repository
+from app.repositories.product_repository import ProductRepository
+from app.utils import fold_text
+
+SEARCH_DEFAULT_LIMIT = 20
+SEARCH_MAX_LIMIT = 100
+# Vocabulary tokens a prefix may expand to ("a" would otherwise match most of it).
+SEARCH_MAX_EXPANSIONS = max(1, int(os.environ.get("DELIVERY_SEARCH_MAX_EXPANSIONS", "64")))
+# Bound on the weight combinations a multi-word query visits.
+SEARCH_MAX_COMBINATIONS = 1000
+# A prefix hit ranks below the same word typed in full.
+PREFIX_FACTOR = 0.7
+PRODUCT_FIELDS = (("name", 3.0), ("category", 1.5), ("description", 1.0))
+BUSINESS_FIELDS = (("name", 3.0), ("category", 1.5))
+STOPWORDS = frozenset(
+    "a al con de del el en la las lo los para por sin su un una y".split()
+)
+
+_WORD = re.compile(r"[a-z0-9]+")
+
+
+def tokenize(text: str) -> List[str]:
+    return [t for t in _WORD.findall(fold_text(text)) if t not in STOPWORDS]
+
+
+def query_terms(query: str) -> List[str]:
+    # Like tokenize, but the last word may be the start of a longer one
+    # ("al" -> "almojabana"), so it is kept when it is all there is.
+    words = _WORD.findall(fold_text(query))
+    terms = [w for w in words[:-1] if w not in STOPWORDS]
+    if words and (words[-1] not in STOPWORDS or not terms):
+        terms.append(words[-1])
+    return list(dict.fromkeys(terms))
+
+
+class SearchIndex:
+    # Inverted index: token -> {doc_id: weight}, where weight is the highest
+    # weight of the fields the token appears in. Documents are added, changed
+    # and removed one at a time; the sorted vocabulary serves prefix lookups
+    # and per-token postings sorted by weight are built on first use.
+
+    def __init__(self, fields: Sequence[Tuple[str, float]]):
+        self.fields = tuple(fields)
+        self._postings: Dict[str, Dict[Any, float]] = {}
+        self._docs: Dict[Any, Dict[str, float]] = {}
+        self._vocab: List[str] = []
+        self._ranked: Dict[str, List[Tuple[float, Any]]] = {}
+        self._buckets: Dict[str, Dict[float, Tuple[List[Any], Set[Any]]]] = {}
+
+    def __len__(self) -> int:
+        return len(self._docs)
+
+    def analyze(self, record: Any) -> Dict[str, float]:
+        tokens: Dict[str, float] = {}
+        for field, weight in self.fields:
+            value = getattr(record, field, None)
+            if not value:
+                continue
+            for token in tokenize(str(value)):
+                if tokens.get(token, 0.0) < weight:
+                    tokens[token] = weight
+        return tokens
+
+    def _set_vocab(self, token: str, present: bool) -> None:
+        i = bisect_left(self._vocab, token)
+        found = i < len(self._vocab) and self._vocab[i] == token
+        if present and not found:
+            self._vocab.insert(i, token)
+        elif not present and found:
+            del self._vocab[i]
+
+    def remove(self, doc_id: Any) -> None:
+        tokens = self._docs.pop(doc_id, None)
+        if not tokens:
+            return
+        for token in tokens:
+            posting = self._postings.get(token)
+            if posting is None:
+                continue
+            posting.pop(doc_id, None)
+            self._ranked.pop(token, None)
+            self._buckets.pop(token, None)
+            if not posting:
+                del self._postings[token]
+                self._set_vocab(token, False)
+
+    def upsert(self, doc_id: Any, record: Any) -> None:
+        tokens = self.analyze(record)
+        if self._docs.get(doc_id) == tokens:
+            return
+        self.remove(doc_id)
+        if not tokens:
+            return
+        self._docs[doc_id] = tokens
+        for token, weight in tokens.items():
+            posting = self._postings.get(token)
+            if posting is None:
+                posting = self._postings[token] = {}
+                self._set_vocab(token, True)
+            posting[doc_id] = weight
+            self._ranked.pop(token, None)
+            self._buckets.pop(token, None)
+
+    def _expand(self, term: str) -> List[str]:
+        # The exact token sorts first among those starting with term.
+        out = []
+        i = bisect_left(self._vocab, term)
+        while i < len(self._vocab) and len(out) < SEARCH_MAX_EXPANSIONS and self._vocab[i].startswith(term):
+            out.append(self._vocab[i])
+            i += 1
+        return out
+
+    def _idf(self, token: str) -> float:
+        return math.log(1.0 + len(self._docs) / len(self._postings[token]))
+
+    def _factor(self, term: str, token: str) -> float:
+        return self._idf(token) * (1.0 if token == term else PREFIX_FACTOR)
+
+    def _ranked_for(self, token: str) -> List[Tuple[float, Any]]:
+        ranked = self._ranked.get(token)
+        if ranked is None:
+            ranked = self._ranked[token] = sorted((-w, doc) for doc, w in self._postings[token].items())
+        return ranked
+
+    def search(self, query: str, limit: int = SEARCH_DEFAULT_LIMIT) -> List[Tuple[Any, float]]:
+        # Every query word must match a whole word or, typed partially, the
+        # start of one. Returns [(doc_id, score)] best first.
+        terms = query_terms(query)
+        if not terms or limit <= 0:
+            return []
+        expansions = {term: self._expand(term) for term in terms}
+        if not all(expansions.values()):
+            return []
+        if len(terms) == 1:
+            return self._search_one(terms[0], expansions[terms[0]], limit)
+
+        # Per term, a document scores the best weight x factor among the
+        # tokens it matches. Grouping each token's documents by weight gives a
+        # few (score, docs) options per term; option combinations are visited
+        # best first and their document sets intersected, so documents come
+        # out in score order without scoring every candidate.
+        options = []
+        for term in terms:
+            opts = [(w * self._factor(term, tok), docs)
+                    for tok in expansions[term] for w, docs in self._buckets_for(tok).items()]
+            opts.sort(key=lambda o: -o[0])
+            options.append(opts)
+        start = (0,) * len(options)
+        heap = [(-sum(opts[0][0] for opts in options), start)]
+        visited = {start}
+        out: List[Tuple[Any, float]] = []
+        seen: Set[Any] = set()
+        combos = 0
+        while heap and len(out) < limit and combos < SEARCH_MAX_COMBINATIONS:
+            neg, combo = heapq.heappop(heap)
+            combos += 1
+            for i, j in enumerate(combo):
+                if j + 1 < len(options[i]):
+                    nxt = combo[:i] + (j + 1,) + combo[i + 1:]
+                    if nxt not in visited:
+                        visited.add(nxt)
+                        heapq.heappush(heap, (neg + options[i][j][0] - options[i][j + 1][0], nxt))
+            buckets = sorted((options[i][j][1] for i, j in enumerate(combo)), key=lambda b: len(b[1]))
+            docs = buckets[0][1].intersection(*(b[1] for b in buckets[1:]))
+            if not docs:
+                continue
+            # Walk the smallest bucket in id order unless the match is small.
+            ordered = sorted(docs) if len(docs) <= 4 * limit else (d for d in buckets[0][0] if d in docs)
+            for doc in ordered:
+                if doc not in seen:
+                    seen.add(doc)
+                    out.append((doc, round(-neg, 4)))
+                    if len(out) >= limit:
+                        break
+        return out
+
+    def _buckets_for(self, token: str) -> Dict[float, Tuple[List[Any], Set[Any]]]:
+        # weight -> (doc ids in order, same ids as a set)
+        buckets = self._buckets.get(token)
+        if buckets is None:
+            grouped: Dict[float, Set[Any]] = {}
+            for doc, w in self._postings[token].items():
+                grouped.setdefault(w, set()).add(doc)
+            buckets = self._buckets[token] = {w: (sorted(docs), docs) for w, docs in grouped.items()}
+        return buckets
+
+    def _search_one(self, term: str, tokens: List[str], limit: int) -> List[Tuple[Any, float]]:
+        # Each token's postings are sorted by weight, so merging them scaled
+        # by the token's factor yields documents best first; the first limit
+        # distinct ones are the answer.
+        def scaled(token: str) -> Iterator[Tuple[float, Any]]:
+            f = self._factor(term, token)
+            return ((w * f, doc) for w, doc in self._ranked_for(token))
+
+        out: List[Tuple[Any, float]] = []
+        seen: Set[Any] = set()
+        for neg, doc in heapq.merge(*(scaled(tok) for tok in tokens)):
+            if doc in seen:
+                continue
+            seen.add(doc)
+            out.append((doc, round(-neg, 4)))
+            if len(out) >= limit:
+                break
+        return out
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "documents": len(self._docs),
+            "tokens": len(self._postings),
+            "postings": sum(len(p) for p in self._postings.values()),
+        }
+
+
+class _Source:
+    # One repository mirrored into a SearchIndex. When its data_version
+    # changes, sync() walks every record (an identity check per row, O(N)),
+    # and only records whose indexed text changed are re-tokenized.
+
+    def __init__(self, repo: Any, fields: Sequence[Tuple[str, float]], include=None):
+        self.repo = repo
+        self.index = SearchIndex(fields)
+        self.include = include
+        self.version: Any = None
+        self.records: Dict[Any, Any] = {}
+        self._texts: Dict[Any, tuple] = {}
+        self.syncs = 0
+        self.updated = 0
+
+    def sync(self) -> None:
+        version = self.repo.data_version()
+        if version == self.version:
+            return
+        seen = set()
+        for record in self.repo.find_all():
+            rid = record.id
+            if rid is None:
+                continue
+            if self.include is not None and not self.include(record):
+                continue
+            seen.add(rid)
+            if self.records.get(rid) is record:
+                continue
+            self.records[rid] = record
+            text = tuple(getattr(record, field, None) for field, _ in self.index.fields)
+            if self._texts.get(rid) == text:
+                continue
+            self._texts[rid] = text
+            self.index.upsert(rid, record)
+            self.updated += 1
+        for rid in [rid for rid in self.records if rid not in seen]:
+            del self.records[rid]
+            del self._texts[rid]
+            self.index.remove(rid)
+            self.updated += 1
+        self.version = version
+        self.syncs += 1
+
+
+class SearchService:
+    # Accent-insensitive search over products (name, description, category)
+    # and businesses (name, category), for type-ahead as well as full words.
+
+    def __init__(self, business_repo: Optional[BusinessRepository] = None,
+                 product_repo: Optional[ProductRepository] = None):
+        self._products = _Source(product_repo or product_repository(), PRODUCT_FIELDS,
+                                 include=lambda p: p.available)
+        self._businesses = _Source(business_repo or business_repository(), BUSINESS_FIELDS)
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _hits(source: _Source, query: str, limit: int) -> List[Dict[str, Any]]:
+        out = []
+        for rid, score in source.index.search(query, limit):
+            row = source.records[rid].to_dict()
+            row["score"] = score
+            out.append(row)
+        return out
+
+    def search(self, query: str, kind: Optional[str] = None, limit: int = SEARCH_DEFAULT_LIMIT) -> Dict[str, Any]:
+        if kind not in (None, "products", "businesses"):
+            raise ValueError("Tipo de busqueda invalido: use products o businesses")
+        if limit < 1 or limit > SEARCH_MAX_LIMIT:
+            raise ValueError(f"limit debe estar entre 1 y {SEARCH_MAX_LIMIT}")
+        result: Dict[str, Any] = {"query": query}
+        with self._lock:
+            if kind in (None, "products"):
+                self._products.sync()
+                result["products"] = self._hits(self._products, query, limit)
+            if kind in (None, "businesses"):
+                self._businesses.sync()
+                result["businesses"] = self._hits(self._businesses, query, limit)
+        return result
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                name: {**source.index.stats(), "syncs": source.syncs, "updated": source.updated}
+                for name, source in (("products", self._products), ("businesses", self._businesses))
+            }
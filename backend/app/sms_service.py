@@ -1,4 +1,4 @@
-import os
+from app.outbox import TwilioTransport, get_outbox, register_handler
 
 TO_PHONE = "+573022641006"
 MENSAJE_PAGO_OK = (
@@ -7,21 +7,18 @@ MENSAJE_PAGO_OK = (
 
 
 def send_order_sms() -> bool:
-    sid = os.environ.get("TWILIO_ACCOUNT_SID", "").strip()
-    token = os.environ.get("TWILIO_AUTH_TOKEN", "").strip()
-    from_phone = os.environ.get("TWILIO_PHONE", "").strip()
-
-    if not sid or not token or not from_phone:
-        return False
-
     try:
-        from twilio.rest import Client
-        client = Client(sid, token)
-        client.messages.create(
-            body=MENSAJE_PAGO_OK,
-            from_=from_phone,
-            to=TO_PHONE,
-        )
-        return True
+        return TwilioTransport().send(TO_PHONE, MENSAJE_PAGO_OK)
     except Exception:
         return False
+
+
+def enqueue_order_sms(order_id: int = 0) -> str:
+    return get_outbox().enqueue("payment_ok", {"order_id": order_id, "to": TO_PHONE})
+
+
+def _deliver_order_sms(msg: dict, transport) -> None:
+    transport.send(msg["payload"].get("to") or TO_PHONE, MENSAJE_PAGO_OK)
+
+
+register_handler("payment_ok", _deliver_order_sms)
@@ -2,12 +2,31 @@ import json
 import math
 import os
 import sys
+import tempfile
+import time
+import unicodedata
+from contextlib import contextmanager
 from datetime import datetime
 from pathlib import Path
-from typing import List, Dict
+from typing import List, Dict, Optional, Sequence, Tuple
+
+from app import metrics
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
 
 _PROJECT_ROOT = Path(__file__).resolve().parent.parent.parent
-DATA_DIR = str(_PROJECT_ROOT / "data")
+DATA_DIR = os.environ.get("DELIVERY_DATA_DIR", "").strip() or str(_PROJECT_ROOT / "data")
+EARTH_RADIUS_KM = 6371
+# Below this many pairs building the arrays costs more than the plain loop.
+VECTORIZE_MIN_PAIRS = 32
 
 
 def safe_print(*args, **kwargs):
@@ -26,22 +45,150 @@ def load_json(file_name: str) -> List[Dict]:
     file_path = os.path.join(DATA_DIR, file_name)
     if os.path.exists(file_path):
         try:
+            t0 = time.perf_counter()
             with open(file_path, "r", encoding="utf-8") as f:
-                return json.load(f)
+                data = json.load(f)
+                size = os.fstat(f.fileno()).st_size
+            metrics.observe_load(file_name, time.perf_counter() - t0, size)
+            return data
         except (json.JSONDecodeError, IOError):
             return []
     return []
 
 
+def json_default(obj):
+    # json.dumps(default=...) hook: models (app.models) are written through
+    # their to_dict(), so they only turn into dicts while being serialized.
+    to_dict = getattr(obj, "to_dict", None)
+    if to_dict is None:
+        raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+    return to_dict()
+
+
+_encode_record = json.JSONEncoder(ensure_ascii=False, default=json_default).encode
+
+
+def dump_records(records: Sequence) -> str:
+    # A JSON array with one compact record per line (the layout
+    # JsonArrayWriter writes). indent=2 sends json.dumps through the
+    # pure-Python encoder; this stays in the C one and is several times
+    # faster on large files.
+    if not records:
+        return "[]\n"
+    return "[\n" + ",\n".join([_encode_record(r) for r in records]) + "\n]\n"
+
+
 def save_json(file_name: str, data: List[Dict]) -> None:
     file_path = os.path.join(DATA_DIR, file_name)
     os.makedirs(DATA_DIR, exist_ok=True)
-    with open(file_path, "w", encoding="utf-8") as f:
-        json.dump(data, f, indent=2, ensure_ascii=False)
+    write_text_atomic(file_path, dump_records(data))
+
+
+def file_stamp(file_path: str) -> Optional[Tuple[int, int]]:
+    try:
+        st = os.stat(file_path)
+    except OSError:
+        return None
+    return (st.st_mtime_ns, st.st_size)
+
+
+def _open_temp(file_path: str):
+    # A uniquely named file next to file_path, so concurrent writers of the
+    # same file never share (and clobber) a temporary.
+    fd, tmp_path = tempfile.mkstemp(prefix=os.path.basename(file_path) + ".", suffix=".tmp",
+                                    dir=os.path.dirname(file_path) or ".")
+    # mkstemp creates 0600; keep the mode the file already had.
+    try:
+        mode = os.stat(file_path).st_mode & 0o777
+    except FileNotFoundError:
+        mode = 0o644
+    os.chmod(tmp_path, mode)
+    return os.fdopen(fd, "w", encoding="utf-8"), tmp_path
+
+
+def write_temp(file_path: str, text: str) -> str:
+    # Writes and fsyncs text to a temporary beside file_path and returns its
+    # path; the caller renames it over file_path (or removes it).
+    t0 = time.perf_counter()
+    f, tmp_path = _open_temp(file_path)
+    try:
+        with f:
+            f.write(text)
+            f.flush()
+            os.fsync(f.fileno())
+            size = os.fstat(f.fileno()).st_size
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+    metrics.observe_save(os.path.basename(file_path), "snapshot", time.perf_counter() - t0, size)
+    return tmp_path
+
+
+def write_text_atomic(file_path: str, text: str) -> None:
+    os.replace(write_temp(file_path, text), file_path)
+
+
+@contextmanager
+def file_lock(lock_path: str):
+    # Exclusive flock on lock_path, to coordinate worker processes; a no-op
+    # where fcntl is missing (Windows runs a single worker). flock locks
+    # are per open file, so a process must not nest two on the same path.
+    if fcntl is None:
+        yield
+        return
+    os.makedirs(os.path.dirname(lock_path) or ".", exist_ok=True)
+    with open(lock_path, "a") as fh:
+        fcntl.flock(fh, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(fh, fcntl.LOCK_UN)
+
+
+class JsonArrayWriter:
+    # Writes a JSON array one record per line, for files too large to build
+    # as one list; like write_text_atomic, the file replaces file_path only
+    # once it is complete.
+
+    def __init__(self, file_path: str):
+        self.file_path = file_path
+        self._f, self._tmp_path = _open_temp(file_path)
+        self._f.write("[")
+        self.count = 0
+
+    def write(self, record: Dict) -> None:
+        self._f.write(",\n" if self.count else "\n")
+        self._f.write(_encode_record(record))
+        self.count += 1
+
+    def close(self) -> None:
+        self._f.write("\n]\n" if self.count else "]\n")
+        self._f.flush()
+        os.fsync(self._f.fileno())
+        size = os.fstat(self._f.fileno()).st_size
+        self._f.close()
+        os.replace(self._tmp_path, self.file_path)
+        metrics.observe_save(os.path.basename(self.file_path), "snapshot", None, size)
+
+    def abort(self) -> None:
+        self._f.close()
+        try:
+            os.remove(self._tmp_path)
+        except FileNotFoundError:
+            pass
+
+    def __enter__(self) -> "JsonArrayWriter":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
 
 
 def calculate_distance(lat1: float, lng1: float, lat2: float, lng2: float) -> float:
-    R = 6371
+    R = EARTH_RADIUS_KM
     dlat = math.radians(lat2 - lat1)
     dlng = math.radians(lng2 - lng1)
     a = (
@@ -52,6 +199,39 @@ def calculate_distance(lat1: float, lng1: float, lat2: float, lng2: float) -> fl
     return R * c
 
 
+def calculate_distances(lat: float, lng: float, points: Sequence[Tuple[float, float]]) -> List[float]:
+    # One-to-many haversine: distance in km from (lat, lng) to each (lat, lng)
+    # in points, in order.
+    if np is not None and len(points) >= VECTORIZE_MIN_PAIRS:
+        return calculate_distance_matrix([(lat, lng)], points)[0]
+    return [calculate_distance(lat, lng, plat, plng) for plat, plng in points]
+
+
+def calculate_distance_matrix(origins: Sequence[Tuple[float, float]],
+                              destinations: Sequence[Tuple[float, float]]) -> List[List[float]]:
+    # Many-to-many haversine: row i holds the distances in km from origins[i]
+    # to every destination.
+    if not origins:
+        return []
+    if not destinations:
+        return [[] for _ in origins]
+    if np is None or len(origins) * len(destinations) < VECTORIZE_MIN_PAIRS:
+        return [calculate_distances(lat, lng, destinations) for lat, lng in origins]
+    o = np.radians(np.asarray(origins, dtype=np.float64))
+    d = np.radians(np.asarray(destinations, dtype=np.float64))
+    olat, olng = o[:, 0:1], o[:, 1:2]
+    dlat, dlng = d[:, 0], d[:, 1]
+    a = np.sin((dlat - olat) / 2) ** 2 + np.cos(olat) * np.cos(dlat) * np.sin((dlng - olng) / 2) ** 2
+    km = 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+    return km.tolist()
+
+
+def fold_text(text: str) -> str:
+    # Lowercase without accents: "Almojábana" -> "almojabana". ñ folds to n.
+    decomposed = unicodedata.normalize("NFKD", text.casefold())
+    return "".join(ch for ch in decomposed if not unicodedata.combining(ch))
+
+
 def get_current_timestamp() -> str:
     return datetime.now().isoformat()
 
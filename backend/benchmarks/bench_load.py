@@ -0,0 +1,435 @@
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+_BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, _BACKEND)
+
+# The app reads its DELIVERY_* settings at import time, so it is imported
+# only once the data is seeded and --storage is known.
+_TMP_DATA = tempfile.mkdtemp(prefix="parcerogo-load-")
+os.environ["DELIVERY_DATA_DIR"] = _TMP_DATA
+os.environ.setdefault("DELIVERY_SMS_TRANSPORT", "stub")
+os.environ.setdefault("DELIVERY_ARCHIVE_AFTER_DAYS", "0")
+
+# (action, route label, weight): a browsing-heavy mix with the full order
+# lifecycle behind it. Actions whose precondition is not met (nothing to pay
+# yet, courier busy) place an order instead.
+MIX = [
+    ("businesses", "GET /api/delivery/businesses", 8),
+    ("nearby", "GET /api/delivery/businesses/nearby", 5),
+    ("business_products", "GET /api/delivery/businesses/{id}/products", 14),
+    ("products", "GET /api/delivery/products", 4),
+    ("search", "GET /api/delivery/search", 6),
+    ("create_order", "POST /api/delivery/orders", 8),
+    ("pay", "POST /api/payments/process", 5),
+    ("prepare", "PATCH /api/delivery/orders/{id}/status", 5),
+    ("assign", "POST /api/couriers/{id}/assign-order/{order_id}", 4),
+    ("complete", "POST /api/couriers/{id}/complete-order/{order_id}", 4),
+    ("location", "POST /api/couriers/{id}/location", 8),
+    ("track_order", "GET /api/delivery/orders/{id}", 18),
+    ("track_courier", "GET /api/couriers/{id}/track", 4),
+    ("by_phone", "GET /api/delivery/orders/by-phone/{phone}", 4),
+    ("list_orders", "GET /api/delivery/orders", 3),
+]
+LABELS = {action: label for action, label, _ in MIX}
+SEARCHES = ["pan", "pizza", "cafe", "arroz", "empanadas", "bandeja paisa", "acetamin", "leche", "hambur"]
+# Share of repeat catalog requests that revalidate with If-None-Match.
+REVALIDATE_SHARE = 0.5
+
+
+def _seed(directory: str, businesses: int, products_per_business: int, couriers: int, orders: int,
+          seed: int) -> dict:
+    # Writes the synthetic dataset (one courier per client, all of them free)
+    # and returns what the simulated clients need to build valid requests.
+    from app.data_generator import BUSINESS_NAMES, MEDELLIN_LOCATIONS, SyntheticData
+    from app.utils import JsonArrayWriter
+    from init_data import write_dataset
+
+    data = SyntheticData(seed=seed, businesses=businesses, products_per_business=products_per_business,
+                         couriers=couriers, orders=orders)
+    with contextlib.redirect_stdout(sys.stderr):
+        write_dataset(data, "json", directory)
+    fleet = [{**c, "available": True} for c in data.couriers()]
+    with JsonArrayWriter(os.path.join(directory, "couriers.json")) as out:
+        for courier in fleet:
+            out.write(courier)
+    catalog = {}
+    for product in data.products():
+        if product["available"]:
+            catalog.setdefault(product["business_id"], []).append(product)
+    rng = random.Random(seed)
+    return {
+        "businesses": businesses,
+        "catalog": catalog,
+        "couriers": fleet,
+        "phones": [data.customer(rng.randrange(data.customers))["phone"] for _ in range(max(1, couriers))],
+        "locations": MEDELLIN_LOCATIONS,
+        "categories": sorted({category for _, category in BUSINESS_NAMES}),
+        "products": businesses * products_per_business,
+        "orders": orders,
+    }
+
+
+def _percentile(values: list, p: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))]
+
+
+class _Recorder:
+
+    def __init__(self):
+        self.enabled = False
+        self.samples = {}
+        self.errors = {}
+
+    def add(self, label: str, ms: float, status: int) -> None:
+        if not self.enabled:
+            return
+        self.samples.setdefault(label, []).append(ms)
+        if status >= 400:
+            self.errors[label] = self.errors.get(label, 0) + 1
+
+    def report(self, seconds: float) -> dict:
+        routes = {}
+        for label in sorted(self.samples, key=lambda l: -len(self.samples[l])):
+            s = self.samples[label]
+            routes[label] = {
+                "requests": len(s),
+                "errors": self.errors.get(label, 0),
+                "rps": round(len(s) / seconds, 1),
+                "p50_ms": round(_percentile(s, 0.5), 3),
+                "p95_ms": round(_percentile(s, 0.95), 3),
+                "p99_ms": round(_percentile(s, 0.99), 3),
+                "max_ms": round(max(s), 3),
+            }
+        total = sum(len(s) for s in self.samples.values())
+        return {
+            "seconds": round(seconds, 2),
+            "requests": total,
+            "errors": sum(self.errors.values()),
+            "throughput_rps": round(total / seconds, 1),
+            "routes": routes,
+        }
+
+
+class _Client:
+    # One simulated user at a time: browses, orders, pays and tracks its
+    # orders, and doubles as the courier it owns (one delivery in flight).
+
+    def __init__(self, http, recorder: _Recorder, world: dict, courier: dict, rng: random.Random):
+        self.http = http
+        self.recorder = recorder
+        self.world = world
+        self.courier = courier
+        self.rng = rng
+        self.phone = rng.choice(world["phones"])
+        self.etags = {}
+        self.unpaid = []
+        self.pending = []
+        self.delivering = None
+        self.recent = []
+
+    async def _send(self, action: str, method: str, url: str, **kwargs):
+        t0 = time.perf_counter()
+        r = await self.http.request(method, url, **kwargs)
+        self.recorder.add(LABELS[action], (time.perf_counter() - t0) * 1000, r.status_code)
+        return r
+
+    async def _catalog(self, action: str, url: str) -> None:
+        headers = {}
+        if url in self.etags and self.rng.random() < REVALIDATE_SHARE:
+            headers["If-None-Match"] = self.etags[url]
+        r = await self._send(action, "GET", url, headers=headers)
+        if r.headers.get("etag"):
+            self.etags[url] = r.headers["etag"]
+
+    def _remember(self, order_id: int) -> None:
+        self.recent.append(order_id)
+        del self.recent[:-20]
+
+    async def step(self) -> None:
+        action = self.rng.choices(_ACTIONS, _WEIGHTS)[0]
+        if action == "pay" and not self.unpaid or action == "prepare" and not self.pending \
+                or action == "assign" and (self.delivering or not self.pending) \
+                or action == "complete" and not self.delivering or action == "track_order" and not self.recent:
+            action = "create_order"
+        await getattr(self, "_" + action)()
+
+    async def _businesses(self):
+        await self._catalog("businesses", "/api/delivery/businesses")
+
+    async def _nearby(self):
+        loc = self.rng.choice(self.world["locations"])
+        await self._send("nearby", "GET", "/api/delivery/businesses/nearby", params={
+            "lat": round(loc["lat"] + self.rng.uniform(-0.01, 0.01), 6),
+            "lng": round(loc["lng"] + self.rng.uniform(-0.01, 0.01), 6),
+            "offset": self.rng.choice([0, 0, 0, 20]),
+        })
+
+    async def _business_products(self):
+        business_id = self.rng.randint(1, self.world["businesses"])
+        await self._catalog("business_products", f"/api/delivery/businesses/{business_id}/products")
+
+    async def _products(self):
+        category = self.rng.choice(self.world["categories"])
+        await self._catalog("products", f"/api/delivery/products?category={category}")
+
+    async def _search(self):
+        query = self.rng.choice(SEARCHES)
+        # Type-ahead: a prefix of the query as often as the whole of it.
+        if self.rng.random() < 0.5:
+            query = query[:self.rng.randint(2, len(query))]
+        await self._send("search", "GET", "/api/delivery/search", params={"q": query, "limit": 10})
+
+    async def _create_order(self):
+        business_id = self.rng.choice(list(self.world["catalog"]))
+        products = self.rng.sample(self.world["catalog"][business_id],
+                                   min(len(self.world["catalog"][business_id]), self.rng.randint(1, 3)))
+        loc = self.rng.choice(self.world["locations"])
+        r = await self._send("create_order", "POST", "/api/delivery/orders", json={
+            "business_id": business_id,
+            "products": [{"product_id": p["id"], "quantity": self.rng.randint(1, 3)} for p in products],
+            "customer_name": "Cliente Carga",
+            "customer_phone": self.phone,
+            "customer_address": f"Carrera {self.rng.randint(1, 80)} #{self.rng.randint(1, 99)}-10, {loc['name']}",
+            "customer_lat": round(loc["lat"] + self.rng.uniform(-0.01, 0.01), 6),
+            "customer_lng": round(loc["lng"] + self.rng.uniform(-0.01, 0.01), 6),
+            "payment_method": self.rng.choice(["efectivo", "tarjeta"]),
+            "tip_amount": self.rng.choice([0, 0, 1000, 2000]),
+        })
+        if r.status_code == 200:
+            order_id = r.json()["order"]["id"]
+            self.unpaid.append(order_id)
+            self.pending.append(order_id)
+            self._remember(order_id)
+
+    async def _pay(self):
+        order_id = self.unpaid.pop(0)
+        await self._send("pay", "POST", "/api/payments/process", json={
+            "order_id": order_id, "payment_method": "tarjeta", "card_number": "4111111111111111",
+            "card_holder": "Cliente Carga", "cvv": "123",
+        })
+
+    async def _prepare(self):
+        order_id = self.rng.choice(self.pending)
+        await self._send("prepare", "PATCH", f"/api/delivery/orders/{order_id}/status", json={"status": "preparando"})
+
+    async def _assign(self):
+        order_id = self.pending.pop(0)
+        r = await self._send("assign", "POST", f"/api/couriers/{self.courier['id']}/assign-order/{order_id}")
+        if r.status_code == 200:
+            self.delivering = order_id
+
+    async def _complete(self):
+        order_id, self.delivering = self.delivering, None
+        await self._send("complete", "POST", f"/api/couriers/{self.courier['id']}/complete-order/{order_id}")
+
+    async def _location(self):
+        c = self.courier
+        c["lat"] = round(c["lat"] + self.rng.uniform(-0.0005, 0.0005), 6)
+        c["lng"] = round(c["lng"] + self.rng.uniform(-0.0005, 0.0005), 6)
+        await self._send("location", "POST", f"/api/couriers/{c['id']}/location", json={"lat": c["lat"], "lng": c["lng"]})
+
+    async def _track_order(self):
+        await self._send("track_order", "GET", f"/api/delivery/orders/{self.rng.choice(self.recent)}")
+
+    async def _track_courier(self):
+        await self._send("track_courier", "GET", f"/api/couriers/{self.courier['id']}/track", params={"limit": 20})
+
+    async def _by_phone(self):
+        await self._send("by_phone", "GET", f"/api/delivery/orders/by-phone/{self.phone}", params={"limit": 20})
+
+    async def _list_orders(self):
+        status = self.rng.choice(["pendiente", "preparando", "en_camino"])
+        await self._send("list_orders", "GET", "/api/delivery/orders",
+                         params={"status": status, "limit": 20, "fields": "id,status,created_at,business_name"})
+
+
+_ACTIONS = [action for action, _, _ in MIX]
+_WEIGHTS = [weight for _, _, weight in MIX]
+
+
+async def _drive(http, world: dict, concurrency: int, duration: float, warmup: float, seed: int) -> dict:
+    recorder = _Recorder()
+    clients = [_Client(http, recorder, world, world["couriers"][i], random.Random(seed * 1000 + i))
+               for i in range(concurrency)]
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + warmup + duration
+
+    async def worker(client: _Client):
+        while loop.time() < deadline:
+            await client.step()
+
+    tasks = [asyncio.create_task(worker(c)) for c in clients]
+    await asyncio.sleep(warmup)
+    recorder.enabled = True
+    t0 = time.perf_counter()
+    await asyncio.gather(*tasks)
+    return {"concurrency": concurrency, **recorder.report(time.perf_counter() - t0)}
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+async def _run_asgi(app, world: dict, levels: list, duration: float, warmup: float, seed: int) -> list:
+    import httpx
+
+    async with app.router.lifespan_context(app):
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://parcerogo") as http:
+            return [await _drive(http, world, n, duration, warmup, seed) for n in levels]
+
+
+def _run_socket(app, world: dict, levels: list, duration: float, warmup: float, seed: int) -> list:
+    # uvicorn serves from its own thread and event loop, so the clients
+    # below do not share a loop with the app.
+    import httpx
+    import uvicorn
+
+    port = _free_port()
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning", access_log=False))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    for _ in range(200):
+        if server.started:
+            break
+        time.sleep(0.05)
+    else:
+        raise RuntimeError("El servidor no arrancó")
+
+    async def drive():
+        limits = httpx.Limits(max_connections=max(levels), max_keepalive_connections=max(levels))
+        async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", limits=limits) as http:
+            return [await _drive(http, world, n, duration, warmup, seed) for n in levels]
+
+    try:
+        return asyncio.run(drive())
+    finally:
+        server.should_exit = True
+        thread.join(timeout=10)
+
+
+def _commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=_BACKEND, capture_output=True,
+                              text=True, timeout=5).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def run(mode: str, storage: str, businesses: int, products_per_business: int, orders: int, levels: list,
+        duration: float, warmup: float, seed: int) -> dict:
+    os.environ["DELIVERY_STORAGE"] = storage
+    try:
+        world = _seed(_TMP_DATA, businesses, products_per_business, max(levels), orders, seed)
+        if storage == "sqlite":
+            import migrate_sqlite
+            migrate_sqlite.migrate(os.path.join(_TMP_DATA, "parcerogo.db"))
+        from app.main import app
+
+        if mode == "socket":
+            runs = _run_socket(app, world, levels, duration, warmup, seed)
+        else:
+            runs = asyncio.run(_run_asgi(app, world, levels, duration, warmup, seed))
+    finally:
+        shutil.rmtree(_TMP_DATA, ignore_errors=True)
+    return {
+        "commit": _commit(),
+        "mode": mode,
+        "storage": storage,
+        "data": {"businesses": businesses, "products": world["products"], "couriers": len(world["couriers"]),
+                 "orders": world["orders"]},
+        "duration_s": duration,
+        "warmup_s": warmup,
+        "seed": seed,
+        "runs": runs,
+    }
+
+
+def compare(result: dict, baseline: dict) -> dict:
+    # Ratios against a previous --json result for the same concurrency
+    # levels: above 1 means slower (latency) or faster (throughput).
+    def ratio(a, b):
+        return round(a / b, 3) if b else None
+
+    old = {r["concurrency"]: r for r in baseline.get("runs", [])}
+    out = []
+    for r in result["runs"]:
+        b = old.get(r["concurrency"])
+        if b is None:
+            continue
+        out.append({
+            "concurrency": r["concurrency"],
+            "throughput_ratio": ratio(r["throughput_rps"], b["throughput_rps"]),
+            "routes": {
+                label: {p: ratio(s[p], b["routes"][label][p]) for p in ("p50_ms", "p95_ms", "p99_ms")}
+                for label, s in r["routes"].items() if label in b["routes"]
+            },
+        })
+    return {"commit": baseline.get("commit"), "runs": out}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Carga HTTP con trafico realista de pedidos en Medellin")
+    parser.add_argument("--mode", choices=["asgi", "socket"], default="asgi",
+                        help="asgi: en el mismo proceso; socket: uvicorn en 127.0.0.1")
+    parser.add_argument("--storage", choices=["json", "sqlite"], default="json")
+    parser.add_argument("--businesses", type=int, default=200)
+    parser.add_argument("--products-per-business", type=int, default=12)
+    parser.add_argument("--orders", type=int, default=5000)
+    parser.add_argument("--concurrency", default="1,8,32")
+    parser.add_argument("--duration", type=float, default=10.0, help="segundos medidos por nivel")
+    parser.add_argument("--warmup", type=float, default=2.0)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--baseline", help="resultado --json anterior para comparar")
+    parser.add_argument("--output", help="guarda el resultado JSON en este archivo")
+    parser.add_argument("--json", action="store_true")
+    args = parser.parse_args()
+    levels = [int(n) for n in args.concurrency.split(",")]
+    # The app logs to stdout; keep it off the report.
+    with contextlib.redirect_stdout(sys.stderr):
+        result = run(args.mode, args.storage, args.businesses, args.products_per_business, args.orders, levels,
+                     args.duration, args.warmup, args.seed)
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            result["baseline"] = compare(result, json.load(f))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(result, f, indent=2, ensure_ascii=False)
+    if args.json:
+        print(json.dumps(result, indent=2, ensure_ascii=False))
+        return
+    data = result["data"]
+    print(f"{result['mode']}/{result['storage']} @ {result['commit']}: {data['businesses']} negocios, "
+          f"{data['products']} productos, {data['couriers']} repartidores, {data['orders']} pedidos")
+    ratios = {r["concurrency"]: r for r in result.get("baseline", {}).get("runs", [])}
+    for r in result["runs"]:
+        base = ratios.get(r["concurrency"])
+        extra = f" (x{base['throughput_ratio']} vs {result['baseline']['commit']})" if base else ""
+        print(f"\nconcurrencia {r['concurrency']}: {r['throughput_rps']} req/s{extra}, "
+              f"{r['requests']} solicitudes, {r['errors']} errores")
+        print(f"{'ruta':>52}  {'req/s':>7}  {'p50 (ms)':>9}  {'p95 (ms)':>9}  {'p99 (ms)':>9}  {'errores':>7}"
+              + (f"  {'p95 vs base':>11}" if base else ""))
+        for label, s in r["routes"].items():
+            line = (f"{label:>52}  {s['rps']:>7}  {s['p50_ms']:>9}  {s['p95_ms']:>9}  {s['p99_ms']:>9}  "
+                    f"{s['errors']:>7}")
+            if base and label in base["routes"]:
+                line += f"  {base['routes'][label]['p95_ms']:>11}"
+            print(line)
+
+
+if __name__ == "__main__":
+    main()
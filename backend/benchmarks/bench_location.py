@@ -0,0 +1,91 @@
+import argparse
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+_BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, _BACKEND)
+
+# The repositories read DELIVERY_DATA_DIR at import time.
+_TMP_DATA = tempfile.mkdtemp(prefix="parcerogo-loc-")
+os.environ["DELIVERY_DATA_DIR"] = _TMP_DATA
+
+from app.data_generator import MEDELLIN_LOCATIONS
+from app.repositories.courier_repository import CourierRepository
+from app.services.location_service import LocationTracker
+
+
+def _seed(n: int, rng: random.Random) -> list:
+    couriers = []
+    for i in range(n):
+        loc = rng.choice(MEDELLIN_LOCATIONS)
+        couriers.append({
+            "id": i + 1,
+            "name": f"Repartidor {i + 1}",
+            "phone": f"+57 300 {1000000 + i}",
+            "lat": loc["lat"] + rng.uniform(-0.05, 0.05),
+            "lng": loc["lng"] + rng.uniform(-0.05, 0.05),
+            "available": rng.random() < 0.7,
+        })
+    with open(os.path.join(_TMP_DATA, "couriers.json"), "w", encoding="utf-8") as f:
+        json.dump(couriers, f)
+    return couriers
+
+
+def run(couriers: int, pings: int, batch: int, seed: int) -> dict:
+    rng = random.Random(seed)
+    fleet = _seed(couriers, rng)
+    repo = CourierRepository()
+    tracker = LocationTracker(repo, snapshot_seconds=3600)
+    fixes = []
+    for i in range(pings):
+        c = rng.choice(fleet)
+        fixes.append({
+            "courier_id": c["id"],
+            "lat": c["lat"] + rng.uniform(-0.002, 0.002),
+            "lng": c["lng"] + rng.uniform(-0.002, 0.002),
+            "timestamp": 1_700_000_000 + i * 0.001,
+        })
+    t0 = time.perf_counter()
+    for i in range(0, len(fixes), batch):
+        tracker.ingest(fixes[i:i + batch])
+    ingest_s = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    saved = tracker.snapshot()
+    snapshot_s = time.perf_counter() - t0
+    return {
+        "couriers": couriers,
+        "pings": pings,
+        "batch": batch,
+        "pings_per_second": round(pings / ingest_s),
+        "snapshot_couriers": saved,
+        "snapshot_ms": round(snapshot_s * 1000, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Ingesta de posiciones GPS en memoria")
+    parser.add_argument("--couriers", type=int, default=5000)
+    parser.add_argument("--pings", type=int, default=100000)
+    parser.add_argument("--batches", default="1,50,500")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--json", action="store_true")
+    args = parser.parse_args()
+    try:
+        results = [run(args.couriers, args.pings, int(b), args.seed) for b in args.batches.split(",")]
+    finally:
+        shutil.rmtree(_TMP_DATA, ignore_errors=True)
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    print(f"{'lote':>6}  {'pings/s':>10}  {'snapshot (ms)':>14}")
+    for r in results:
+        print(f"{r['batch']:>6}  {r['pings_per_second']:>10}  {r['snapshot_ms']:>14}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+import argparse
+import gc
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.data_generator import SyntheticData
+from app.models import Order
+from app.utils import dump_records
+
+
+def _allocated(build):
+    # Bytes still held by what build() returns, as tracemalloc sees them.
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    value = build()
+    gc.collect()
+    size = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    return value, size
+
+
+def _best_ms(fn, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    return best * 1000
+
+
+def _read_dicts(rows):
+    total = 0.0
+    for o in rows:
+        if o["status"] != "cancelado" and o["payment_status"] == "completado":
+            total += o["total"] + o["customer_lat"] + o["business_lng"]
+    return total
+
+
+def _read_models(rows):
+    total = 0.0
+    for o in rows:
+        if o.status != "cancelado" and o.payment_status == "completado":
+            total += o.total + o.customer_lat + o.business_lng
+    return total
+
+
+def run(orders: int, repeat: int, seed: int) -> dict:
+    # The file is built once; both layouts are then parsed from the same
+    # text, as the repositories do when they load it.
+    text = dump_records(list(SyntheticData(seed=seed, orders=orders).orders()))
+    dicts, dict_bytes = _allocated(lambda: json.loads(text))
+    t0 = time.perf_counter()
+    models = [Order.from_dict(d) for d in dicts]
+    from_dict_s = time.perf_counter() - t0
+    del models
+    models, model_bytes = _allocated(lambda: [Order.from_dict(d) for d in json.loads(text)])
+    assert _read_dicts(dicts) == _read_models(models)
+    result = {
+        "orders": orders,
+        "file_mb": round(len(text.encode("utf-8")) / 1e6, 1),
+        "dict_bytes_per_order": round(dict_bytes / orders),
+        "model_bytes_per_order": round(model_bytes / orders),
+        "memory_saved_pct": round(100 * (1 - model_bytes / dict_bytes), 1),
+        "read_dict_ms": round(_best_ms(lambda: _read_dicts(dicts), repeat), 2),
+        "read_model_ms": round(_best_ms(lambda: _read_models(models), repeat), 2),
+        "from_dict_s": round(from_dict_s, 2),
+        "to_dict_s": round(_best_ms(lambda: [o.to_dict() for o in models], 1) / 1000, 2),
+        "dump_dicts_s": round(_best_ms(lambda: dump_records(dicts), 1) / 1000, 2),
+        "dump_models_s": round(_best_ms(lambda: dump_records(models), 1) / 1000, 2),
+        "dump_indent_dicts_s": round(_best_ms(lambda: json.dumps(dicts, indent=2, ensure_ascii=False), 1) / 1000, 2),
+    }
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Memoria y acceso: pedidos como dicts vs. modelos con __slots__")
+    parser.add_argument("--orders", type=int, default=100000, help="con 1000000 hacen falta unos 24 GB de RAM")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--json", action="store_true")
+    args = parser.parse_args()
+    result = run(args.orders, args.repeat, args.seed)
+    if args.json:
+        print(json.dumps(result, indent=2))
+        return
+    print(f"{result['orders']} pedidos ({result['file_mb']} MB en JSON)")
+    print(f"{'':>22} {'dict':>10} {'modelo':>10}")
+    print(f"{'bytes por pedido':>22} {result['dict_bytes_per_order']:>10} {result['model_bytes_per_order']:>10}"
+          f"  ({result['memory_saved_pct']}% menos)")
+    print(f"{'lectura de campos (ms)':>22} {result['read_dict_ms']:>10} {result['read_model_ms']:>10}")
+    print(f"{'volcado JSON (s)':>22} {result['dump_dicts_s']:>10} {result['dump_models_s']:>10}"
+          f"  (indent=2 con dicts: {result['dump_indent_dicts_s']} s)")
+    print(f"from_dict {result['from_dict_s']} s, to_dict {result['to_dict_s']} s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from dataclasses import replace
+
+from app.data_generator import PRODUCTS_BY_CATEGORY
+from app.models import Product
+from app.services.search_service import PRODUCT_FIELDS, SearchIndex
+
+QUERIES = ["a", "al", "almo", "almojabana", "pan", "pan q", "leche entera", "cafe", "empanada carne", "zzz"]
+
+
+def _products(n: int, rng: random.Random) -> list:
+    templates = [(cat, t) for cat, items in PRODUCTS_BY_CATEGORY.items() for t in items]
+    out = []
+    for i in range(n):
+        cat, t = rng.choice(templates)
+        # A suffix per product keeps the vocabulary realistic in size.
+        out.append(Product(
+            id=i + 1,
+            business_id=1,
+            name=f"{t['name']} {rng.choice(['', 'Casera', 'Premium', 'Familiar', 'Mini'])}".strip(),
+            price=t["price"],
+            description=f"{t['description']} ref{rng.randrange(n // 10 or 1)}",
+            category=cat,
+        ))
+    return out
+
+
+def _percentile(values: list, p: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))]
+
+
+def run(products: int, repeat: int, seed: int) -> dict:
+    rng = random.Random(seed)
+    catalog = _products(products, rng)
+    index = SearchIndex(PRODUCT_FIELDS)
+    t0 = time.perf_counter()
+    for p in catalog:
+        index.upsert(p.id, p)
+    build_s = time.perf_counter() - t0
+    for q in QUERIES:
+        index.search(q)
+    timings = {}
+    for q in QUERIES:
+        samples = []
+        for _ in range(repeat):
+            t0 = time.perf_counter()
+            index.search(q)
+            samples.append((time.perf_counter() - t0) * 1000)
+        timings[q] = {"p50_ms": round(_percentile(samples, 0.5), 4), "p99_ms": round(_percentile(samples, 0.99), 4)}
+    t0 = time.perf_counter()
+    for p in catalog[:1000]:
+        index.upsert(p.id, replace(p, name=p.name + " Nuevo"))
+    update_ms = (time.perf_counter() - t0) * 1000 / 1000
+    return {
+        "products": products,
+        "build_s": round(build_s, 2),
+        "update_ms": round(update_ms, 4),
+        "index": index.stats(),
+        "queries": timings,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Busqueda de productos con indice invertido")
+    parser.add_argument("--products", type=int, default=100000)
+    parser.add_argument("--repeat", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--json", action="store_true")
+    args = parser.parse_args()
+    result = run(args.products, args.repeat, args.seed)
+    if args.json:
+        print(json.dumps(result, indent=2))
+        return
+    print(f"{result['products']} productos, indice en {result['build_s']} s, "
+          f"actualizacion {result['update_ms']} ms/producto")
+    print(f"{'consulta':>16}  {'p50 (ms)':>9}  {'p99 (ms)':>9}")
+    for q, t in result["queries"].items():
+        print(f"{q:>16}  {t['p50_ms']:>9}  {t['p99_ms']:>9}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.data_generator import MEDELLIN_LOCATIONS
+from app.models import Courier
+from app.repositories.spatial_index import GridIndex
+from app.utils import calculate_distance
+
+
+def _couriers(n: int, rng: random.Random) -> list:
+    out = []
+    for i in range(n):
+        loc = rng.choice(MEDELLIN_LOCATIONS)
+        out.append(Courier(
+            id=i + 1,
+            name=f"Repartidor {i + 1}",
+            phone="",
+            lat=loc["lat"] + rng.uniform(-0.05, 0.05),
+            lng=loc["lng"] + rng.uniform(-0.05, 0.05),
+            available=rng.random() < 0.7,
+        ))
+    return out
+
+
+def _linear_within(couriers, lat, lng, radius):
+    hits = []
+    for c in couriers:
+        if not c.available:
+            continue
+        d = calculate_distance(lat, lng, c.lat, c.lng)
+        if d <= radius:
+            hits.append((d, c.id))
+    hits.sort(key=lambda h: h[0])
+    return hits
+
+
+def _linear_nearest(couriers, lat, lng, k):
+    hits = [(calculate_distance(lat, lng, c.lat, c.lng), c.id) for c in couriers if c.available]
+    hits.sort(key=lambda h: h[0])
+    return hits[:k]
+
+
+def _time(fn, queries) -> float:
+    t0 = time.perf_counter()
+    for q in queries:
+        fn(*q)
+    return (time.perf_counter() - t0) / len(queries) * 1e6
+
+
+def run(sizes, queries: int, radius: float, k: int, cell_km: float, seed: int) -> list:
+    results = []
+    for n in sizes:
+        rng = random.Random(seed)
+        couriers = _couriers(n, rng)
+        t0 = time.perf_counter()
+        index = GridIndex("lat", "lng", where=lambda c: c.available, cell_km=cell_km)
+        for c in couriers:
+            index.add(c.id, c)
+        build_ms = (time.perf_counter() - t0) * 1000
+        points = [rng.choice(MEDELLIN_LOCATIONS) for _ in range(queries)]
+        qs = [(p["lat"] + rng.uniform(-0.02, 0.02), p["lng"] + rng.uniform(-0.02, 0.02)) for p in points]
+        for lat, lng in qs[:20]:
+            assert [h[1] for h in index.within(lat, lng, radius)] == [h[1] for h in _linear_within(couriers, lat, lng, radius)]
+            assert [h[1] for h in index.nearest(lat, lng, k)] == [h[1] for h in _linear_nearest(couriers, lat, lng, k)]
+        row = {
+            "couriers": n,
+            "build_ms": round(build_ms, 2),
+            "radius_km": radius,
+            "k": k,
+            "within_linear_us": round(_time(lambda a, b: _linear_within(couriers, a, b, radius), qs), 1),
+            "within_grid_us": round(_time(lambda a, b: index.within(a, b, radius), qs), 1),
+            "nearest_linear_us": round(_time(lambda a, b: _linear_nearest(couriers, a, b, k), qs), 1),
+            "nearest_grid_us": round(_time(lambda a, b: index.nearest(a, b, k), qs), 1),
+        }
+        results.append(row)
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="GridIndex vs. recorrido lineal para repartidores cercanos")
+    parser.add_argument("--sizes", default="100,1000,10000,50000")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--radius", type=float, default=2.0)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--cell-km", type=float, default=1.0)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--json", action="store_true", help="imprime los resultados como JSON")
+    args = parser.parse_args()
+    rows = run([int(s) for s in args.sizes.split(",")], args.queries, args.radius, args.k, args.cell_km, args.seed)
+    if args.json:
+        print(json.dumps(rows, indent=2))
+    else:
+        print(f"{'repartidores':>12} {'within lineal':>14} {'within grid':>12} {'knn lineal':>11} {'knn grid':>9}  (us/consulta)")
+        for r in rows:
+            print(f"{r['couriers']:>12} {r['within_linear_us']:>14} {r['within_grid_us']:>12} "
+                  f"{r['nearest_linear_us']:>11} {r['nearest_grid_us']:>9}")
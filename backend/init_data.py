@@ -1,6 +1,13 @@
+import argparse
 import json
+import os
+import shutil
 import sys
+import tempfile
+import time
+from datetime import datetime
 from pathlib import Path
+from typing import Optional
 
 if sys.platform == "win32":
     import io
@@ -10,10 +17,23 @@ _PROJECT_ROOT = Path(__file__).resolve().parent.parent
 sys.path.insert(0, str(_PROJECT_ROOT / "backend"))
 
 from app.data_generator import (
+    SyntheticData,
     generate_businesses,
     generate_products,
     generate_couriers,
 )
+from app.repositories.archive import ARCHIVE_DIR
+from app.repositories.factory import STORAGE_BACKEND
+from app.repositories.sequences import SEQUENCES_FILE
+from app.utils import DATA_DIR, JsonArrayWriter, write_text_atomic
+
+DATASET = [
+    ("businesses", "negocios"),
+    ("products", "productos"),
+    ("couriers", "repartidores"),
+    ("orders", "pedidos"),
+    ("payments", "pagos"),
+]
 
 
 def init_all_data():
@@ -51,5 +71,160 @@ def init_all_data():
     print("  python -m uvicorn backend.app.main:app --reload")
 
 
+def _write_json(data: SyntheticData, data_dir: str) -> None:
+    # One pass over the orders feeds both orders.json and payments.json.
+    os.makedirs(data_dir, exist_ok=True)
+    for i, (name, label) in enumerate(DATASET[:3], 1):
+        t0 = time.perf_counter()
+        with JsonArrayWriter(os.path.join(data_dir, f"{name}.json")) as out:
+            for record in getattr(data, name)():
+                out.write(record)
+        print(f"[{i}/4] {out.count} {label} ({time.perf_counter() - t0:.1f} s)")
+    t0 = time.perf_counter()
+    with JsonArrayWriter(os.path.join(data_dir, "orders.json")) as orders, \
+            JsonArrayWriter(os.path.join(data_dir, "payments.json")) as payments:
+        for order, payment in data.orders_and_payments():
+            orders.write(order)
+            if payment is not None:
+                payments.write(payment)
+    print(f"[4/4] {orders.count} pedidos y {payments.count} pagos ({time.perf_counter() - t0:.1f} s)")
+
+    # Journals and id sequences of the replaced files would otherwise be
+    # replayed over, or hand out ids already used by, the new data.
+    for name, _ in DATASET:
+        for suffix in (".journal.jsonl", ".journal.jsonl.compacting"):
+            try:
+                os.remove(os.path.join(data_dir, name + suffix))
+            except FileNotFoundError:
+                pass
+    sequences_path = os.path.join(data_dir, SEQUENCES_FILE)
+    try:
+        with open(sequences_path, "r", encoding="utf-8") as f:
+            sequences = json.load(f)
+    except (OSError, json.JSONDecodeError):
+        sequences = None
+    if isinstance(sequences, dict):
+        for name, _ in DATASET:
+            sequences.pop(name, None)
+        write_text_atomic(sequences_path, json.dumps(sequences, indent=2))
+
+
+def _write_sqlite(data: SyntheticData, db_path: str) -> None:
+    # Payments are spooled to a temporary JSON Lines file while the orders
+    # are inserted, so the orders are generated once.
+    from app.repositories.sqlite_repository import (
+        SqliteBusinessRepository,
+        SqliteCourierRepository,
+        SqliteOrderRepository,
+        SqlitePaymentRepository,
+        SqliteProductRepository,
+    )
+
+    def counted(records, counter):
+        for record in records:
+            counter[0] += 1
+            yield record
+
+    for i, (label, repo, records) in enumerate([
+        ("negocios", SqliteBusinessRepository, data.businesses()),
+        ("productos", SqliteProductRepository, data.products()),
+        ("repartidores", SqliteCourierRepository, data.couriers()),
+    ], 1):
+        t0 = time.perf_counter()
+        n = [0]
+        repo(db_path).save_all(counted(records, n))
+        print(f"[{i}/4] {n[0]} {label} ({time.perf_counter() - t0:.1f} s)")
+
+    t0 = time.perf_counter()
+    orders, payments = [0], [0]
+    with tempfile.TemporaryFile("w+", encoding="utf-8", dir=os.path.dirname(os.path.abspath(db_path))) as spool:
+        def spooled():
+            for order, payment in data.orders_and_payments():
+                if payment is not None:
+                    spool.write(json.dumps(payment, ensure_ascii=False) + "\n")
+                yield order
+
+        SqliteOrderRepository(db_path).save_all(counted(spooled(), orders))
+        spool.seek(0)
+        SqlitePaymentRepository(db_path).save_all(counted((json.loads(line) for line in spool), payments))
+    print(f"[4/4] {orders[0]} pedidos y {payments[0]} pagos ({time.perf_counter() - t0:.1f} s)")
+
+
+def _existing_data(storage: str, data_dir: str, db_path: str) -> list:
+    if storage == "sqlite":
+        if not os.path.exists(db_path):
+            return []
+        from migrate_sqlite import PAIRS
+        return [label for label, _, target in PAIRS if target(db_path).count()]
+    filled = []
+    for name, label in DATASET:
+        path = os.path.join(data_dir, f"{name}.json")
+        if os.path.exists(path) and os.path.getsize(path) > 4:
+            filled.append(label)
+    return filled
+
+
+def write_dataset(data: SyntheticData, storage: str = "json", data_dir: str = DATA_DIR,
+                  db_path: Optional[str] = None) -> None:
+    # Streams every record to the JSON files in data_dir, or to the SQLite
+    # database, replacing what was there.
+    if storage == "sqlite":
+        from app.repositories.sqlite_repository import SQLITE_PATH
+        _write_sqlite(data, db_path or SQLITE_PATH)
+    else:
+        _write_json(data, data_dir)
+
+
+def init_synthetic_data(data: SyntheticData, storage: str, force: bool = False) -> bool:
+    from app.repositories.sqlite_repository import SQLITE_PATH
+
+    target = SQLITE_PATH if storage == "sqlite" else DATA_DIR
+    print(f"Generando datos sintéticos (semilla {data.seed}) en {target}\n")
+    filled = _existing_data(storage, DATA_DIR, SQLITE_PATH)
+    archived = os.path.isdir(ARCHIVE_DIR) and bool(os.listdir(ARCHIVE_DIR))
+    if (filled or archived) and not force:
+        found = ", ".join(filled + (["archivo de pedidos"] if archived else []))
+        print(f"[ADVERTENCIA] Ya hay datos ({found}). Usa --force para reemplazarlos.")
+        return False
+    t0 = time.perf_counter()
+    write_dataset(data, storage)
+    if archived:
+        # Archived orders would share ids with the new ones.
+        shutil.rmtree(ARCHIVE_DIR)
+        print("  Archivo de pedidos anterior eliminado.")
+    print(f"\n[COMPLETADO] Datos generados en {time.perf_counter() - t0:.1f} s.")
+    return True
+
+
 if __name__ == "__main__":
-    init_all_data()
+    parser = argparse.ArgumentParser(
+        description="Inicializa data/. Sin --businesses crea los datos de demostración; con --businesses "
+                    "genera datos sintéticos reproducibles a la escala pedida."
+    )
+    parser.add_argument("--businesses", type=int, help="negocios a generar (activa el modo sintético)")
+    parser.add_argument("--products-per-business", type=int, default=10)
+    parser.add_argument("--couriers", type=int, help="por defecto, uno por cada dos negocios (mínimo 8)")
+    parser.add_argument("--orders", type=int, default=0, help="pedidos históricos")
+    parser.add_argument("--days", type=int, default=30, help="días de historial de pedidos")
+    parser.add_argument("--end", help="fin del historial (ISO 8601); fíjalo para repetir exactamente los datos")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--storage", choices=["json", "sqlite"], default=STORAGE_BACKEND)
+    parser.add_argument("--force", action="store_true", help="reemplaza los datos existentes")
+    args = parser.parse_args()
+    if args.businesses is None:
+        init_all_data()
+        sys.exit(0)
+    try:
+        synthetic = SyntheticData(
+            seed=args.seed,
+            businesses=args.businesses,
+            products_per_business=args.products_per_business,
+            couriers=args.couriers if args.couriers is not None else max(8, args.businesses // 2),
+            orders=args.orders,
+            days=args.days,
+            end=datetime.fromisoformat(args.end) if args.end else None,
+        )
+    except ValueError as e:
+        print(f"[ERROR] {e}")
+        sys.exit(2)
+    sys.exit(0 if init_synthetic_data(synthetic, args.storage, args.force) else 1)
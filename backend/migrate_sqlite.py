@@ -0,0 +1,58 @@
+import argparse
+import sys
+from pathlib import Path
+
+if sys.platform == "win32":
+    import io
+    sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding="utf-8")
+
+_PROJECT_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(_PROJECT_ROOT / "backend"))
+
+from app.repositories import (
+    BusinessRepository,
+    CourierRepository,
+    OrderRepository,
+    PaymentRepository,
+    ProductRepository,
+)
+from app.repositories.sqlite_repository import (
+    SQLITE_PATH,
+    SqliteBusinessRepository,
+    SqliteCourierRepository,
+    SqliteOrderRepository,
+    SqlitePaymentRepository,
+    SqliteProductRepository,
+)
+
+PAIRS = [
+    ("negocios", BusinessRepository, SqliteBusinessRepository),
+    ("productos", ProductRepository, SqliteProductRepository),
+    ("repartidores", CourierRepository, SqliteCourierRepository),
+    ("pedidos", OrderRepository, SqliteOrderRepository),
+    ("pagos", PaymentRepository, SqlitePaymentRepository),
+]
+
+
+def migrate(db_path: str, force: bool = False) -> bool:
+    print(f"Importando data/*.json a {db_path}\n")
+    targets = [(label, source(), target(db_path)) for label, source, target in PAIRS]
+    if not force:
+        filled = [label for label, _, target in targets if target.count()]
+        if filled:
+            print(f"[ADVERTENCIA] La base ya tiene datos ({', '.join(filled)}). Usa --force para reemplazarlos.")
+            return False
+    for i, (label, source, target) in enumerate(targets, 1):
+        rows = source.find_all()
+        target.save_all(rows)
+        print(f"[{i}/{len(targets)}] {len(rows)} {label}")
+    print("\n[COMPLETADO] Arranca el servidor con DELIVERY_STORAGE=sqlite")
+    return True
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Importa los JSON de data/ a SQLite")
+    parser.add_argument("--db", default=SQLITE_PATH)
+    parser.add_argument("--force", action="store_true", help="reemplaza las tablas existentes")
+    args = parser.parse_args()
+    sys.exit(0 if migrate(args.db, args.force) else 1)
@@ -0,0 +1,110 @@
+import asyncio
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+_BACKEND = os.path.dirname(os.path.abspath(__file__))
+_DATA_SRC = os.path.join(os.path.dirname(_BACKEND), "data")
+
+# The app reads DELIVERY_DATA_DIR at import time, so the scratch copy of data/
+# must be in place before anything from app/ is imported.
+_TMP_DATA = tempfile.mkdtemp(prefix="parcerogo-loop-")
+shutil.copytree(_DATA_SRC, _TMP_DATA, dirs_exist_ok=True)
+os.environ["DELIVERY_DATA_DIR"] = _TMP_DATA
+sys.path.insert(0, _BACKEND)
+
+from app.services.io_executor import run_write
+from app.services.order_service import OrderService
+
+HISTORY_ORDERS = 5000
+CONCURRENT_ORDERS = 30
+MAX_OFFLOADED_LAG_MS = 100.0
+
+
+def _seed_history(n: int) -> None:
+    path = os.path.join(_TMP_DATA, "orders.json")
+    with open(path, "r", encoding="utf-8") as f:
+        orders = json.load(f)
+    template = orders[0]
+    history = []
+    for i in range(n):
+        o = dict(template)
+        o["id"] = i + 1
+        history.append(o)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(history, f, indent=2, ensure_ascii=False)
+
+
+def _order_payload(service: OrderService) -> dict:
+    business = service._businesses.find_all()[0]
+    product = next(p for p in service._products.find_by_business_id(business["id"]))
+    return {
+        "business_id": business["id"],
+        "products": [{"product_id": product["id"], "quantity": 1}],
+        "customer_name": "Cliente prueba",
+        "customer_phone": "+57 300 1112233",
+        "customer_address": "Calle 50 #30-20",
+        "customer_lat": 6.2442,
+        "customer_lng": -75.5812,
+    }
+
+
+async def _max_loop_lag(work, interval: float = 0.005) -> float:
+    lags = []
+    done = asyncio.Event()
+
+    async def monitor():
+        while not done.is_set():
+            t0 = time.perf_counter()
+            await asyncio.sleep(interval)
+            lags.append(time.perf_counter() - t0 - interval)
+
+    task = asyncio.create_task(monitor())
+    await asyncio.sleep(interval * 2)
+    try:
+        await work()
+    finally:
+        done.set()
+        await task
+    return max(lags) * 1000 if lags else 0.0
+
+
+async def _measure(service: OrderService, payload: dict):
+    async def blocking():
+        for _ in range(CONCURRENT_ORDERS):
+            service.create_order(payload)
+            await asyncio.sleep(0)
+
+    async def offloaded():
+        await asyncio.gather(*(run_write(service.create_order, payload) for _ in range(CONCURRENT_ORDERS)))
+
+    return await _max_loop_lag(blocking), await _max_loop_lag(offloaded)
+
+
+def _run():
+    import app.notify_sms as notify_sms
+    notify_sms.enqueue_new_order_sms = lambda order: None
+    _seed_history(HISTORY_ORDERS)
+    service = OrderService()
+    payload = _order_payload(service)
+    return asyncio.run(_measure(service, payload))
+
+
+def test_event_loop_lag_under_concurrent_order_creation():
+    blocking_ms, offloaded_ms = _run()
+    assert offloaded_ms < MAX_OFFLOADED_LAG_MS
+    assert offloaded_ms < blocking_ms
+
+
+if __name__ == "__main__":
+    print(f"Creando {CONCURRENT_ORDERS} pedidos concurrentes sobre {HISTORY_ORDERS} pedidos historicos...\n")
+    blocking_ms, offloaded_ms = _run()
+    print(f"  Lag maximo del event loop (I/O en el loop):      {blocking_ms:8.1f} ms")
+    print(f"  Lag maximo del event loop (I/O en thread pool):  {offloaded_ms:8.1f} ms")
+    ok = offloaded_ms < MAX_OFFLOADED_LAG_MS and offloaded_ms < blocking_ms
+    print("\n[OK]" if ok else "\n[ERROR] El event loop se bloquea durante la escritura")
+    shutil.rmtree(_TMP_DATA, ignore_errors=True)
+    sys.exit(0 if ok else 1)
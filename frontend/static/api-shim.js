@@ -114,8 +114,13 @@
                 var courierId = params.get('courier_id');
                 if (businessId) orders = orders.filter(function (o) { return o.business_id === parseInt(businessId, 10); });
                 if (courierId) orders = orders.filter(function (o) { return o.courier_id === parseInt(courierId, 10); });
+                var status = params.get('status');
+                if (status) {
+                    var statuses = status.split(',');
+                    orders = orders.filter(function (o) { return statuses.indexOf(o.status) !== -1; });
+                }
             }
-            return Promise.resolve(jsonResponse({ orders: orders, count: orders.length }));
+            return Promise.resolve(jsonResponse({ orders: orders, count: orders.length, next_cursor: null }));
         }
         var m2 = url.match(/^\/api\/delivery\/orders\/by-phone\/(.+)$/);
         if (m2 && method === 'GET') {